@@ -0,0 +1,230 @@
+import threading
+
+from collections import deque
+
+from pywb.apps.wbrequestresponse import WbResponse
+from pywb.utils.io import is_file_wrapper_body, no_except_close
+from pywb.utils.singleflight import wait_event
+
+
+# ============================================================================
+class Bulkhead(object):
+    """ Limits the number of concurrent requests to max_concurrent.
+
+    Up to max_queue more requests wait, in order, for up to queue_timeout
+    secs each for a request to finish. Requests beyond that are rejected
+    """
+    QUEUE_TIMEOUT = 10.0
+
+    def __init__(self, name, max_concurrent, max_queue=None, queue_timeout=None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_concurrent if max_queue is None else max_queue
+        self.queue_timeout = queue_timeout or self.QUEUE_TIMEOUT
+
+        self.active = 0
+        self.waiters = deque()
+        self.lock = threading.Lock()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def acquire(self):
+        """ Return True once admitted, False if rejected
+        """
+        with self.lock:
+            if self.active < self.max_concurrent and not self.waiters:
+                self.active += 1
+                self.admitted += 1
+                return True
+
+            if len(self.waiters) >= self.max_queue:
+                self.rejected += 1
+                return False
+
+            waiter = threading.Event()
+            self.waiters.append(waiter)
+
+        wait_event(waiter, self.queue_timeout)
+
+        with self.lock:
+            # slot may have been handed over just after the timeout
+            if waiter.is_set():
+                self.admitted += 1
+                return True
+
+            self.waiters.remove(waiter)
+            self.timeouts += 1
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """ Hand the slot over to the first waiting request, if any
+        """
+        with self.lock:
+            if self.waiters:
+                self.waiters.popleft().set()
+            else:
+                self.active -= 1
+
+    def get_stats(self):
+        with self.lock:
+            return {'max_concurrent': self.max_concurrent,
+                    'max_queue': self.max_queue,
+                    'active': self.active,
+                    'queued': len(self.waiters),
+                    'admitted': self.admitted,
+                    'rejected': self.rejected,
+                    'timeouts': self.timeouts,
+                   }
+
+
+# ============================================================================
+class ReleasingIter(object):
+    """ Response body iterator, calling release() when the body is closed
+    """
+    def __init__(self, body, release):
+        self.body = body
+        self.release = release
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        try:
+            no_except_close(self.body)
+        finally:
+            release, self.release = self.release, None
+            if release:
+                release()
+
+
+# ============================================================================
+class AdmissionControl(object):
+    """ Global and per collection concurrency limits for replay requests.
+
+    A request is admitted by the bulkhead of its collection, if any, then by
+    the global bulkhead, and holds both until its response is sent.
+    Requests not admitted get a 503 response with a Retry-After header,
+    so that a busy collection (or one with a slow index) only delays
+    its own requests
+    """
+    RETRY_AFTER = 5
+
+    def __init__(self, max_concurrent=None, max_queue=None, queue_timeout=None,
+                 retry_after=None, per_collection=None, collections=None,
+                 is_valid_coll=None):
+
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after or self.RETRY_AFTER
+
+        self.global_bulkhead = None
+        if max_concurrent:
+            self.global_bulkhead = Bulkhead('global', max_concurrent, max_queue, queue_timeout)
+
+        # default limits for each collection
+        self.per_collection = per_collection or {}
+
+        self.coll_bulkheads = {}
+        for coll, limits in (collections or {}).items():
+            self.coll_bulkheads[coll] = self._create_bulkhead(coll, limits)
+
+        self.is_valid_coll = is_valid_coll
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, is_valid_coll=None):
+        """ Create from the admission_control config, returning None if not configured
+        """
+        if not config:
+            return None
+
+        return cls(max_concurrent=config.get('max_concurrent'),
+                   max_queue=config.get('max_queue'),
+                   queue_timeout=config.get('queue_timeout'),
+                   retry_after=config.get('retry_after'),
+                   per_collection=config.get('per_collection'),
+                   collections=config.get('collections'),
+                   is_valid_coll=is_valid_coll)
+
+    def _create_bulkhead(self, coll, limits):
+        if not limits.get('max_concurrent'):
+            return None
+
+        return Bulkhead(coll, limits['max_concurrent'],
+                        limits.get('max_queue'),
+                        limits.get('queue_timeout', self.queue_timeout))
+
+    def get_coll_bulkhead(self, coll):
+        """ Return the bulkhead for coll, created on first use
+        with the per_collection limits, if any
+        """
+        try:
+            return self.coll_bulkheads[coll]
+        except KeyError:
+            pass
+
+        if not self.per_collection.get('max_concurrent'):
+            return None
+
+        # only track existing collections
+        if self.is_valid_coll and not self.is_valid_coll(coll):
+            return None
+
+        with self.lock:
+            if coll not in self.coll_bulkheads:
+                self.coll_bulkheads[coll] = self._create_bulkhead(coll, self.per_collection)
+
+            return self.coll_bulkheads[coll]
+
+    def acquire(self, coll):
+        """ Return the list of bulkheads held by the admitted request,
+        to be released once done, or None if rejected
+        """
+        held = []
+        for bulkhead in (self.get_coll_bulkhead(coll), self.global_bulkhead):
+            if not bulkhead:
+                continue
+
+            if not bulkhead.acquire():
+                self.release(held)
+                return None
+
+            held.append(bulkhead)
+
+        return held
+
+    def release(self, held):
+        for bulkhead in reversed(held):
+            bulkhead.release()
+
+    def release_on_close(self, body, held, environ):
+        """ Return the response body, releasing held once it has been sent
+        """
+        # already complete, or sent by the server from a file
+        if isinstance(body, list) or is_file_wrapper_body(environ, body):
+            self.release(held)
+            return body
+
+        return ReleasingIter(body, lambda: self.release(held))
+
+    def unavailable_response(self):
+        response = WbResponse.text_response('Service Unavailable: Too many requests, please retry later',
+                                            status='503 Service Unavailable')
+
+        response.status_headers.headers.append(('Retry-After', str(self.retry_after)))
+        return response
+
+    def get_stats(self):
+        stats = {'global': self.global_bulkhead.get_stats() if self.global_bulkhead else None,
+                 'collections': {}}
+
+        with self.lock:
+            coll_bulkheads = list(self.coll_bulkheads.items())
+
+        for coll, bulkhead in coll_bulkheads:
+            if bulkhead:
+                stats['collections'][coll] = bulkhead.get_stats()
+
+        return stats
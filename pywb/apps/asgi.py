@@ -0,0 +1,3 @@
+from pywb.apps.asgiapp import ASGIApp
+
+application = ASGIApp()
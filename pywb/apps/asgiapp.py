@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from six.moves.urllib.parse import quote
+
+from pywb.apps.frontendapp import FrontEndApp
+
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+# ============================================================================
+class ASGIApp(object):
+    """ASGI application serving pywb, without gevent monkey-patching,
+    under an asyncio ASGI server such as uvicorn.
+
+    Requests are routed and rendered by the WSGI :class:`FrontEndApp`, called,
+    along with each read of the response body, in a thread pool executor,
+    as it may block on index lookups and record loading. The body is streamed
+    a chunk at a time, waiting for the server to accept each chunk before
+    reading the next, so a slow client holds no thread while it is waiting.
+
+    Requests to the local warcserver are made in-process, recording is not
+    supported.
+    """
+    MAX_WORKERS = 32
+
+    def __init__(self, app=None, config_file=None, custom_config=None, max_workers=None):
+        """
+        :param app: The WSGI application to serve, by default a FrontEndApp
+        :param str|None config_file: Path to the config file for the FrontEndApp
+        :param dict|None custom_config: Additional config for the FrontEndApp
+        :param int|None max_workers: Max number of threads for blocking calls
+        """
+        if app is None:
+            app = FrontEndApp(config_file=config_file, custom_config=custom_config)
+
+            if app.recorder:
+                logger.warning('Recording is not supported by the ASGI app')
+
+            if not app.rewriterapp.inprocess_client and not app.upstream_pool:
+                logger.warning('warcserver_inprocess should be enabled for the ASGI app')
+
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or self.MAX_WORKERS)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.handle_lifespan(receive, send)
+
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported ASGI scope type: ' + scope['type'])
+
+        body = await self.read_body(receive)
+
+        environ = self.make_environ(scope, body)
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+
+            response['status'] = status
+            response['headers'] = headers
+            return response.setdefault('written', []).append
+
+        loop = asyncio.get_event_loop()
+
+        result = await loop.run_in_executor(self.executor, self.app, environ, start_response)
+
+        try:
+            async for chunk in self.iter_body(result, response, loop):
+                if not response.get('sent'):
+                    await self.send_start(send, response)
+
+                await send({'type': 'http.response.body',
+                            'body': chunk,
+                            'more_body': True})
+
+            if not response.get('sent'):
+                await self.send_start(send, response)
+
+            await send({'type': 'http.response.body', 'body': b''})
+
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.executor, result.close)
+
+    async def iter_body(self, result, response, loop):
+        """Yield the non-empty chunks of the WSGI response, reading each chunk
+        in the executor, unless the response is a list already in memory
+
+        :param result: The WSGI response iterable
+        :param dict response: The status, headers and any written data
+        :param loop: The event loop
+        """
+        chunks = iter(result)
+        in_memory = isinstance(result, (list, tuple))
+
+        while True:
+            written = response.get('written')
+            if written:
+                for chunk in written:
+                    yield chunk
+
+                del written[:]
+
+            if in_memory:
+                chunk = next(chunks, _END)
+            else:
+                chunk = await loop.run_in_executor(self.executor, next, chunks, _END)
+
+            if chunk is _END:
+                break
+
+            if chunk:
+                yield chunk
+
+    async def send_start(self, send, response):
+        status = response['status']
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                   for name, value in response['headers']]
+
+        response['sent'] = True
+
+        await send({'type': 'http.response.start',
+                    'status': int(status.split(' ', 1)[0]),
+                    'headers': headers})
+
+    async def read_body(self, receive):
+        """Read the full request body
+
+        :param receive: The ASGI receive callable
+        :return: The request body
+        :rtype: bytes
+        """
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+
+            body.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+
+        return b''.join(body)
+
+    def make_environ(self, scope, body):
+        """Create the WSGI environ for an ASGI http request scope
+
+        :param dict scope: The ASGI http request scope
+        :param bytes body: The request body
+        :return: The WSGI environ
+        :rtype: dict
+        """
+        query_string = scope.get('query_string', b'').decode('latin-1')
+
+        raw_path = scope.get('raw_path')
+        if raw_path:
+            request_uri = raw_path.decode('latin-1')
+        else:
+            request_uri = quote(scope['path'].encode('utf-8'), safe='/:@!$&\'()*+,;=%~')
+
+        if query_string:
+            request_uri += '?' + query_string
+
+        server = scope.get('server') or ('localhost', None)
+        client = scope.get('client')
+        scheme = scope.get('scheme', 'http')
+
+        environ = {'REQUEST_METHOD': scope['method'],
+                   'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+                   'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+                   'QUERY_STRING': query_string,
+                   'REQUEST_URI': request_uri,
+                   'SERVER_NAME': server[0],
+                   'SERVER_PORT': str(server[1] or (443 if scheme == 'https' else 80)),
+                   'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+                   'wsgi.version': (1, 0),
+                   'wsgi.url_scheme': scheme,
+                   'wsgi.input': BytesIO(body),
+                   'wsgi.errors': sys.stderr,
+                   'wsgi.multithread': True,
+                   'wsgi.multiprocess': False,
+                   'wsgi.run_once': False,
+                  }
+
+        if client:
+            environ['REMOTE_ADDR'] = client[0]
+            environ['REMOTE_PORT'] = str(client[1])
+
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+
+            if name not in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+                name = 'HTTP_' + name
+
+            if name in environ:
+                value = environ[name] + ',' + value
+
+            environ[name] = value
+
+        # body already read in full, eg. if sent chunked
+        if body and 'CONTENT_LENGTH' not in environ:
+            environ['CONTENT_LENGTH'] = str(len(body))
+
+        return environ
+
+    async def handle_lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -2,7 +2,12 @@ from gevent.monkey import patch_all; patch_all()
 from argparse import ArgumentParser
 
 import logging
+import os
 import pkg_resources
+import signal
+import socket
+import time
+import traceback
 
 
 #=============================================================================
@@ -40,6 +45,12 @@ class BaseCli(object):
     """Base CLI class that provides the initial arg parser setup,
     calls load to receive the application to be started and starts the application."""
 
+    BACKLOG = 1024
+
+    MIN_WORKER_UPTIME = 1.0
+
+    REUSE_PORT = hasattr(socket, 'SO_REUSEPORT')
+
     def __init__(self, args=None, default_port=8080, desc=''):
         """
         :param args: CLI arguments
@@ -55,6 +66,8 @@ class BaseCli(object):
                             help='Address to listen on (default 0.0.0.0)')
         parser.add_argument('-t', '--threads', type=int, default=4,
                             help='Number of threads to use (default 4)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of worker processes to pre-fork (default 1, no forking)')
         parser.add_argument('--debug', action='store_true',
                             help='Enable debug mode')
         parser.add_argument('--profile', action='store_true',
@@ -95,11 +108,16 @@ class BaseCli(object):
 
         self.extra_config['enable_auto_fetch'] = self.r.enable_auto_fetch
 
-        self.application = self.load()
+        self.worker_id = None
+        self.recorder_port = 0
+        self.listener = None
+        self.workers = {}
+        self.stopping = False
 
-        if self.r.profile:
-            from werkzeug.contrib.profiler import ProfilerMiddleware
-            self.application = ProfilerMiddleware(self.application)
+        # if pre-forking, the application is loaded in each worker
+        self.application = None
+        if self.r.workers <= 1:
+            self.application = self.load_app()
 
     def _extend_parser(self, parser):  #pragma: no cover
         """Method provided for subclasses to add their cli argument on top of the default cli arguments.
@@ -108,9 +126,26 @@ class BaseCli(object):
         """
         pass
 
+    def load_app(self):
+        """Load the application, wrapped for profiling if enabled
+
+        :return: The loaded application
+        """
+        application = self.load()
+
+        if self.r.profile:
+            from werkzeug.contrib.profiler import ProfilerMiddleware
+            application = ProfilerMiddleware(application)
+
+        return application
+
     def load(self):
         """This method is called to load the application. Subclasses must return a application
         that can be used by used by pywb.utils.geventserver.GeventServer."""
+        if self.worker_id is not None:
+            self.extra_config['worker_id'] = self.worker_id
+            self.extra_config['recorder_port'] = self.recorder_port
+
         if self.r.live:
             self.extra_config['collections'] = {'live':
                     {'index': '$live'}}
@@ -123,18 +158,125 @@ class BaseCli(object):
 
     def run(self):
         """Start the application"""
-        self.run_gevent()
+        if self.r.workers > 1:
+            self.run_prefork()
+        else:
+            self.run_gevent()
         return self
 
-    def run_gevent(self):
-        """Created the server that runs the application supplied a subclass"""
+    def run_gevent(self, listener=None):
+        """Created the server that runs the application supplied a subclass
+
+        :param listener: An already listening socket to serve on, if any
+        """
         from pywb.utils.geventserver import GeventServer, RequestURIWSGIHandler
         logging.info('Starting Gevent Server on ' + str(self.r.port))
         ge = GeventServer(self.application,
                           port=self.r.port,
                           hostname=self.r.bind,
                           handler_class=RequestURIWSGIHandler,
-                          direct=True)
+                          direct=True,
+                          listener=listener)
+
+    def run_prefork(self):
+        """Pre-fork worker processes, each loading the application and serving
+        on the same port, and restart any worker that exits until stopped.
+
+        With SO_REUSEPORT, each worker listens on its own socket bound to the port,
+        balanced by the kernel, otherwise all workers accept from one shared socket.
+        The first worker also runs the recorder and auto-indexer, if enabled.
+        """
+        self.listener = self._make_listener(self.r.port)
+        self.r.port = self.listener.getsockname()[1]
+
+        if not self.REUSE_PORT:
+            self.listener.listen(self.BACKLOG)
+
+        self.recorder_port = self._get_free_port()
+
+        signal.signal(signal.SIGTERM, self._stop_workers)
+        signal.signal(signal.SIGINT, self._stop_workers)
+
+        logging.info('Starting {0} workers on {1}'.format(self.r.workers, self.r.port))
+
+        for worker_id in range(self.r.workers):
+            self._spawn_worker(worker_id)
+
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except OSError:
+                break
+
+            worker = self.workers.pop(pid, None)
+            if not worker or self.stopping:
+                continue
+
+            worker_id, started = worker
+            logging.warning('Worker {0} (pid {1}) exited with status {2}, restarting'.
+                            format(worker_id, pid, status))
+
+            # avoid restarting in a tight loop if the worker fails on startup
+            if time.time() - started < self.MIN_WORKER_UPTIME:
+                time.sleep(self.MIN_WORKER_UPTIME)
+
+            if not self.stopping:
+                self._spawn_worker(worker_id)
+
+    def _spawn_worker(self, worker_id):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = (worker_id, time.time())
+            return
+
+        exit_code = 1
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+            self.worker_id = worker_id
+            self.workers = {}
+
+            listener = self.listener
+            if self.REUSE_PORT:
+                listener.close()
+                listener = self._make_listener(self.r.port)
+                listener.listen(self.BACKLOG)
+
+            self.application = self.load_app()
+
+            logging.info('Worker {0} started (pid {1})'.format(worker_id, os.getpid()))
+            self.run_gevent(listener=listener)
+            exit_code = 0
+        except Exception:
+            traceback.print_exc()
+        finally:
+            os._exit(exit_code)
+
+    def _stop_workers(self, signum=None, frame=None):
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    def _make_listener(self, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.REUSE_PORT:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+        sock.bind((self.r.bind, port))
+        return sock
+
+    def _get_free_port(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.bind(('localhost', 0))
+            return sock.getsockname()[1]
+        finally:
+            sock.close()
 
 
 #=============================================================================
@@ -1,5 +1,3 @@
-from gevent.monkey import patch_all; patch_all()
-
 from werkzeug.routing import Map, Rule, RequestRedirect, Submount
 from werkzeug.wsgi import pop_path_info
 from six.moves.urllib.parse import urljoin, parse_qsl
@@ -18,11 +16,14 @@ from pywb.utils.geventserver import GeventServer
 from pywb.utils.io import StreamIter
 from pywb.utils.wbexception import WbException, AppPageNotFound
 
+from pywb.warcserver.inprocess import InProcessClient
 from pywb.warcserver.warcserver import WarcServer
 
 from pywb.rewrite.templateview import BaseInsertView
 
+from pywb.apps.admission import AdmissionControl
 from pywb.apps.static_handler import StaticHandler
+from pywb.apps.upstreampool import UpstreamPool
 from pywb.apps.rewriterapp import RewriterApp
 from pywb.apps.wbrequestresponse import WbResponse
 
@@ -48,6 +49,7 @@ class FrontEndApp(object):
     The RewriterApp is configurable and can be set via the class var `REWRITER_APP_CLS`, defaults to RewriterApp
     """
 
+    WARCSERVER_BASE_URL = 'http://localhost:%s/'
     REPLAY_API = 'http://localhost:%s/{coll}/resource/postreq'
     CDX_API = 'http://localhost:%s/{coll}/index'
     RECORD_SERVER = 'http://localhost:%s'
@@ -88,9 +90,16 @@ class FrontEndApp(object):
         self.proxy_record = False # indicate if proxy recording
         self.init_proxy(config)
 
-        self.init_recorder(config.get('recorder'))
+        # when pre-forked, only the first worker writes WARCs and auto-indexes,
+        # other workers record through its recorder, at recorder_port
+        is_primary = not config.get('worker_id')
+
+        self.init_recorder(config.get('recorder'),
+                           port=config.get('recorder_port', 0),
+                           remote=not is_primary)
 
-        self.init_autoindex(config.get('autoindex'))
+        if is_primary:
+            self.init_autoindex(config.get('autoindex'))
 
         static_path = config.get('static_url_path', 'pywb/static/').replace('/', os.path.sep)
         self.static_handler = StaticHandler(static_path)
@@ -105,6 +114,23 @@ class FrontEndApp(object):
                                                  config=config,
                                                  paths=upstream_paths)
 
+        base_url = self.WARCSERVER_BASE_URL % self.warcserver_server.port
+
+        # if set, requests to the warcserver are sent to remote warcservers instead
+        self.upstream_pool = UpstreamPool.from_config(config.get('warcserver_upstream'),
+                                                      prefix=base_url)
+
+        if self.upstream_pool:
+            self.rewriterapp.upstream_pool = self.upstream_pool
+            self.rewriterapp.file_passthrough = False
+        else:
+            # warcserver is local, payloads may be read from archive files directly
+            self.rewriterapp.file_passthrough = config.get('file_passthrough', True)
+
+            # and replay requests need not go over HTTP
+            if config.get('warcserver_inprocess', True):
+                self.rewriterapp.inprocess_client = InProcessClient(self.warcserver, base_url)
+
         self.templates_dir = config.get('templates_dir', 'templates')
         self.static_dir = config.get('static_dir', 'static')
         self.static_prefix = config.get('static_prefix', 'static')
@@ -113,6 +139,12 @@ class FrontEndApp(object):
         metadata_templ = os.path.join(self.warcserver.root_dir, '{coll}', 'metadata.yaml')
         self.metadata_cache = MetadataCache(metadata_templ)
 
+        # optional concurrency limits for replay, cdx and record requests
+        self.admission = AdmissionControl.from_config(config.get('admission_control'),
+                                                      is_valid_coll=self.is_valid_coll)
+
+        self.admission_endpoints = (self.serve_content, self.serve_cdx, self.serve_record)
+
         self._init_routes()
 
     def _init_routes(self):
@@ -124,6 +156,9 @@ class FrontEndApp(object):
         self.url_map.add(Rule('/{0}/<path:filepath>'.format(self.static_prefix), endpoint=self.serve_static))
         self.url_map.add(Rule('/collinfo.json', endpoint=self.serve_listing))
 
+        if self.admission:
+            self.url_map.add(Rule('/_stats', endpoint=self.serve_stats))
+
         if self.is_valid_coll('$root'):
             coll_prefix = ''
         else:
@@ -199,10 +234,13 @@ class FrontEndApp(object):
 
         return base_paths
 
-    def init_recorder(self, recorder_config):
+    def init_recorder(self, recorder_config, port=0, remote=False):
         """Initialize the recording functionality of pywb. If recording_config is None this function is a no op
 
         :param str|dict|None recorder_config: The configuration for the recorder app
+        :param int port: The port for the recorder app to listen on, any free port if 0
+        :param bool remote: If true, record through a recorder app already running on port,
+        eg. in another worker process
         :rtype: None
         """
         if not recorder_config:
@@ -219,6 +257,11 @@ class FrontEndApp(object):
         # cache mode
         self.rec_cache_mode = recorder_config.get('cache', 'default')
 
+        if remote:
+            self.recorder = None
+            self.set_recorder_path(recorder_config, port, recorder_coll)
+            return
+
         dedup_policy = recorder_config.get('dedup_policy')
         dedup_by_url = False
 
@@ -262,9 +305,19 @@ class FrontEndApp(object):
                                     accept_colls=recorder_config.get('source_filter'),
                                     create_buff_func=create_buff_func)
 
-        recorder_server = GeventServer(self.recorder, port=0)
+        recorder_server = GeventServer(self.recorder, port=port)
+
+        self.set_recorder_path(recorder_config, recorder_server.port, recorder_coll)
 
-        self.recorder_path = self.RECORD_API % (recorder_server.port, recorder_coll)
+    def set_recorder_path(self, recorder_config, port, recorder_coll):
+        """Set the paths for recording through the recorder app on the specified port
+
+        :param dict recorder_config: The configuration for the recorder app
+        :param int port: The port the recorder app is listening on
+        :param str recorder_coll: The collection recorded from
+        :rtype: None
+        """
+        self.recorder_path = self.RECORD_API % (port, recorder_coll)
 
         # enable PUT of custom data as 'resource' records
         if recorder_config.get('enable_put_custom_record'):
@@ -438,7 +491,14 @@ class FrontEndApp(object):
             for key in environ.keys():
                 if key.startswith("HTTP_X_"):
                     headers[key[5:].replace("_", "-")] = environ[key]
-            res = requests.get(cdx_url, stream=True, headers=headers)
+            inprocess_client = self.rewriterapp.inprocess_client
+
+            if self.upstream_pool:
+                res = self.upstream_pool.get(cdx_url, stream=True, headers=headers)
+            elif inprocess_client and inprocess_client.handles(cdx_url):
+                res = inprocess_client.get(cdx_url, headers=headers)
+            else:
+                res = requests.get(cdx_url, stream=True, headers=headers)
 
             status_line = '{} {}'.format(res.status_code, res.reason)
             content_type = res.headers.get('Content-Type')
@@ -585,6 +645,16 @@ class FrontEndApp(object):
 
         return WbResponse.json_response(result)
 
+    def serve_stats(self, environ):
+        """Serves the admission control statistics: active and queued requests,
+        and admitted and rejected requests, globally and per collection
+
+        :param dict environ: The WSGI environment dictionary for the request
+        :return: WbResponse containing the admission control statistics
+        :rtype: WbResponse
+        """
+        return WbResponse.json_response({'admission_control': self.admission.get_stats()})
+
     def is_valid_coll(self, coll):
         """Determines if the collection name for a request is valid (exists)
 
@@ -659,9 +729,15 @@ class FrontEndApp(object):
         :rtype: WbResponse
         """
         urls = self.url_map.bind_to_environ(environ)
+        held = None
         try:
             endpoint, args = urls.match()
 
+            if self.admission and endpoint in self.admission_endpoints:
+                held = self.admission.acquire(args.get('coll', '$root'))
+                if held is None:
+                    return self.admission.unavailable_response()(environ, start_response)
+
             self.rewriterapp.prepare_env(environ)
 
             # store original script_name (original prefix) before modifications are made
@@ -687,7 +763,7 @@ class FrontEndApp(object):
             if wbe.status_code == 404:
                 redir = self._check_refer_redirect(environ)
                 if redir:
-                    return redir(environ, start_response)
+                    return self._send_response(redir, environ, start_response, held)
 
             response = self.rewriterapp.handle_error(environ, wbe)
 
@@ -697,7 +773,33 @@ class FrontEndApp(object):
 
             response = self.rewriterapp._error_response(environ, WbException('Internal Error: ' + str(e)))
 
-        return response(environ, start_response)
+        except BaseException:
+            if held:
+                self.admission.release(held)
+            raise
+
+        return self._send_response(response, environ, start_response, held)
+
+    def _send_response(self, response, environ, start_response, held=None):
+        """Send the response, releasing the admission control slots held by the request
+        once the response body has been sent
+
+        :param WbResponse response: The response to send
+        :param dict environ: The WSGI environment dictionary for the request
+        :param start_response: The WSGI start_response function
+        :param list|None held: The bulkheads held by the request, if any
+        :return: The response body
+        """
+        if not held:
+            return response(environ, start_response)
+
+        try:
+            body = response(environ, start_response)
+        except BaseException:
+            self.admission.release(held)
+            raise
+
+        return self.admission.release_on_close(body, held, environ)
 
     @classmethod
     def create_app(cls, port):
@@ -1,3 +1,9 @@
+import hashlib
+import json
+import os
+import time
+
+from contextlib import closing
 from io import BytesIO
 
 import requests
@@ -5,9 +11,12 @@ from fakeredis import FakeStrictRedis
 from six.moves.urllib.parse import unquote, urlencode, urlsplit, urlunsplit, parse_qsl
 from warcio.bufferedreaders import BufferedReader
 from warcio.recordloader import ArcWarcRecordLoader
+from warcio.statusandheaders import StatusAndHeaders
 from warcio.timeutils import http_date_to_timestamp, timestamp_to_http_date
 
+from pywb import DEFAULT_RULES_FILE, __version__
 from pywb.apps.wbrequestresponse import WbResponse
+from pywb.rewrite.content_rewriter import parse_accept_encoding
 from pywb.rewrite.cookies import CookieTracker
 from pywb.rewrite.default_rewriter import DefaultRewriter, RewriterWithJSProxy
 from pywb.rewrite.rewriteinputreq import RewriteInputRequest
@@ -15,7 +24,8 @@ from pywb.rewrite.templateview import BaseInsertView, HeadInsertView, JinjaEnv,
 from pywb.rewrite.url_rewriter import IdentityUrlRewriter, UrlRewriter
 from pywb.rewrite.wburl import WbUrl
 from pywb.utils.canonicalize import canonicalize
-from pywb.utils.io import BUFF_SIZE, OffsetLimitReader, no_except_close
+from pywb.utils.io import BUFF_SIZE, FileRangeReader, OffsetLimitReader, no_except_close
+from pywb.utils.loaders import load
 from pywb.utils.memento import MementoUtils
 from pywb.utils.wbexception import NotFoundException, UpstreamException
 from pywb.warcserver.index.cdxobject import CDXObject
@@ -29,6 +39,10 @@ class RewriterApp(object):
     """
     VIDEO_INFO_CONTENT_TYPE = 'application/vnd.youtube-dl_formats+json'
 
+    IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+    TEMPLATES_CHECK_INTERVAL = 2.0
+
     DEFAULT_CSP = "default-src 'unsafe-eval' 'unsafe-inline' 'self' data: blob: mediastream: ws: wss: ; form-action 'self'"
 
     def __init__(self, framed_replay=False, jinja_env=None, config=None, paths=None):
@@ -57,6 +71,17 @@ class RewriterApp(object):
 
         self.enable_prefer = self.config.get('enable_prefer', False)
 
+        # read payloads stored as is in local files directly,
+        # only if warcserver shares the filesystem
+        self.file_passthrough = self.config.get('file_passthrough', False)
+
+        # optional client for calling a warcserver in the same process
+        # instead of over HTTP, see InProcessClient
+        self.inprocess_client = None
+
+        # optional pool of remote warcservers, see UpstreamPool
+        self.upstream_pool = None
+
         self.default_rw = DefaultRewriter(replay_mod=self.replay_mod,
                                           config=config)
 
@@ -109,6 +134,80 @@ class RewriterApp(object):
         # deprecated: Use X-Forwarded-Proto header instead!
         self.force_scheme = config.get('force_scheme')
 
+        # ETag and Last-Modified for archived captures, and 304 responses
+        self.enable_validators = self.config.get('enable_validators', True)
+        self.etag_version = self._init_etag_version()
+        self.templates_mtimes = {}
+
+    def _init_etag_version(self):
+        """Compute the version included in every ETag, which changes
+        when pywb, the rewriting rules, the config or the optional
+        etag_version setting change
+
+        :return: The ETag version
+        :rtype: str
+        """
+        rules_file = self.config.get('rules_file', DEFAULT_RULES_FILE)
+
+        version = hashlib.sha1(__version__.encode('utf-8'))
+        version.update(str(self.config.get('etag_version', '')).encode('utf-8'))
+        version.update(repr((self.framed_replay, self.use_js_obj_proxy)).encode('utf-8'))
+        version.update(self._config_digest(self.config).encode('utf-8'))
+
+        try:
+            with closing(load(rules_file)) as fh:
+                version.update(fh.read())
+        except Exception:
+            version.update(rules_file.encode('utf-8'))
+
+        return version.hexdigest()[:16]
+
+    @staticmethod
+    def _config_digest(config):
+        """Return a digest of a config dict, including only the type
+        of any values which can not be serialized as json
+
+        :param dict config: The config
+        :return: The digest of the config
+        :rtype: str
+        """
+        config = json.dumps(config, sort_keys=True,
+                            default=lambda value: type(value).__name__)
+
+        return hashlib.sha1(config.encode('utf-8')).hexdigest()
+
+    def get_templates_mtime(self, environ):
+        """Return the latest modified time of the files in the collection
+        and root template directories, checked at most every
+        TEMPLATES_CHECK_INTERVAL seconds
+
+        :param dict environ: The WSGI environment dictionary for the request
+        :return: The latest modified time, or 0 if no templates found
+        :rtype: float
+        """
+        dirs = (environ.get('pywb.templates_dir'),
+                self.config.get('templates_dir', 'templates'))
+
+        now = time.time()
+        cached = self.templates_mtimes.get(dirs)
+        if cached and now - cached[0] < self.TEMPLATES_CHECK_INTERVAL:
+            return cached[1]
+
+        mtime = 0
+        for templates_dir in dirs:
+            if not templates_dir or not os.path.isdir(templates_dir):
+                continue
+
+            for root, _, filenames in os.walk(templates_dir):
+                for filename in filenames:
+                    try:
+                        mtime = max(mtime, os.path.getmtime(os.path.join(root, filename)))
+                    except OSError:
+                        pass
+
+        self.templates_mtimes[dirs] = (now, mtime)
+        return mtime
+
     def _init_cookie_tracker(self, redis=None):
         """Initialize the CookieTracker
 
@@ -256,7 +355,7 @@ class RewriterApp(object):
 
         return range_start, range_end, skip_record
 
-    def _add_range(self, record, wb_url, range_start, range_end):
+    def _add_range(self, record, wb_url, range_start, range_end, range_skipped=0):
         if range_end is None and range_start is None:
             return
 
@@ -286,12 +385,47 @@ class RewriterApp(object):
 
             record.http_headers.replace_header('Content-Length', str(range_len))
 
-            record.raw_stream = OffsetLimitReader(record.raw_stream, range_start, range_len)
+            # payload may already be skipped up to range start by warcserver
+            range_offset = range_start - range_skipped
+
+            if isinstance(record.raw_stream, FileRangeReader):
+                record.raw_stream.skip(range_offset)
+                record.raw_stream.limit = min(record.raw_stream.limit, range_len)
+            else:
+                record.raw_stream = OffsetLimitReader(record.raw_stream,
+                                                      range_offset,
+                                                      range_len)
             return True
 
         except (ValueError, TypeError):
             pass
 
+    def use_payload_location(self, wb_url, kwargs, range_start):
+        """Return true if the payload is not rewritten and may be read
+        from the local WARC file, if file passthrough is enabled
+
+        :param WbUrl wb_url: The WbUrl for the URL being replayed
+        :param dict kwargs: The kwargs for the current request
+        :param range_start: The start of the requested range, if any
+        :rtype: bool
+        """
+        return (self.file_passthrough and kwargs.get('type') != 'record' and
+                (wb_url.mod == 'id_' or range_start is not None))
+
+    def _open_payload_location(self, stream, payload_location):
+        """Open the payload from the local file location returned by
+        warcserver, instead of the omitted payload in stream
+
+        :param stream: The (empty) payload stream from warcserver
+        :param str payload_location: The payload '<offset> <length> <quoted path>'
+        :return: A reader of the payload from the local file
+        :rtype: FileRangeReader
+        """
+        no_except_close(stream)
+
+        offset, length, path = payload_location.split(' ', 2)
+        return FileRangeReader(unquote(path), int(offset), int(length))
+
     def send_redirect(self, new_path, url_parts, urlrewriter):
         scheme, netloc, path, query, frag = url_parts
         path = new_path
@@ -429,7 +563,7 @@ class RewriterApp(object):
                                                              environ.get('HTTP_COOKIE', ''))
                 inputreq.extra_cookie, setcookie_headers = res
 
-        r = self._do_req(inputreq, wb_url, kwargs, skip_record)
+        r = self._do_req(inputreq, wb_url, kwargs, skip_record, range_start)
 
         if r.status_code >= 400:
             error = None
@@ -452,7 +586,9 @@ class RewriterApp(object):
             else:
                 raise UpstreamException(r.status_code, url=wb_url.url, details=details)
 
-        cdx = CDXObject(r.headers.get('Warcserver-Cdx').encode('utf-8'))
+        cdx = getattr(r, 'cdx', None)
+        if cdx is None:
+            cdx = CDXObject(r.headers.get('Warcserver-Cdx').encode('utf-8'))
 
         cdx_url_parts = urlsplit(cdx['url'])
 
@@ -473,10 +609,6 @@ class RewriterApp(object):
             no_except_close(r.raw)
             return self.format_response(response, wb_url, full_prefix, is_timegate, is_proxy, cdx['timestamp'])
 
-        stream = BufferedReader(r.raw, block_size=BUFF_SIZE)
-        record = self.loader.parse_record_stream(stream,
-                                                 ensure_http_headers=True)
-
         memento_dt = r.headers.get('Memento-Datetime')
         target_uri = r.headers.get('WARC-Target-URI')
 
@@ -511,44 +643,48 @@ class RewriterApp(object):
                     else:
                         resp.status_headers['Link'] = MementoUtils.make_link(target_uri, 'original')
 
+                no_except_close(r.raw)
                 return resp
 
-        self._add_custom_params(cdx, r.headers, kwargs, record)
+        cache_headers = None
+        if not history_page and not setcookie_headers and range_start is None:
+            cache_headers = self.get_cache_headers(cdx, wb_url, kwargs, full_prefix, is_ajax, environ)
 
-        if self._add_range(record, wb_url, range_start, range_end):
-            wb_url.mod = 'id_'
+        # capture not modified, no need to load or rewrite the record
+        if cache_headers and self.is_not_modified(environ, cache_headers, wb_url, cdx):
+            no_except_close(r.raw)
+            return WbResponse(StatusAndHeaders('304 Not Modified', cache_headers))
 
-        if is_ajax:
-            head_insert_func = None
-            urlrewriter.rewrite_opts['is_ajax'] = True
-        else:
-            top_url = self.get_top_url(full_prefix, wb_url, cdx, kwargs)
-            head_insert_func = (self.head_insert_view.
-                                create_insert_func(wb_url,
-                                                   full_prefix,
-                                                   host_prefix,
-                                                   top_url,
-                                                   environ,
-                                                   framed_replay,
-                                                   coll=kwargs.get('coll', ''),
-                                                   replay_mod=self.replay_mod,
-                                                   metadata=kwargs.get('metadata', {}),
-                                                   ui=kwargs.get('ui', {}),
-                                                   config=self.config))
+        stream = BufferedReader(r.raw, block_size=BUFF_SIZE)
+        record = self.loader.parse_record_stream(stream,
+                                                 ensure_http_headers=True)
 
-        cookie_rewriter = None
-        if self.cookie_tracker and cookie_key:
-            # skip add cookie if service worker is not 200
-            # it seems cookie headers from service workers are not applied, so don't update in cache
-            if wb_url.mod == 'sw_':
-                cookie_key = None
+        # only trust payload location if requested, never from remote warcserver response alone
+        payload_location = None
+        if self.use_payload_location(wb_url, kwargs, range_start):
+            payload_location = r.headers.get('Warcserver-Payload-Location')
 
-            cookie_rewriter = self.cookie_tracker.get_rewriter(urlrewriter,
-                                                               cookie_key)
+        if payload_location:
+            record.raw_stream = self._open_payload_location(record.raw_stream,
+                                                            payload_location)
 
-        urlrewriter.rewrite_opts['ua_string'] = environ.get('HTTP_USER_AGENT')
+        self._add_custom_params(cdx, r.headers, kwargs, record)
+
+        range_skipped = int(r.headers.get('Warcserver-Range-Skipped', 0))
 
-        result = content_rw(record, urlrewriter, cookie_rewriter, head_insert_func, cdx, environ)
+        if self._add_range(record, wb_url, range_start, range_end, range_skipped):
+            wb_url.mod = 'id_'
+
+        # content never rewritten (eg. images, video): skip rewriting setup,
+        # only rewrite headers and stream payload as is
+        if not history_page and not cookie_key and content_rw.is_passthrough(cdx, record, wb_url.mod):
+            result = content_rw.passthrough(record, urlrewriter, cdx=cdx, environ=environ)
+
+        else:
+            result = self._rewrite_content(record, cdx, content_rw, urlrewriter,
+                                           wb_url, kwargs, environ, is_ajax,
+                                           full_prefix, host_prefix, framed_replay,
+                                           cookie_key)
 
         status_headers, gen, is_rw = result
 
@@ -584,16 +720,54 @@ class RewriterApp(object):
         if not is_proxy:
             self.add_csp_header(wb_url, status_headers)
 
+        if cache_headers and status_headers.statusline.startswith('200'):
+            for name, value in cache_headers:
+                status_headers.replace_header(name, value)
+
         response = WbResponse(status_headers, gen)
 
         if is_proxy and environ.get('HTTP_ORIGIN'):
             response.add_access_control_headers(environ)
 
         if r.status_code == 200 and kwargs.get('cache') == 'always' and environ.get('HTTP_REFERER'):
-            response.status_headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+            response.status_headers['Cache-Control'] = self.IMMUTABLE_CACHE_CONTROL
 
         return response
 
+    def _rewrite_content(self, record, cdx, content_rw, urlrewriter, wb_url, kwargs, environ,
+                         is_ajax, full_prefix, host_prefix, framed_replay, cookie_key):
+        if is_ajax:
+            head_insert_func = None
+            urlrewriter.rewrite_opts['is_ajax'] = True
+        else:
+            top_url = self.get_top_url(full_prefix, wb_url, cdx, kwargs)
+            head_insert_func = (self.head_insert_view.
+                                create_insert_func(wb_url,
+                                                   full_prefix,
+                                                   host_prefix,
+                                                   top_url,
+                                                   environ,
+                                                   framed_replay,
+                                                   coll=kwargs.get('coll', ''),
+                                                   replay_mod=self.replay_mod,
+                                                   metadata=kwargs.get('metadata', {}),
+                                                   ui=kwargs.get('ui', {}),
+                                                   config=self.config))
+
+        cookie_rewriter = None
+        if self.cookie_tracker and cookie_key:
+            # skip add cookie if service worker is not 200
+            # it seems cookie headers from service workers are not applied, so don't update in cache
+            if wb_url.mod == 'sw_':
+                cookie_key = None
+
+            cookie_rewriter = self.cookie_tracker.get_rewriter(urlrewriter,
+                                                               cookie_key)
+
+        urlrewriter.rewrite_opts['ua_string'] = environ.get('HTTP_USER_AGENT')
+
+        return content_rw(record, urlrewriter, cookie_rewriter, head_insert_func, cdx, environ)
+
     def format_response(self, response, wb_url, full_prefix, is_timegate, is_proxy, timegate_closest_ts=None):
         memento_ts = None
         if not isinstance(response, WbResponse):
@@ -713,7 +887,7 @@ class RewriterApp(object):
 
         return WbResponse.text_response(resp, status=status, content_type='text/html')
 
-    def _do_req(self, inputreq, wb_url, kwargs, skip_record):
+    def _do_req(self, inputreq, wb_url, kwargs, skip_record, range_start=None):
         req_data = inputreq.reconstruct_request(wb_url.url)
 
         headers = {'Content-Length': str(len(req_data)),
@@ -734,12 +908,30 @@ class RewriterApp(object):
         if wb_url.mod == 'vi_':
             params['content_type'] = self.VIDEO_INFO_CONTENT_TYPE
 
+        # allow warcserver to skip payload up to range start
+        if range_start:
+            params['range_start'] = range_start
+
+        # payload not rewritten, may be sent from local file as is
+        if self.use_payload_location(wb_url, kwargs, range_start):
+            params['payload_location'] = '1'
+
         upstream_url = self.get_upstream_url(wb_url, kwargs, params)
 
-        r = requests.post(upstream_url,
-                          data=BytesIO(req_data),
-                          headers=headers,
-                          stream=True)
+        if self.inprocess_client and self.inprocess_client.handles(upstream_url):
+            return self.inprocess_client.post(upstream_url,
+                                              data=req_data,
+                                              headers=headers)
+
+        if self.upstream_pool and self.upstream_pool.handles(upstream_url):
+            post = self.upstream_pool.post
+        else:
+            post = requests.post
+
+        r = post(upstream_url,
+                 data=BytesIO(req_data),
+                 headers=headers,
+                 stream=True)
 
         return r
 
@@ -767,7 +959,12 @@ class RewriterApp(object):
         upstream_url = self.get_upstream_url(wb_url, kwargs, params)
         upstream_url = upstream_url.replace('/resource/postreq', '/index')
 
-        r = requests.get(upstream_url)
+        if self.upstream_pool and self.upstream_pool.handles(upstream_url):
+            r = self.upstream_pool.get(upstream_url)
+        elif self.inprocess_client and self.inprocess_client.handles(upstream_url):
+            r = self.inprocess_client.get(upstream_url)
+        else:
+            r = requests.get(upstream_url)
 
         return r
 
@@ -861,6 +1058,93 @@ class RewriterApp(object):
 
         return False
 
+    def get_cache_headers(self, cdx, wb_url, kwargs, full_prefix, is_ajax, environ):
+        """Return the ETag, Last-Modified and, in 'exact' cache mode, Cache-Control
+        headers for the replay of an archived capture, or None if the response
+        is not determined by the capture alone (live, recording, non-200 captures)
+
+        The ETag is weak unless the capture is replayed as is (id_ mode).
+        As a stored Content-Encoding is kept or removed depending on the
+        Accept-Encoding, the codings accepted are part of a strong ETag
+
+        :param CDXObject cdx: The cdx line of the capture
+        :param WbUrl wb_url: The WbUrl of the request
+        :param dict kwargs: The collection config
+        :param str full_prefix: The replay prefix
+        :param bool is_ajax: Is the request an ajax request
+        :param dict environ: The WSGI environment dictionary for the request
+        :return: List of headers or None
+        :rtype: list[tuple[str, str]]|None
+        """
+        if not self.enable_validators or cdx.get('is_live'):
+            return None
+
+        if kwargs.get('type') != 'replay' or cdx.get('status', '-') not in ('200', '-'):
+            return None
+
+        identity = [self.etag_version,
+                    self._config_digest(kwargs),
+                    repr(self.get_templates_mtime(environ)),
+                    kwargs.get('coll', ''),
+                    cdx['timestamp'],
+                    cdx.get('digest', '-'),
+                    cdx.get('filename', '-'),
+                    cdx.get('offset', '-'),
+                    wb_url.url,
+                    wb_url.timestamp,
+                    wb_url.mod,
+                    full_prefix,
+                    str(bool(is_ajax))]
+
+        if wb_url.mod == 'id_':
+            accepted = parse_accept_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+            identity.append(repr(sorted((coding, q > 0) for coding, q in accepted.items())))
+
+        etag = '"' + hashlib.sha1('\n'.join(identity).encode('utf-8')).hexdigest() + '"'
+        if wb_url.mod != 'id_':
+            etag = 'W/' + etag
+
+        headers = [('ETag', etag),
+                   ('Last-Modified', timestamp_to_http_date(cdx['timestamp']))]
+
+        if kwargs.get('cache', self.config.get('cache')) == 'exact':
+            if wb_url.mod == 'id_' or wb_url.timestamp == cdx['timestamp']:
+                headers.append(('Cache-Control', self.IMMUTABLE_CACHE_CONTROL))
+
+        return headers
+
+    def is_not_modified(self, environ, cache_headers, wb_url, cdx):
+        """Determine if the request is a conditional request matching the capture,
+        If-Modified-Since only being checked for requests for the exact timestamp
+
+        :param dict environ: The WSGI environment dictionary for the request
+        :param list cache_headers: The headers returned by get_cache_headers
+        :param WbUrl wb_url: The WbUrl of the request
+        :param CDXObject cdx: The cdx line of the capture
+        :return: True if a 304 Not Modified can be returned
+        :rtype: bool
+        """
+        if environ.get('REQUEST_METHOD', 'GET') not in ('GET', 'HEAD'):
+            return False
+
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            if if_none_match.strip() == '*':
+                return True
+
+            etag = cache_headers[0][1].replace('W/', '', 1)
+            return any(tag.strip().replace('W/', '', 1) == etag
+                       for tag in if_none_match.split(','))
+
+        if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since and wb_url.timestamp == cdx['timestamp']:
+            try:
+                return http_date_to_timestamp(if_modified_since) >= cdx['timestamp']
+            except Exception:
+                return False
+
+        return False
+
     def is_ajax(self, environ):
         value = environ.get('HTTP_X_REQUESTED_WITH')
         value = value or environ.get('HTTP_X_PYWB_REQUESTED_WITH')
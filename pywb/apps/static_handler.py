@@ -1,6 +1,7 @@
 import mimetypes
 import os
 
+from pywb.utils.io import wrap_file
 from pywb.utils.loaders import LocalFileLoader
 
 from pywb.apps.wbrequestresponse import WbResponse
@@ -44,7 +45,7 @@ class StaticHandler(object):
 
             if 'wsgi.file_wrapper' in environ:
                 try:
-                    reader = environ['wsgi.file_wrapper'](data)
+                    reader = wrap_file(environ, data)
                 except:
                     pass
 
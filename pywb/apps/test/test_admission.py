@@ -0,0 +1,183 @@
+import threading
+import time
+
+from pywb.apps.admission import AdmissionControl, Bulkhead, ReleasingIter
+from pywb.utils.io import wrap_file
+
+
+# ============================================================================
+def wait_for(cond, timeout=10.0):
+    end = time.time() + timeout
+    while not cond():
+        assert time.time() < end
+        time.sleep(0.01)
+
+
+def acquire_in_thread(bulkhead):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(bulkhead.acquire()))
+    thread.start()
+    return thread, result
+
+
+# ============================================================================
+def test_bulkhead_limit_and_reject():
+    bulkhead = Bulkhead('test', 2, max_queue=0)
+
+    assert bulkhead.acquire()
+    assert bulkhead.acquire()
+    assert not bulkhead.acquire()
+
+    bulkhead.release()
+    assert bulkhead.acquire()
+
+    stats = bulkhead.get_stats()
+    assert stats['active'] == 2
+    assert stats['admitted'] == 3
+    assert stats['rejected'] == 1
+    assert stats['timeouts'] == 0
+
+
+def test_bulkhead_queue_in_order():
+    bulkhead = Bulkhead('test', 1, max_queue=2)
+    assert bulkhead.acquire()
+
+    thread1, result1 = acquire_in_thread(bulkhead)
+    wait_for(lambda: bulkhead.get_stats()['queued'] == 1)
+
+    thread2, result2 = acquire_in_thread(bulkhead)
+    wait_for(lambda: bulkhead.get_stats()['queued'] == 2)
+
+    # queue full
+    assert not bulkhead.acquire()
+
+    # slot handed over to first waiter
+    bulkhead.release()
+    thread1.join()
+    assert result1 == [True]
+    assert result2 == []
+    assert bulkhead.get_stats()['active'] == 1
+
+    bulkhead.release()
+    thread2.join()
+    assert result2 == [True]
+
+    bulkhead.release()
+
+    stats = bulkhead.get_stats()
+    assert stats['active'] == 0
+    assert stats['queued'] == 0
+    assert stats['admitted'] == 3
+    assert stats['rejected'] == 1
+
+
+def test_bulkhead_queue_timeout():
+    bulkhead = Bulkhead('test', 1, max_queue=1, queue_timeout=0.1)
+    assert bulkhead.acquire()
+
+    assert not bulkhead.acquire()
+
+    stats = bulkhead.get_stats()
+    assert stats['queued'] == 0
+    assert stats['timeouts'] == 1
+    assert stats['rejected'] == 1
+
+    # slot not handed to timed out waiter
+    bulkhead.release()
+    assert bulkhead.get_stats()['active'] == 0
+
+
+def test_releasing_iter():
+    released = []
+    closed = []
+
+    class Body(object):
+        def __iter__(self):
+            return iter([b'a', b'b'])
+
+        def close(self):
+            closed.append(1)
+
+    body = ReleasingIter(Body(), lambda: released.append(1))
+    assert b''.join(body) == b'ab'
+    assert released == []
+
+    body.close()
+    body.close()
+    assert closed == [1, 1]
+    assert released == [1]
+
+
+# ============================================================================
+def test_admission_control_per_collection():
+    valid = ('a', 'b', 'c')
+    admission = AdmissionControl.from_config({'max_concurrent': 3,
+                                              'max_queue': 0,
+                                              'per_collection': {'max_concurrent': 1, 'max_queue': 0},
+                                              'collections': {'c': {'max_concurrent': 2, 'max_queue': 0}}},
+                                             is_valid_coll=lambda coll: coll in valid)
+
+    held_a = admission.acquire('a')
+    assert len(held_a) == 2
+
+    # collection full, other collections still admitted
+    assert admission.acquire('a') is None
+    held_b = admission.acquire('b')
+    assert held_b
+
+    # configured limit for collection
+    held_c = admission.acquire('c')
+    assert held_c
+
+    # global limit reached, collection slot released
+    assert admission.acquire('c') is None
+    assert admission.get_coll_bulkhead('c').get_stats()['active'] == 1
+
+    # no bulkhead for invalid collection
+    assert admission.get_coll_bulkhead('x') is None
+
+    admission.release(held_a)
+    assert admission.acquire('c')
+
+    stats = admission.get_stats()
+    assert stats['global']['active'] == 3
+    assert stats['global']['rejected'] == 1
+    assert stats['collections']['a']['rejected'] == 1
+    assert stats['collections']['a']['active'] == 0
+    assert stats['collections']['c']['active'] == 2
+    assert 'x' not in stats['collections']
+
+
+def test_admission_control_not_configured():
+    assert AdmissionControl.from_config(None) is None
+
+    # no limits
+    admission = AdmissionControl.from_config({'retry_after': 10})
+    assert admission.acquire('a') == []
+
+    resp = admission.unavailable_response()
+    assert resp.status_headers.statusline == '503 Service Unavailable'
+    assert resp.status_headers.get_header('Retry-After') == '10'
+
+
+def test_release_on_close_file_wrapper_func():
+    admission = AdmissionControl.from_config({'max_concurrent': 1})
+
+    # uWSGI-style file wrapper is a function, not a type
+    environ = {'wsgi.file_wrapper': lambda filelike, block_size: iter([filelike])}
+
+    held = admission.acquire('a')
+    assert admission.get_stats()['global']['active'] == 1
+
+    body = wrap_file(environ, b'data')
+    assert admission.release_on_close(body, held, environ) is body
+    assert admission.get_stats()['global']['active'] == 0
+
+    # other bodies held until closed
+    held = admission.acquire('a')
+    body = admission.release_on_close(iter([b'data']), held, environ)
+    assert isinstance(body, ReleasingIter)
+    assert admission.get_stats()['global']['active'] == 1
+
+    body.close()
+    assert admission.get_stats()['global']['active'] == 0
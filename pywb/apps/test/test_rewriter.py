@@ -1,4 +1,4 @@
-from gevent import monkey; monkey.patch_all(thread=False)
+from gevent import monkey; monkey.patch_all()
 
 from pywb.warcserver.test.testutils import LiveServerTests, BaseTestClass
 from pywb.warcserver.test.testutils import FakeRedisTests
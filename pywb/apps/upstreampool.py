@@ -0,0 +1,266 @@
+import logging
+import threading
+import time
+
+import requests
+import six
+from requests.adapters import HTTPAdapter
+
+from pywb.utils.io import no_except_close
+
+logger = logging.getLogger('warcserver')
+
+
+# ============================================================================
+class UpstreamNode(object):
+    """ An upstream warcserver, with a keep-alive connection pool
+    and its current load and health
+    """
+    def __init__(self, url, pool_size):
+        self.url = url if url.endswith('/') else url + '/'
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.outstanding = 0
+        self.num_requests = 0
+        self.failures = 0
+        self.latency = None
+
+        self.ejected = False
+        self.ejected_at = 0
+
+    def get_stats(self):
+        return {'url': self.url,
+                'outstanding': self.outstanding,
+                'requests': self.num_requests,
+                'failures': self.failures,
+                'ejected': self.ejected,
+                'latency': self.latency,
+               }
+
+
+# ============================================================================
+class UpstreamPool(object):
+    """ Pool of warcservers serving the same collections.
+
+    Requests for urls starting with the pool prefix are sent to one of the
+    upstream warcservers, the one with the fewest outstanding requests
+    (requests awaiting a response). Nodes are ejected from the pool for
+    eject_time secs after max_failures consecutive connection errors or
+    timeouts, after failing a health check, or if their average response
+    time exceeds slow_factor times that of the other nodes. Requests failing
+    to connect are retried on another node.
+    """
+    POOL_SIZE = 10
+    TIMEOUT = 30
+    MAX_FAILURES = 3
+    EJECT_TIME = 30
+    HEALTH_CHECK_INTERVAL = 10
+    HEALTH_CHECK_TIMEOUT = 5
+    SLOW_FACTOR = 5.0
+    MIN_SLOW_TIME = 0.5
+    LATENCY_WEIGHT = 0.2
+
+    def __init__(self, urls, prefix=None,
+                 pool_size=None,
+                 timeout=None,
+                 max_failures=None,
+                 eject_time=None,
+                 health_check_interval=None,
+                 slow_factor=None):
+
+        if not urls:
+            raise ValueError('at least one upstream url is required')
+
+        pool_size = pool_size or self.POOL_SIZE
+        self.nodes = [UpstreamNode(url, pool_size) for url in urls]
+
+        self.prefix = prefix or self.nodes[0].url
+
+        self.timeout = timeout or self.TIMEOUT
+        self.max_failures = max_failures or self.MAX_FAILURES
+        self.eject_time = self.EJECT_TIME if eject_time is None else eject_time
+        self.slow_factor = slow_factor or self.SLOW_FACTOR
+
+        if health_check_interval is None:
+            health_check_interval = self.HEALTH_CHECK_INTERVAL
+
+        self.health_check_interval = health_check_interval
+
+        self.lock = threading.Lock()
+
+        self._closed = False
+        if health_check_interval:
+            thread = threading.Thread(target=self._health_check_loop)
+            thread.daemon = True
+            thread.start()
+
+    @classmethod
+    def from_config(cls, config, prefix=None):
+        """ Create pool from a list of upstream urls, or a dict with the list
+        as 'urls' and other options, returning None if not configured
+        """
+        if not config:
+            return None
+
+        if isinstance(config, six.string_types):
+            config = [config]
+
+        if isinstance(config, list):
+            config = {'urls': config}
+
+        return cls(config.get('urls'), prefix=prefix,
+                   pool_size=config.get('pool_size'),
+                   timeout=config.get('timeout'),
+                   max_failures=config.get('max_failures'),
+                   eject_time=config.get('eject_time'),
+                   health_check_interval=config.get('health_check_interval'),
+                   slow_factor=config.get('slow_factor'))
+
+    def handles(self, url):
+        return url.startswith(self.prefix)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        """ Send request for url, starting with the pool prefix, to an upstream node
+        """
+        path = url[len(self.prefix):]
+        kwargs.setdefault('timeout', self.timeout)
+
+        data = kwargs.get('data')
+
+        tried = []
+        while True:
+            node = self.select(exclude=tried)
+            tried.append(node)
+
+            with self.lock:
+                node.outstanding += 1
+                node.num_requests += 1
+
+            start = time.time()
+            try:
+                res = node.session.request(method, node.url + path, **kwargs)
+
+            except (requests.ConnectionError, requests.Timeout) as e:
+                logger.debug('Upstream {0} failed: {1}'.format(node.url, e))
+                self._on_failure(node)
+
+                if len(tried) == len(self.nodes):
+                    raise
+
+                if hasattr(data, 'seek'):
+                    data.seek(0)
+
+                continue
+
+            finally:
+                with self.lock:
+                    node.outstanding -= 1
+
+            self._on_success(node, time.time() - start)
+            return res
+
+    def select(self, exclude=None):
+        """ Select available node with fewest outstanding requests,
+        or fastest if equal, from all nodes if none available
+        """
+        now = time.time()
+
+        with self.lock:
+            if not self.health_check_interval:
+                for node in self.nodes:
+                    if node.ejected and now - node.ejected_at >= self.eject_time:
+                        self._readmit(node)
+
+            nodes = [node for node in self.nodes if not exclude or node not in exclude]
+
+            available = [node for node in nodes if not node.ejected] or nodes
+
+            return min(available, key=lambda node: (node.outstanding, node.latency or 0))
+
+    def _on_failure(self, node):
+        with self.lock:
+            node.failures += 1
+            if node.failures >= self.max_failures:
+                self._eject(node, 'failed {0} times'.format(node.failures))
+
+    def _on_success(self, node, elapsed):
+        with self.lock:
+            node.failures = 0
+
+            if node.latency is None:
+                node.latency = elapsed
+            else:
+                node.latency += (elapsed - node.latency) * self.LATENCY_WEIGHT
+
+            if node.latency < self.MIN_SLOW_TIME or node.ejected:
+                return
+
+            others = sorted(other.latency for other in self.nodes
+                            if other is not node and not other.ejected and
+                            other.latency is not None)
+
+            if others and node.latency > others[len(others) // 2] * self.slow_factor:
+                self._eject(node, 'slow, {0:.3f}s avg'.format(node.latency))
+
+    def _eject(self, node, reason):
+        if not node.ejected:
+            logger.warning('Ejecting upstream {0}: {1}'.format(node.url, reason))
+            node.ejected = True
+
+        node.ejected_at = time.time()
+
+    def _readmit(self, node):
+        node.ejected = False
+        node.failures = 0
+        node.latency = None
+
+    def check_health(self):
+        """ Check each node, ejecting nodes failing the check,
+        and readmitting healthy ejected nodes after eject_time
+        """
+        for node in self.nodes:
+            res = None
+            try:
+                res = node.session.get(node.url, timeout=self.HEALTH_CHECK_TIMEOUT)
+                healthy = res.status_code < 500
+            except Exception:
+                healthy = False
+            finally:
+                if res is not None:
+                    no_except_close(res)
+
+            with self.lock:
+                if not healthy:
+                    self._eject(node, 'health check failed')
+                elif node.ejected and time.time() - node.ejected_at >= self.eject_time:
+                    self._readmit(node)
+
+    def _health_check_loop(self):
+        while not self._closed:
+            time.sleep(self.health_check_interval)
+            if self._closed:
+                break
+
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.debug('Upstream health check error: ' + str(e))
+
+    def get_stats(self):
+        with self.lock:
+            return [node.get_stats() for node in self.nodes]
+
+    def close(self):
+        self._closed = True
+        for node in self.nodes:
+            no_except_close(node.session)
@@ -5,6 +5,7 @@ from pywb.utils.io import BUFF_SIZE
 
 from warcio.timeutils import iso_date_to_timestamp
 from warcio.archiveiterator import ArchiveIterator
+from warcio.limitreader import LimitReader
 
 import hashlib
 import base64
@@ -135,11 +136,48 @@ class DefaultRecordParser(object):
     def create_payload_buffer(self, entry):
         return None
 
+    def skip_payload(self, raw_iter, record):
+        """ Skip the remainder of the record payload without reading it,
+        by seeking past it using the record Content-Length.
+
+        Only possible for uncompressed, seekable input: a gzip member
+        must still be inflated to find where the next member begins,
+        so compressed input is read normally by read_to_end()
+
+        :return: True if the payload was skipped, False otherwise
+        """
+        reader = raw_iter.reader
+        stream = record.raw_stream
+
+        if reader.decompressor or not isinstance(stream, LimitReader):
+            return False
+
+        fh = raw_iter.fh
+        try:
+            if not fh.seekable():
+                return False
+        except Exception:
+            return False
+
+        remaining = stream.limit
+        buffered = reader.rem_length()
+
+        if remaining <= buffered:
+            reader.buff.seek(remaining, 1)
+        else:
+            reader.buff = None
+            reader.buff_size = 0
+            fh.seek(remaining - buffered, 1)
+
+        stream.limit = 0
+        return True
+
     def create_record_iter(self, raw_iter):
         append_post = self.options.get('append_post')
         include_all = self.options.get('include_all')
         surt_ordered = self.options.get('surt_ordered', True)
         minimal = self.options.get('minimal')
+        headers_only = self.options.get('headers_only')
 
         if append_post and minimal:
             raise Exception('Sorry, minimal index option and ' +
@@ -196,6 +234,11 @@ class DefaultRecordParser(object):
 
             self.begin_payload(compute_digest, entry)
 
+            # payload not needed, skip it instead of reading it
+            if (headers_only and not compute_digest and
+                not entry.get('_post_query') and not entry.buffer):
+                self.skip_payload(raw_iter, record)
+
             while True:
                 buff = record.raw_stream.read(BUFF_SIZE)
                 if not buff:
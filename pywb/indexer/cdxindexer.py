@@ -1,3 +1,5 @@
+import copy
+import gzip
 import logging
 import os
 import sys
@@ -35,6 +37,10 @@ from argparse import ArgumentParser, RawTextHelpFormatter
 from six import StringIO
 
 from pywb.indexer.archiveindexer import DefaultRecordParser
+from pywb.warcserver.index.digestindex import DigestIndex
+from pywb.utils.gzipseek import GzipSeekIndex
+
+from contextlib import contextmanager
 import codecs
 import six
 
@@ -62,6 +68,10 @@ class BaseCDXWriter(object):
 
         self.write_cdx_line(self.out, entry, filename)
 
+    def write_lines(self, lines):
+        for line in lines:
+            self.out.write(line)
+
     def _is_skipped(self, entry):
         if entry.record.rec_type == 'warcinfo':
             return True
@@ -172,12 +182,190 @@ class SortedCDXWriter(BaseCDXWriter):
         if line:
             self.sortlist.append(line)
 
+    def write_lines(self, lines):
+        self.sortlist.extend(lines)
+
     def __exit__(self, *args):
         self.sortlist.sort()
         self.actual_out.write(''.join(self.sortlist))
         return False
 
 
+#=================================================================
+class LineCollectingCDXWriter(BaseCDXWriter):
+    """ Collect formatted cdx lines in a list, without a header,
+    for stitching together index chunks
+    """
+    def __init__(self, out=None):
+        self.out = None
+
+    def __enter__(self):
+        self.lines = []
+        return self
+
+    def write(self, entry, filename):
+        self.out = StringIO()
+        super(LineCollectingCDXWriter, self).write(entry, filename)
+        line = self.out.getvalue()
+        if line:
+            self.lines.append(line)
+
+
+#=================================================================
+class DigestIndexWriter(object):
+    """ Write a sorted digest index sidecar (see DigestIndex),
+    mapping payload digest to the location of each non-revisit record
+    """
+    INDEX_REC_TYPES = ('response', 'resource')
+
+    def __init__(self, out):
+        self.out = codecs.getwriter('utf-8')(out)
+
+    def __enter__(self):
+        self.lines = []
+        return self
+
+    @classmethod
+    def to_line(cls, entry, filename):
+        if entry.record.rec_type not in cls.INDEX_REC_TYPES:
+            return None
+
+        digest = entry.get('digest')
+        if not digest or digest == '-':
+            return None
+
+        return DigestIndex.to_line(digest, filename,
+                                   entry['offset'], entry['length'],
+                                   entry.get('mime'), entry.get('status'))
+
+    def write(self, entry, filename):
+        line = self.to_line(entry, filename)
+        if line:
+            self.lines.append(line)
+
+    def write_lines(self, lines):
+        self.lines.extend(lines)
+
+    def __exit__(self, *args):
+        self.lines.sort()
+        self.out.write(''.join(self.lines))
+        return False
+
+
+#=================================================================
+@contextmanager
+def open_digest_index_writer(options):
+    """ Open DigestIndexWriter for 'digest_index' output path option,
+    if any, and set it as the 'digest_writer' option
+    """
+    path = options.get('digest_index')
+    if not path or options.get('digest_writer'):
+        yield options.get('digest_writer')
+        return
+
+    with open(path, 'wb') as out:
+        with DigestIndexWriter(out) as digest_writer:
+            options['digest_writer'] = digest_writer
+            try:
+                yield digest_writer
+            finally:
+                options.pop('digest_writer', None)
+
+
+#=================================================================
+class RevisitResolvingWriter(object):
+    """ Wrap a cdx writer, adding the orig.filename, orig.offset and
+    orig.length of the original record to each revisit entry,
+    so that the original can be loaded without a lookup at replay time.
+
+    Originals are matched by payload digest, so that revisits of both
+    the same and a different url are resolved. Originals are those
+    indexed so far, or found in an optional existing DigestIndex.
+    Revisits with no original found yet are written last,
+    once all entries have been seen
+    """
+    ORIG_FIELDS = ('orig.filename', 'orig.offset', 'orig.length')
+
+    def __init__(self, writer, digest_index=None):
+        self.writer = writer
+        self.digest_index = digest_index
+        self.originals = {}
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def _get_digest(self, entry):
+        digest = entry.get('digest')
+        if digest and digest != '-':
+            return digest
+
+        return None
+
+    def _find_original(self, digest):
+        orig = self.originals.get(digest)
+        if orig or not self.digest_index:
+            return orig
+
+        orig_cdx = next(self.digest_index.lookup(digest), None)
+        if orig_cdx:
+            orig = (orig_cdx['filename'], orig_cdx['offset'], orig_cdx['length'])
+            self.originals[digest] = orig
+
+        return orig
+
+    def _resolve(self, entry, digest):
+        orig = self._find_original(digest)
+        if not orig:
+            return False
+
+        for name, value in zip(self.ORIG_FIELDS, orig):
+            entry[name] = value
+
+        return True
+
+    def write(self, entry, filename):
+        digest = self._get_digest(entry)
+
+        if entry.record.rec_type == 'revisit':
+            if digest and not self._resolve(entry, digest):
+                # parser may reuse entry for the next record
+                self.pending.append((copy.copy(entry), filename))
+                return
+
+        elif digest and entry.record.rec_type in DigestIndexWriter.INDEX_REC_TYPES:
+            self.originals.setdefault(digest, (filename, entry['offset'], entry['length']))
+
+        self.writer.write(entry, filename)
+
+    def __exit__(self, *args):
+        for entry, filename in self.pending:
+            self._resolve(entry, self._get_digest(entry))
+            self.writer.write(entry, filename)
+
+        self.pending = []
+        return False
+
+
+#=================================================================
+@contextmanager
+def open_revisit_resolver(writer, options):
+    """ Wrap writer in a RevisitResolvingWriter if 'resolve_revisits'
+    option is set. If 'orig_digest_index' path is also set, originals
+    are also looked up in the existing digest index at that path
+    """
+    if not options.get('resolve_revisits'):
+        yield writer
+        return
+
+    digest_index = None
+    if options.get('orig_digest_index'):
+        digest_index = DigestIndex(options['orig_digest_index'])
+
+    with RevisitResolvingWriter(writer, digest_index) as resolving_writer:
+        yield resolving_writer
+
+
 #=================================================================
 ALLOWED_EXT = ('.arc', '.arc.gz', '.warc', '.warc.gz')
 
@@ -237,7 +425,7 @@ def cdx_filename(filename):
 
 #=================================================================
 def get_cdx_writer_cls(options):
-    if options.get('minimal'):
+    if options.get('minimal') or options.get('resolve_revisits'):
         options['cdxj'] = True
 
     writer_cls = options.get('writer_cls')
@@ -262,8 +450,47 @@ def get_cdx_writer_cls(options):
     return CDXWriter
 
 
+#=================================================================
+def _is_parallel(fullpath, options):
+    # revisits are resolved from index entries, not formatted lines
+    if options.get('resolve_revisits'):
+        return False
+
+    # single gzip member files can not be split
+    if options.get('seek_index'):
+        return False
+
+    return options.get('workers', 1) > 1 and fullpath.endswith('.warc.gz')
+
+
+#=================================================================
+@contextmanager
+def open_archive(fullpath, options):
+    """ Open archive file at fullpath for indexing.
+
+    With seek_index, if fullpath is a .gz file compressed as a single
+    gzip member, build a seek index sidecar for it and read it decompressed,
+    so that records are indexed by uncompressed offset and length
+    """
+    if options.get('seek_index') and fullpath.endswith('.gz'):
+        interval = options.get('seek_interval')
+        if GzipSeekIndex.build(fullpath, interval):
+            with gzip.open(fullpath, 'rb') as infile:
+                yield infile
+
+            return
+
+    with open(fullpath, 'rb') as infile:
+        yield infile
+
+
 #=================================================================
 def write_multi_cdx_index(output, inputs, **options):
+    with open_digest_index_writer(options):
+        return _write_multi_cdx_index(output, inputs, **options)
+
+
+def _write_multi_cdx_index(output, inputs, **options):
     recurse = options.get('recurse', False)
     rel_root = options.get('rel_root')
 
@@ -276,7 +503,12 @@ def write_multi_cdx_index(output, inputs, **options):
             outpath = os.path.join(output, outpath)
 
             with open(outpath, 'wb') as outfile:
-                with open(fullpath, 'rb') as infile:
+                if _is_parallel(fullpath, options):
+                    writer = write_parallel_cdx_index(outfile, fullpath,
+                                                      filename, **options)
+                    continue
+
+                with open_archive(fullpath, options) as infile:
                     writer = write_cdx_index(outfile, infile, filename,
                                              **options)
 
@@ -294,17 +526,26 @@ def write_multi_cdx_index(output, inputs, **options):
 
         writer_cls = get_cdx_writer_cls(options)
         record_iter = DefaultRecordParser(**options)
+        digest_writer = options.get('digest_writer')
 
-        with writer_cls(outfile) as writer:
+        with writer_cls(outfile) as writer, open_revisit_resolver(writer, options) as entry_writer:
             for fullpath, filename in iter_file_or_dir(inputs,
                                                        recurse,
                                                        rel_root):
-                with open(fullpath, 'rb') as infile:
+                if _is_parallel(fullpath, options):
+                    from pywb.indexer.parallelindexer import iter_parallel_cdx_lines
+                    writer.write_lines(iter_parallel_cdx_lines(fullpath, filename,
+                                                               **options))
+                    continue
+
+                with open_archive(fullpath, options) as infile:
                     entry_iter = record_iter(infile)
 
                     try:
                         for entry in entry_iter:
-                            writer.write(entry, filename)
+                            entry_writer.write(entry, filename)
+                            if digest_writer:
+                                digest_writer.write(entry, filename)
                     except warcio.exceptions.ArchiveLoadFailed:
                         logging.error('Error while indexing file %s, %s',filename,traceback.format_exc())
 
@@ -317,11 +558,30 @@ def write_cdx_index(outfile, infile, filename, **options):
 
     writer_cls = get_cdx_writer_cls(options)
 
-    with writer_cls(outfile) as writer:
-        entry_iter = DefaultRecordParser(**options)(infile)
+    with open_digest_index_writer(options) as digest_writer:
+        with writer_cls(outfile) as writer, open_revisit_resolver(writer, options) as entry_writer:
+            entry_iter = DefaultRecordParser(**options)(infile)
+
+            for entry in entry_iter:
+                entry_writer.write(entry, filename)
+                if digest_writer:
+                    digest_writer.write(entry, filename)
+
+    return writer
+
+
+#=================================================================
+def write_parallel_cdx_index(outfile, path, filename, **options):
+    """ Index a single per-record gzipped WARC at path using
+    multiple worker processes, see iter_parallel_cdx_lines()
+    """
+    from pywb.indexer.parallelindexer import iter_parallel_cdx_lines
+
+    writer_cls = get_cdx_writer_cls(options)
 
-        for entry in entry_iter:
-            writer.write(entry, filename)
+    with open_digest_index_writer(options):
+        with writer_cls(outfile) as writer:
+            writer.write_lines(iter_parallel_cdx_lines(path, filename, **options))
 
     return writer
 
@@ -380,6 +640,51 @@ POST append (-p) option
 Output CDX JSON format per line, with url timestamp first,
 followed by a json dict for all other fields:
 url timestamp { ... }
+"""
+
+    headers_only_help = """
+Parse only WARC and HTTP headers, skipping over record payloads
+when no digest or POST body needs to be computed from them.
+Payloads are skipped by seeking in uncompressed (W)ARCs,
+compressed files are still fully decompressed.
+"""
+
+    workers_help = """
+Number of worker processes used to index each .warc.gz file.
+Large files are split into chunks at gzip member boundaries,
+which are indexed in parallel. (Default: 1, no parallel indexing)
+"""
+
+    resolve_revisits_help = """
+Resolve revisits to their originals while indexing, adding
+orig.filename, orig.offset and orig.length to each revisit entry,
+so that no additional lookup is needed at replay time.
+Originals are matched by payload digest, across all indexed files.
+Implies CDXJ output, and disables parallel (-w) indexing.
+"""
+
+    orig_digest_index_help = """
+With --resolve-revisits, also look up originals in an existing
+digest index, eg. of previously indexed files
+"""
+
+    digest_index_help = """
+Also write a digest index sidecar to the specified file, mapping
+the payload digest of each non-revisit record to its location,
+to allow resolving revisits without a cdx query.
+"""
+
+    seek_index_help = """
+For .gz files compressed as a single gzip member, rather than
+one gzip member per record, also write a seek index sidecar
+(<file>.zidx) and index records by uncompressed offset and length,
+to allow replay without decompressing from the start of the file.
+Disables parallel (-w) indexing.
+"""
+
+    seek_interval_help = """
+With --seek-index, the uncompressed distance in MB between
+seek points (Default: 1)
 """
 
     output_help = """
@@ -458,6 +763,32 @@ instead of current working directory
                         action='store_true',
                         help=minimal_json_help)
 
+    parser.add_argument('-k', '--headers-only',
+                        action='store_true',
+                        help=headers_only_help)
+
+    parser.add_argument('-w', '--workers',
+                        type=int, default=1,
+                        help=workers_help)
+
+    parser.add_argument('--resolve-revisits',
+                        action='store_true',
+                        help=resolve_revisits_help)
+
+    parser.add_argument('--orig-digest-index',
+                        help=orig_digest_index_help)
+
+    parser.add_argument('--digest-index',
+                        help=digest_index_help)
+
+    parser.add_argument('--seek-index',
+                        action='store_true',
+                        help=seek_index_help)
+
+    parser.add_argument('--seek-interval',
+                        type=float, default=None,
+                        help=seek_interval_help)
+
     parser.add_argument('-o', '--output',
                         default='-', help=output_help)
 
@@ -465,6 +796,10 @@ instead of current working directory
 
     cmd = parser.parse_args(args=args)
 
+    seek_interval = None
+    if cmd.seek_interval:
+        seek_interval = int(cmd.seek_interval * 1024 * 1024)
+
     write_multi_cdx_index(cmd.output, cmd.inputs,
                           sort=cmd.sort,
                           surt_ordered=not cmd.unsurt,
@@ -475,7 +810,14 @@ instead of current working directory
                           verify_http=cmd.verify,
                           cdx09=cmd.cdx09,
                           cdxj=cmd.cdxj,
-                          minimal=cmd.minimal_cdxj)
+                          minimal=cmd.minimal_cdxj,
+                          headers_only=cmd.headers_only,
+                          workers=cmd.workers,
+                          resolve_revisits=cmd.resolve_revisits,
+                          orig_digest_index=cmd.orig_digest_index,
+                          digest_index=cmd.digest_index,
+                          seek_index=cmd.seek_index,
+                          seek_interval=seek_interval)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,230 @@
+from pywb.indexer.archiveindexer import DefaultRecordParser
+
+from warcio.archiveiterator import ArchiveIterator
+from warcio.exceptions import ArchiveLoadFailed
+
+from concurrent.futures import ProcessPoolExecutor
+
+import heapq
+import os
+import zlib
+
+
+GZIP_MAGIC = b'\x1f\x8b\x08'
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+SCAN_BUFF_SIZE = 1024 * 1024
+
+
+#=================================================================
+class RangeReader(object):
+    """ File reader which will not read past an absolute end offset,
+    while preserving the absolute tell() of the underlying file,
+    so that record offsets are relative to the full file
+    """
+    def __init__(self, fh, end):
+        self.fh = fh
+        self.end = end
+
+    def read(self, length=-1):
+        remaining = self.end - self.fh.tell()
+        if remaining <= 0:
+            return b''
+
+        if length is None or length < 0 or length > remaining:
+            length = remaining
+
+        return self.fh.read(length)
+
+    def tell(self):
+        return self.fh.tell()
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self.fh.close()
+
+
+#=================================================================
+def _is_gzip_member(fh, offset):
+    """ Check if a valid gzip member starts at offset, by inflating
+    a few bytes from it
+    """
+    fh.seek(offset)
+    data = fh.read(8192)
+    try:
+        decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        buff = decomp.decompress(data, 16)
+    except zlib.error:
+        return False
+
+    return buff.startswith(b'WARC/')
+
+
+#=================================================================
+def find_member_boundary(fh, start, end, skip_concurrent=False):
+    """ Find offset of first gzip member containing a WARC record
+    beginning at or after start, and before end.
+
+    If skip_concurrent is set, also skip records that are
+    WARC-Concurrent-To a preceding record, so that a request/response pair
+    is never split across two chunks.
+
+    :return: offset of member or end if none found
+    """
+    pos = start
+    while pos < end:
+        fh.seek(pos)
+        # read a few extra bytes to catch magic spanning buffer boundary
+        buff = fh.read(min(SCAN_BUFF_SIZE, end - pos) + len(GZIP_MAGIC) - 1)
+        if not buff:
+            break
+
+        inx = buff.find(GZIP_MAGIC)
+        while inx >= 0 and pos + inx < end:
+            if _is_gzip_member(fh, pos + inx):
+                if not skip_concurrent:
+                    return pos + inx
+
+                return _skip_concurrent_records(fh, pos + inx, end)
+
+            inx = buff.find(GZIP_MAGIC, inx + 1)
+
+        pos += SCAN_BUFF_SIZE
+
+    return end
+
+
+#=================================================================
+def _skip_concurrent_records(fh, offset, end):
+    fh.seek(offset)
+    aiter = ArchiveIterator(fh, no_record_parse=True)
+
+    try:
+        for record in aiter:
+            record_offset = aiter.offset
+            if record_offset >= end:
+                break
+
+            if not record.rec_headers.get_header('WARC-Concurrent-To'):
+                return record_offset
+    except ArchiveLoadFailed:
+        pass
+
+    return end
+
+
+#=================================================================
+def split_chunks(fh, size, chunk_size, skip_concurrent=False):
+    """ Split gzipped archive into (start, end) byte ranges,
+    each starting at a gzip member boundary
+    """
+    boundaries = [0]
+
+    for start in range(chunk_size, size, chunk_size):
+        start = max(start, boundaries[-1] + 1)
+        if start >= size:
+            break
+
+        offset = find_member_boundary(fh, start, size, skip_concurrent)
+        if offset >= size:
+            break
+
+        boundaries.append(offset)
+
+    boundaries.append(size)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+#=================================================================
+def index_chunk(path, filename, start, end, options):
+    """ Index records in [start, end) of path, returning formatted
+    cdx lines (without a header), and digest index lines
+    if 'collect_digests' option is set
+    """
+    from pywb.indexer.cdxindexer import get_cdx_writer_cls, LineCollectingCDXWriter
+    from pywb.indexer.cdxindexer import DigestIndexWriter
+
+    options = dict(options)
+    options['writer_cls'] = LineCollectingCDXWriter
+    options['writer_add_mixin'] = True
+    writer_cls = get_cdx_writer_cls(options)
+
+    collect_digests = options.get('collect_digests')
+    digest_lines = []
+
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+
+        with writer_cls(None) as writer:
+            for entry in DefaultRecordParser(**options)(RangeReader(fh, end)):
+                writer.write(entry, filename)
+
+                if collect_digests:
+                    line = DigestIndexWriter.to_line(entry, filename)
+                    if line:
+                        digest_lines.append(line)
+
+    if options.get('sort'):
+        writer.lines.sort()
+
+    return writer.lines, digest_lines
+
+
+#=================================================================
+def _is_gevent_patched():
+    """ Worker processes can not be managed from a gevent monkey-patched
+    process (eg. when indexing from within the wayback app)
+    """
+    try:
+        from gevent import monkey
+    except ImportError:  # pragma: no cover
+        return False
+
+    return monkey.is_module_patched('threading')
+
+
+#=================================================================
+def iter_parallel_cdx_lines(path, filename, workers, chunk_size=None, **options):
+    """ Index a single gzipped (W)ARC, which must contain one record
+    per gzip member, by splitting it into chunks at member boundaries
+    and indexing each chunk in a separate worker process.
+
+    Chunk results are stitched back together in file order, or merged
+    into a single sorted sequence if 'sort' option is set
+    """
+    # digest lines are collected in each worker, the writer itself stays here
+    digest_writer = options.pop('digest_writer', None)
+    options['collect_digests'] = bool(digest_writer)
+
+    size = os.path.getsize(path)
+    chunk_size = chunk_size or max(DEFAULT_CHUNK_SIZE, size // (workers * 4) + 1)
+
+    with open(path, 'rb') as fh:
+        chunks = split_chunks(fh, size, chunk_size,
+                              skip_concurrent=options.get('append_post'))
+
+    if workers <= 1 or len(chunks) <= 1 or _is_gevent_patched():
+        results = [index_chunk(path, filename, start, end, options)
+                   for start, end in chunks]
+
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            futures = [executor.submit(index_chunk, path, filename, start, end, options)
+                       for start, end in chunks]
+
+            results = [future.result() for future in futures]
+
+    if digest_writer:
+        for lines, digest_lines in results:
+            digest_writer.write_lines(digest_lines)
+
+    results = [lines for lines, digest_lines in results]
+
+    if options.get('sort'):
+        return heapq.merge(*results)
+    else:
+        return (line for lines in results for line in lines)
@@ -200,11 +200,15 @@ Total: 4
 
 from pywb import get_test_dir
 
-from pywb.indexer.cdxindexer import write_cdx_index, main, cdx_filename
+from pywb.indexer.cdxindexer import write_cdx_index, write_parallel_cdx_index, main, cdx_filename
+from pywb.indexer.cdxindexer import write_multi_cdx_index
+from pywb.indexer.parallelindexer import split_chunks
 
 from pywb.warcserver.index.cdxobject import CDXObject
 
 from io import BytesIO
+from warcio.statusandheaders import StatusAndHeaders
+from warcio.warcwriter import WARCWriter
 import sys
 
 import os
@@ -212,6 +216,7 @@ import shutil
 import tempfile
 
 from pytest import raises
+import pytest
 
 
 TEST_CDX_DIR = get_test_dir() + 'cdx/'
@@ -561,6 +566,222 @@ com,connatix,capi)/core/story?__wb_method=post&__wb_post_data=eyj0zxh0ijogimrlzm
 """
 
 
+@pytest.mark.parametrize('options', [dict(), dict(include_all=True, append_post=True), dict(cdxj=True)])
+def test_headers_only_same_index(options):
+    for warc in os.listdir(TEST_WARC_DIR):
+        if warc.endswith('.bad'):
+            continue
+
+        assert cdx_index(warc, headers_only=True, **options) == cdx_index(warc, **options)
+
+
+def test_headers_only_skips_payload():
+    class CountingReader(object):
+        def __init__(self, fh):
+            self.fh = fh
+            self.count = 0
+
+        def read(self, size=-1):
+            buff = self.fh.read(size)
+            self.count += len(buff)
+            return buff
+
+        def __getattr__(self, name):
+            return getattr(self.fh, name)
+
+    test_data = b'\r\n'.join([b'WARC/1.0',
+                               b'WARC-Type: response',
+                               b'WARC-Record-ID: <urn:uuid:12345678-feb0-11e6-8f83-68a86d1772ce>',
+                               b'WARC-Date: 2020-01-01T00:00:00Z',
+                               b'WARC-Target-URI: http://example.com/video.mp4',
+                               b'WARC-Payload-Digest: sha1:B2LTWWPUOYAH7UIPQ7ZUPQ4VMBSVC36A',
+                               b'Content-Type: application/http; msgtype=response',
+                               b'Content-Length: 100067',
+                               b'',
+                               b'HTTP/1.0 200 OK',
+                               b'Content-Type: video/mp4',
+                               b'Content-Length: 100000',
+                               b'',
+                               b'x' * 100000 + b'\r\n\r\n'])
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmp_dir, 'video.warc')
+        with open(filename, 'wb') as fh:
+            fh.write(test_data * 2)
+
+        def count(**options):
+            buff = BytesIO()
+            with open(filename, 'rb') as fh:
+                counter = CountingReader(fh)
+                write_cdx_index(buff, counter, 'video.warc', **options)
+
+            return counter.count, buff.getvalue()
+
+        full_count, full_cdx = count()
+        skip_count, skip_cdx = count(headers_only=True)
+
+        assert full_cdx == skip_cdx
+        assert full_count >= 200000
+        assert skip_count < 100000
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+@pytest.mark.parametrize('options', [dict(), dict(sort=True), dict(include_all=True, append_post=True), dict(cdxj=True, sort=True, append_post=True)])
+@pytest.mark.parametrize('workers', [1, 2])
+def test_parallel_chunked_index(options, workers):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmp_dir, 'combined.warc.gz')
+        with open(filename, 'wb') as out:
+            for i in range(5):
+                for warc in ('example.warc.gz', 'post-test.warc.gz', 'example-wget-1-14.warc.gz'):
+                    with open(TEST_WARC_DIR + warc, 'rb') as fh:
+                        out.write(fh.read())
+
+        with open(filename, 'rb') as fh:
+            chunks = split_chunks(fh, os.path.getsize(filename), 4000,
+                                  skip_concurrent=options.get('append_post'))
+
+        assert len(chunks) > 5
+        assert chunks[0][0] == 0
+        assert chunks[-1][1] == os.path.getsize(filename)
+
+        expected = BytesIO()
+        with open(filename, 'rb') as fh:
+            write_cdx_index(expected, fh, 'combined.warc.gz', **options)
+
+        buff = BytesIO()
+        write_parallel_cdx_index(buff, filename, 'combined.warc.gz',
+                                 workers=workers, chunk_size=4000, **options)
+
+        assert buff.getvalue() == expected.getvalue()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_digest_index_sidecar(workers):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        digest_file = os.path.join(tmp_dir, 'index.digest')
+        parallel_file = os.path.join(tmp_dir, 'parallel.digest')
+
+        main(['-o', os.path.join(tmp_dir, 'index.cdxj'), '-j', '-s',
+              '--digest-index', digest_file, TEST_WARC_DIR])
+
+        with open(digest_file, 'rt') as fh:
+            lines = fh.readlines()
+
+        assert lines == sorted(lines)
+
+        # only non-revisit records
+        assert 'example-url-agnostic-revisit.warc.gz' not in ''.join(lines)
+        assert 'B2LTWWPUOYAH7UIPQ7ZUPQ4VMBSVC36A\texample-url-agnostic-orig.warc.gz\t353\t1001\ttext/html\t200\n' in lines
+
+        buff = BytesIO()
+        write_parallel_cdx_index(buff, TEST_WARC_DIR + 'dupes.warc.gz', 'dupes.warc.gz',
+                                 workers=workers, chunk_size=1000, sort=True,
+                                 digest_index=parallel_file)
+
+        with open(parallel_file, 'rt') as fh:
+            parallel_lines = fh.readlines()
+
+        assert parallel_lines == [line for line in lines if '\tdupes.warc.gz\t' in line]
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_resolve_revisits_index():
+    buff = BytesIO()
+    write_cdx_index(buff, open(TEST_WARC_DIR + 'example.warc.gz', 'rb'), 'example.warc.gz',
+                    resolve_revisits=True, sort=True)
+
+    # same-url revisit
+    cdxs = [CDXObject(line) for line in buff.getvalue().rstrip().split(b'\n')]
+    assert cdxs[1]['mime'] == 'warc/revisit'
+    assert cdxs[1]['orig.filename'] == 'example.warc.gz'
+    assert cdxs[1]['orig.offset'] == cdxs[0]['offset']
+    assert cdxs[1]['orig.length'] == cdxs[0]['length']
+    assert 'orig.filename' not in cdxs[0]
+
+    # url-agnostic revisit indexed before its original
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        output = os.path.join(tmp_dir, 'index.cdxj')
+        write_multi_cdx_index(output,
+                              [TEST_WARC_DIR + 'example-url-agnostic-revisit.warc.gz',
+                               TEST_WARC_DIR + 'example-url-agnostic-orig.warc.gz'],
+                              resolve_revisits=True)
+
+        with open(output, 'rb') as fh:
+            cdxs = [CDXObject(line) for line in fh]
+
+        assert len(cdxs) == 2
+        assert cdxs[0]['filename'] == 'example-url-agnostic-orig.warc.gz'
+        assert cdxs[1]['filename'] == 'example-url-agnostic-revisit.warc.gz'
+        assert cdxs[1]['orig.filename'] == 'example-url-agnostic-orig.warc.gz'
+        assert cdxs[1]['orig.offset'] == '353'
+        assert cdxs[1]['orig.length'] == '1001'
+
+        # original only in existing digest index
+        digest_file = os.path.join(tmp_dir, 'index.digest')
+        main(['-o', os.path.join(tmp_dir, 'orig.cdxj'), '--digest-index', digest_file,
+              TEST_WARC_DIR + 'example-url-agnostic-orig.warc.gz'])
+
+        main(['-o', output, '--resolve-revisits', '--orig-digest-index', digest_file,
+              TEST_WARC_DIR + 'example-url-agnostic-revisit.warc.gz'])
+
+        with open(output, 'rb') as fh:
+            cdxs = [CDXObject(line) for line in fh]
+
+        assert len(cdxs) == 1
+        assert cdxs[0]['orig.filename'] == 'example-url-agnostic-orig.warc.gz'
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_resolve_revisits_multiple_pending():
+    buff = BytesIO()
+    writer = WARCWriter(buff, gzip=True)
+
+    def http_headers():
+        return StatusAndHeaders('200 OK', [('Content-Type', 'text/plain')], protocol='HTTP/1.0')
+
+    payloads = [('http://example.com/a', b'payload a'), ('http://example.com/b', b'payload b')]
+    digests = []
+
+    # revisits written before their originals
+    for url, payload in payloads:
+        record = writer.create_warc_record(url, 'response', payload=BytesIO(payload),
+                                           http_headers=http_headers())
+        digests.append(record.rec_headers.get_header('WARC-Payload-Digest'))
+
+    for (url, payload), digest in zip(payloads, digests):
+        writer.write_record(writer.create_revisit_record('http://example.com/rev-' + url[-1:],
+                                                         digest, url, '2014-01-03T03:03:21Z',
+                                                         http_headers=http_headers()))
+
+    for url, payload in payloads:
+        writer.write_record(writer.create_warc_record(url, 'response', payload=BytesIO(payload),
+                                                      http_headers=http_headers()))
+
+    buff.seek(0)
+    output = BytesIO()
+    write_cdx_index(output, buff, 'multi.warc.gz', cdxj=True, resolve_revisits=True)
+
+    cdxs = [CDXObject(line) for line in output.getvalue().rstrip().split(b'\n')]
+    assert len(cdxs) == 4
+
+    revisits = [cdx for cdx in cdxs if cdx['mime'] == 'warc/revisit']
+    assert [cdx['url'] for cdx in revisits] == ['http://example.com/rev-a', 'http://example.com/rev-b']
+
+    origs = dict((cdx['url'], cdx['offset']) for cdx in cdxs if cdx['mime'] != 'warc/revisit')
+    assert revisits[0]['orig.offset'] == origs['http://example.com/a']
+    assert revisits[1]['orig.offset'] == origs['http://example.com/b']
+
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
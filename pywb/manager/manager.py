@@ -46,6 +46,8 @@ directory structure expected by pywb
     """
     DEF_INDEX_FILE = 'index.cdxj'
 
+    DEF_DIGEST_INDEX_FILE = 'index.digest'
+
     COLL_RX = re.compile('^[\w][-\w]*$')
 
     COLLS_DIR = 'collections'
@@ -121,7 +123,8 @@ directory structure expected by pywb
                    'To create a new collection, run\n\n{1} init {0}')
             raise IOError(msg.format(self.coll_name, sys.argv[0]))
 
-    def add_archives(self, archives, uncompress_wacz=False):
+    def add_archives(self, archives, uncompress_wacz=False, digest_index=False,
+                     resolve_revisits=False):
         if not os.path.isdir(self.archive_dir):
             raise IOError('Directory {0} does not exist'.
                           format(self.archive_dir))
@@ -142,7 +145,8 @@ directory structure expected by pywb
             else:
                 invalid_archives.append(archive)
 
-        self._index_merge_warcs(warc_paths, self.DEF_INDEX_FILE)
+        self._index_merge_warcs(warc_paths, self.DEF_INDEX_FILE, digest_index=digest_index,
+                                resolve_revisits=resolve_revisits)
 
         if invalid_archives:
             logging.warning(f'Invalid archives weren\'t added: {", ".join(invalid_archives)}')
@@ -243,23 +247,39 @@ directory structure expected by pywb
         shutil.move(collection_index_temp_path, collection_index_path)
         shutil.rmtree(tempdir)
 
-    def reindex(self):
+    def _get_digest_index_file(self, digest_index=False):
+        """ Return path of collection digest index, if it should be written:
+        either explicitly requested or already exists
+        """
+        digest_file = os.path.join(self.indexes_dir, self.DEF_DIGEST_INDEX_FILE)
+        if digest_index or os.path.isfile(digest_file):
+            return digest_file
+
+        return None
+
+    def reindex(self, digest_index=False, resolve_revisits=False):
         cdx_file = os.path.join(self.indexes_dir, self.DEF_INDEX_FILE)
         logging.info('Indexing ' + self.archive_dir + ' to ' + cdx_file)
-        self._cdx_index(cdx_file, [self.archive_dir])
+        self._cdx_index(cdx_file, [self.archive_dir],
+                        digest_file=self._get_digest_index_file(digest_index),
+                        resolve_revisits=resolve_revisits)
 
-    def _cdx_index(self, out, input_, rel_root=None):
+    def _cdx_index(self, out, input_, rel_root=None, digest_file=None,
+                   resolve_revisits=False, orig_digest_file=None):
         from pywb.indexer.cdxindexer import write_multi_cdx_index
 
         options = dict(append_post=True,
                        cdxj=True,
                        sort=True,
                        recurse=True,
-                       rel_root=rel_root)
+                       rel_root=rel_root,
+                       digest_index=digest_file,
+                       resolve_revisits=resolve_revisits,
+                       orig_digest_index=orig_digest_file)
 
         write_multi_cdx_index(out, input_, **options)
 
-    def index_merge(self, filelist, index_file):
+    def index_merge(self, filelist, index_file, digest_index=False, resolve_revisits=False):
         wrongdir = 'Skipping {0}, must be in {1} archive directory'
         notfound = 'Skipping {0}, file not found'
 
@@ -279,24 +299,45 @@ directory structure expected by pywb
             else:
                 filtered_warcs.append(abs_filepath)
 
-        self._index_merge_warcs(filtered_warcs, index_file, abs_archive_dir)
+        self._index_merge_warcs(filtered_warcs, index_file, abs_archive_dir,
+                                digest_index=digest_index,
+                                resolve_revisits=resolve_revisits)
 
-    def _index_merge_warcs(self, new_warcs, index_file, rel_root=None):
+    def _index_merge_warcs(self, new_warcs, index_file, rel_root=None, digest_index=False,
+                           resolve_revisits=False):
         cdx_file = os.path.join(self.indexes_dir, index_file)
 
         temp_file = cdx_file + '.tmp.' + timestamp20_now()
-        self._cdx_index(temp_file, new_warcs, rel_root)
 
+        digest_file = self._get_digest_index_file(digest_index)
+        temp_digest_file = None
+        if digest_file:
+            temp_digest_file = digest_file + '.tmp.' + timestamp20_now()
+
+        # originals from previously added archives, if indexed by digest
+        orig_digest_file = None
+        if resolve_revisits and digest_file and os.path.isfile(digest_file):
+            orig_digest_file = digest_file
+
+        self._cdx_index(temp_file, new_warcs, rel_root, temp_digest_file,
+                        resolve_revisits, orig_digest_file)
+
+        self._merge_sorted_file(cdx_file, temp_file)
+
+        if temp_digest_file:
+            self._merge_sorted_file(digest_file, temp_digest_file)
+
+    def _merge_sorted_file(self, index_file, temp_file):
         # no existing file, so just make it the new file
-        if not os.path.isfile(cdx_file):
-            shutil.move(temp_file, cdx_file)
+        if not os.path.isfile(index_file):
+            shutil.move(temp_file, index_file)
             return
 
         merged_file = temp_file + '.merged'
 
         last_line = None
 
-        with open(cdx_file, 'rb') as orig_index:
+        with open(index_file, 'rb') as orig_index:
             with open(temp_file, 'rb') as new_index:
                 with open(merged_file, 'w+b') as merged:
                     for line in heapq.merge(orig_index, new_index):
@@ -304,7 +345,7 @@ directory structure expected by pywb
                             merged.write(line)
                             last_line = line
 
-        shutil.move(merged_file, cdx_file)
+        shutil.move(merged_file, index_file)
         #os.rename(merged_file, cdx_file)
         os.remove(temp_file)
 
@@ -490,11 +531,20 @@ Create manage file based web archive collections
     # Add Warcs or Waczs
     def do_add(r):
         m = CollectionsManager(r.coll_name)
-        m.add_archives(r.files, r.uncompress_wacz)
+        m.add_archives(r.files, r.uncompress_wacz, r.digest_index, r.resolve_revisits)
+
+    digest_index_help = ('Also write a digest index ({0}) for faster revisit resolution. ' +
+                         'Always updated if it already exists').format(CollectionsManager.DEF_DIGEST_INDEX_FILE)
+
+    resolve_revisits_help = ('Resolve revisits to their originals while indexing, ' +
+                             'storing the original location in the index. ' +
+                             'Originals in previously added archives are found only via the digest index')
 
     add_archives_help = 'Copy ARCS/WARCS/WACZ to collection directory and reindex'
     add_archives = subparsers.add_parser('add', help=add_archives_help)
     add_archives.add_argument('--uncompress-wacz', dest='uncompress_wacz', action='store_true')
+    add_archives.add_argument('--digest-index', action='store_true', help=digest_index_help)
+    add_archives.add_argument('--resolve-revisits', action='store_true', help=resolve_revisits_help)
     add_archives.add_argument('coll_name')
     add_archives.add_argument('files', nargs='+')
     add_archives.set_defaults(func=do_add)
@@ -502,21 +552,25 @@ Create manage file based web archive collections
     # Reindex All
     def do_reindex(r):
         m = CollectionsManager(r.coll_name)
-        m.reindex()
+        m.reindex(r.digest_index, r.resolve_revisits)
 
     reindex_help = 'Re-Index entire collection'
     reindex = subparsers.add_parser('reindex', help=reindex_help)
     reindex.add_argument('coll_name')
+    reindex.add_argument('--digest-index', action='store_true', help=digest_index_help)
+    reindex.add_argument('--resolve-revisits', action='store_true', help=resolve_revisits_help)
     reindex.set_defaults(func=do_reindex)
 
     # Index warcs
     def do_index(r):
         m = CollectionsManager(r.coll_name)
-        m.index_merge(r.files, m.DEF_INDEX_FILE)
+        m.index_merge(r.files, m.DEF_INDEX_FILE, r.digest_index, r.resolve_revisits)
 
     indexwarcs_help = 'Index specified ARC/WARC files in the collection'
     indexwarcs = subparsers.add_parser('index', help=indexwarcs_help)
     indexwarcs.add_argument('coll_name')
+    indexwarcs.add_argument('--digest-index', action='store_true', help=digest_index_help)
+    indexwarcs.add_argument('--resolve-revisits', action='store_true', help=resolve_revisits_help)
     indexwarcs.add_argument('files', nargs='+')
     indexwarcs.set_defaults(func=do_index)
 
@@ -572,6 +626,18 @@ Create manage file based web archive collections
     ACLManager.init_parser(acl)
     acl.set_defaults(func=do_acl)
 
+    # ZipNum
+    from pywb.manager.zipnummanager import ZipNumManager
+
+    def do_zipnum(r):
+        m = ZipNumManager(r)
+        m.process(r)
+
+    zipnum_help = 'Convert collection CDX(J) indexes into a compressed ZipNum cluster'
+    zipnum = subparsers.add_parser('zipnum', help=zipnum_help)
+    ZipNumManager.init_parser(zipnum)
+    zipnum.set_defaults(func=do_zipnum)
+
     # LOC
     from pywb.manager.locmanager import LocManager, loc_avail
 
@@ -0,0 +1,217 @@
+import gzip
+import heapq
+import itertools
+import logging
+import os
+import shutil
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from pywb.manager.manager import CollectionsManager
+from pywb.warcserver.index.indexsource import FileIndexSource
+
+
+# ============================================================================
+class ZipNumBuilder(object):
+    """ Build a ZipNum cluster, consumable by ZipNumIndexSource,
+    from one or more sorted CDX(J) files:
+
+    - <name>-NN.cdx.gz: one or more shards, each a series of gzip members,
+      one member per block of lines_per_block cdx lines
+    - <name>.idx: summary, one line per block with the block's first key,
+      shard (part) name, offset, length and block number
+    - <name>.loc: mapping of part names to shard paths,
+      relative to the .loc file
+    """
+    DEFAULT_LINES_PER_BLOCK = 3000
+
+    def __init__(self, output_dir, name='index',
+                 lines_per_block=None, num_shards=1, workers=None):
+        self.output_dir = output_dir
+        self.name = name
+        self.lines_per_block = lines_per_block or self.DEFAULT_LINES_PER_BLOCK
+        self.num_shards = max(num_shards or 1, 1)
+        self.workers = workers or os.cpu_count() or 1
+
+        self.num_lines = 0
+        self.num_blocks = 0
+
+    @property
+    def idx_file(self):
+        return os.path.join(self.output_dir, self.name + '.idx')
+
+    @property
+    def loc_file(self):
+        return os.path.join(self.output_dir, self.name + '.loc')
+
+    def part_name(self, shard):
+        return '{0}-{1:02d}'.format(self.name, shard)
+
+    def part_file(self, shard):
+        return os.path.join(self.output_dir, self.part_name(shard) + '.cdx.gz')
+
+    @staticmethod
+    def _is_cdx_line(line):
+        return line.strip() and not line.startswith(b' CDX')
+
+    @staticmethod
+    def _get_key(line):
+        return b' '.join(line.split(b' ', 2)[:2])
+
+    @staticmethod
+    def compress_block(lines):
+        return gzip.compress(b''.join(lines))
+
+    def _iter_lines(self, fhs):
+        for line in heapq.merge(*fhs):
+            if not self._is_cdx_line(line):
+                continue
+
+            if not line.endswith(b'\n'):
+                line += b'\n'
+
+            yield line
+
+    def _count_lines(self, inputs):
+        count = 0
+        for filename in inputs:
+            with open(filename, 'rb') as fh:
+                count += sum(1 for line in fh if self._is_cdx_line(line))
+
+        return count
+
+    def _iter_blocks(self, line_iter):
+        while True:
+            block = list(itertools.islice(line_iter, self.lines_per_block))
+            if not block:
+                break
+
+            yield block
+
+    def build(self, inputs):
+        """ Merge sorted cdx inputs into a new ZipNum cluster.
+        The .idx summary is written last, so that a partially built
+        cluster is never picked up
+        """
+        self.num_lines = self._count_lines(inputs)
+
+        total_blocks = -(-self.num_lines // self.lines_per_block)
+        blocks_per_shard = max(-(-total_blocks // self.num_shards), 1)
+
+        idx_temp = self.idx_file + '.tmp'
+
+        shards = []
+        self.num_blocks = 0
+
+        with ExitStack() as stack:
+            fhs = [stack.enter_context(open(filename, 'rb')) for filename in inputs]
+            block_iter = self._iter_blocks(self._iter_lines(fhs))
+
+            idx_out = stack.enter_context(open(idx_temp, 'wb'))
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=self.workers))
+
+            part_out = None
+            offset = 0
+
+            while True:
+                # compress a bounded batch of blocks at a time, in parallel
+                batch = list(itertools.islice(block_iter, self.workers * 4))
+                if not batch:
+                    break
+
+                for block, data in zip(batch, executor.map(self.compress_block, batch)):
+                    if self.num_blocks % blocks_per_shard == 0:
+                        if part_out:
+                            part_out.close()
+
+                        shards.append(len(shards) + 1)
+                        part_out = open(self.part_file(shards[-1]), 'wb')
+                        offset = 0
+
+                    part_out.write(data)
+
+                    self.num_blocks += 1
+
+                    idx_out.write(b'\t'.join([self._get_key(block[0]),
+                                              self.part_name(shards[-1]).encode('utf-8'),
+                                              str(offset).encode('utf-8'),
+                                              str(len(data)).encode('utf-8'),
+                                              str(self.num_blocks).encode('utf-8')]))
+                    idx_out.write(b'\n')
+
+                    offset += len(data)
+
+            if part_out:
+                part_out.close()
+
+        with open(self.loc_file, 'wt') as fh:
+            for shard in shards:
+                fh.write(self.part_name(shard) + '\t' +
+                         os.path.basename(self.part_file(shard)) + '\n')
+
+        shutil.move(idx_temp, self.idx_file)
+
+        logging.info('Wrote {0} lines in {1} blocks to {2} shard(s): {3}'.format(
+                     self.num_lines, self.num_blocks, len(shards), self.idx_file))
+
+        return shards
+
+
+# ============================================================================
+class ZipNumManager(CollectionsManager):
+    """ Convert a collection's plain CDX(J) indexes into a ZipNum cluster
+    """
+    def __init__(self, r):
+        super(ZipNumManager, self).__init__(r.coll_name)
+
+        self.builder = ZipNumBuilder(self.indexes_dir,
+                                     name=r.name,
+                                     lines_per_block=r.lines_per_block,
+                                     num_shards=r.shards,
+                                     workers=r.workers)
+
+    def find_plain_indexes(self):
+        return sorted(os.path.join(self.indexes_dir, name)
+                      for name in os.listdir(self.indexes_dir)
+                      if name.endswith(FileIndexSource.CDX_EXT))
+
+    def process(self, r):
+        inputs = self.find_plain_indexes()
+        if not inputs:
+            raise IOError('No CDX(J) indexes found in ' + self.indexes_dir)
+
+        if os.path.isfile(self.builder.idx_file):
+            raise IOError('ZipNum index {0} already exists'.format(self.builder.idx_file))
+
+        self.builder.build(inputs)
+
+        # converted indexes are otherwise served alongside the cluster
+        if r.remove_plain:
+            for filename in inputs:
+                logging.info('Removing converted index ' + filename)
+                os.remove(filename)
+        else:
+            logging.info('Plain CDX(J) indexes kept and still queried along with the cluster, ' +
+                         'remove them once the cluster is verified, or use --remove-plain')
+
+    @classmethod
+    def init_parser(cls, parser):
+        parser.add_argument('coll_name')
+
+        parser.add_argument('--lines-per-block', type=int,
+                            default=ZipNumBuilder.DEFAULT_LINES_PER_BLOCK,
+                            help='Number of cdx lines in each compressed block')
+
+        parser.add_argument('--shards', type=int, default=1,
+                            help='Number of shard files to split the cluster into')
+
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Number of threads used to compress blocks (default: # of cpus)')
+
+        parser.add_argument('--name', default='index',
+                            help='Base name of the .idx, .loc and shard files')
+
+        parser.add_argument('--remove-plain', action='store_true',
+                            help='Remove the plain CDX(J) indexes after conversion ' +
+                                 '(if kept, they are queried in addition to the cluster)')
@@ -3,16 +3,62 @@ import json
 import re
 import tempfile
 from contextlib import closing
+from io import BytesIO
 
 import webencodings
 from warcio.bufferedreaders import BufferedReader, ChunkedDataReader
 from warcio.utils import to_native_str
 
-from pywb.utils.io import BUFF_SIZE, StreamIter, no_except_close
+from pywb.utils.io import BUFF_SIZE, FileRangeReader, StreamIter, no_except_close, wrap_file
 from pywb.utils.loaders import load_py_name, load_yaml_config
 
 WORKER_MODS = {"wkr_", "sw_"}  # type: Set[str]
 
+ENCODING_ALIASES = {'x-gzip': 'gzip', 'x-compress': 'compress'}
+
+
+# ============================================================================
+def parse_accept_encoding(accept_encoding):
+    """ Parse Accept-Encoding header value into dict of coding -> q value
+    """
+    accepted = {}
+    for value in accept_encoding.split(','):
+        parts = value.split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+
+        q = 1.0
+        for param in parts[1:]:
+            name, _, qvalue = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(qvalue)
+                except ValueError:
+                    q = 0.0
+
+        accepted[ENCODING_ALIASES.get(coding, coding)] = q
+
+    return accepted
+
+
+def is_encoding_accepted(content_encoding, accept_encoding):
+    """ Return true if every coding in the Content-Encoding is acceptable
+    to a client sending the specified Accept-Encoding
+    """
+    accepted = parse_accept_encoding(accept_encoding)
+
+    for coding in content_encoding.lower().split(','):
+        coding = coding.strip()
+        if not coding or coding == 'identity':
+            continue
+
+        coding = ENCODING_ALIASES.get(coding, coding)
+        if accepted.get(coding, accepted.get('*', 0)) <= 0:
+            return False
+
+    return True
+
 
 # ============================================================================
 class BaseContentRewriter(object):
@@ -82,6 +128,10 @@ class BaseContentRewriter(object):
             if rule:
                 self.rules.append(rule)
 
+        # url prefixes of rules with a mixin, which may rewrite any content type
+        self.mixin_prefixes = tuple(prefix for rule in self.rules if rule.get('mixin')
+                                    for prefix in rule['url_prefix'] if prefix)
+
     def parse_rewrite_rule(self, config):
         rw_config = config.get('rewrite')
         if not rw_config:
@@ -235,16 +285,57 @@ class BaseContentRewriter(object):
         if rwinfo.should_rw_content():
             content_rewriter = self.create_rewriter(rwinfo.text_type, rule, rwinfo, cdx, head_insert_func)
 
+        return self._rewrite_record(rwinfo, content_rewriter, environ)
+
+    def is_passthrough(self, cdx, record, mod):
+        """ Return true if the record content is never rewritten with this modifier,
+        based on the cdx and record content types, eg. for images or video
+        """
+        if mod in WORKER_MODS:
+            return False
+
+        rewrite_types = self.get_rewrite_types()
+
+        for content_type in (cdx.get('mime'), record.http_headers.get_header('Content-Type')):
+            if not content_type:
+                return False
+
+            text_type = rewrite_types.get(content_type.split(';', 1)[0])
+
+            # octet-stream only checked for js or css when loaded as js or css
+            if text_type and (text_type != 'guess-bin' or mod in ('js_', 'cs_')):
+                return False
+
+        urlkey = to_native_str(cdx['urlkey'])
+        if urlkey.startswith(self.mixin_prefixes) and self.get_rule(cdx).get('mixin'):
+            return False
+
+        return True
+
+    def passthrough(self, record, url_rewriter, cookie_rewriter=None,
+                    cdx=None, environ=None):
+        """ Rewrite only the headers of a record for which is_passthrough() is true,
+        skipping content type detection, and stream the payload as is
+        """
+        rwinfo = RewriteInfo(record, self, url_rewriter, cookie_rewriter,
+                             detect_type=False)
+
+        url_rewriter.rewrite_opts['cdx'] = cdx
+
+        return self._rewrite_record(rwinfo, None, environ or {})
+
+    def _rewrite_record(self, rwinfo, content_rewriter, environ):
         gen = None
 
+        content_encoding = rwinfo.record.http_headers.get_header('Content-Encoding')
+
         # check if decoding is needed
-        if not rwinfo.is_content_rw:
-            content_encoding = rwinfo.record.http_headers.get_header('Content-Encoding')
+        if not rwinfo.is_content_rw and content_encoding:
             accept_encoding = environ.get('HTTP_ACCEPT_ENCODING', '')
 
-            # if content-encoding is set but encoding is not in accept encoding,
+            # if content-encoding is set but not accepted by the client,
             # enable content_rw force decompression
-            if content_encoding and content_encoding not in accept_encoding:
+            if not is_encoding_accepted(content_encoding, accept_encoding):
                 rwinfo.is_content_rw = True
 
         if content_rewriter:
@@ -254,6 +345,10 @@ class BaseContentRewriter(object):
 
         rw_http_headers = self.rewrite_headers(rwinfo)
 
+        # if not rewriting, response is encoded or not depending on Accept-Encoding
+        if content_encoding and not content_rewriter:
+            rw_http_headers.add_header('Vary', 'Accept-Encoding')
+
         if not gen:
             # if not rewriting content, still need to dechunk
             # to conform to WSGI spec
@@ -263,7 +358,14 @@ class BaseContentRewriter(object):
             else:
                 stream = rwinfo.record.raw_stream
 
-            gen = StreamIter(stream)
+            # payload from local file, may be sent with sendfile()
+            # (not with uWSGI, which sends the file from start to end)
+            if (isinstance(stream, FileRangeReader) and environ.get('wsgi.file_wrapper') and
+                not environ.get('uwsgi.version')):
+                rw_http_headers.replace_header('Content-Length', str(stream.limit))
+                gen = wrap_file(environ, stream)
+            else:
+                gen = StreamIter(stream)
 
         return rw_http_headers, gen, (content_rewriter != None)
 
@@ -399,10 +501,12 @@ class RewriteInfo(object):
                       '.json?'
                      ]
 
-    def __init__(self, record, content_rewriter, url_rewriter, cookie_rewriter=None):
+    def __init__(self, record, content_rewriter, url_rewriter, cookie_rewriter=None,
+                 detect_type=True):
         self.record = record
 
         self._content_stream = None
+        self._encoded_peek = None
         self.is_content_rw = False
         self.is_chunked = False
 
@@ -420,7 +524,7 @@ class RewriteInfo(object):
 
         self.cookie_rewriter = cookie_rewriter
 
-        if self.record:
+        if self.record and detect_type:
             self.text_type, self.charset = self._fill_text_type_and_charset(content_rewriter)
 
     def _fill_text_type_and_charset(self, content_rewriter):
@@ -516,10 +620,44 @@ class RewriteInfo(object):
         return self._content_stream
 
     def read_and_keep(self, size):
+        if not self._content_stream:
+            encoding = self._get_peek_encoding()
+            if encoding:
+                return self._read_encoded_and_keep(size, encoding)
+
         buff = self.content_stream.read(size)
         self._content_stream = BufferedReader(self._content_stream, starting_data=buff)
         return buff
 
+    def _get_peek_encoding(self):
+        if self.record.http_headers.get_header('Transfer-Encoding') == 'chunked':
+            return None
+
+        encoding = self.record.http_headers.get_header('Content-Encoding')
+        if not encoding:
+            return None
+
+        encoding = encoding.lower()
+        if encoding not in BufferedReader.get_supported_decompressors():
+            return None
+
+        return encoding
+
+    def _read_encoded_and_keep(self, size, encoding):
+        """ Decode start of encoded payload without decoding the record stream,
+        so that the payload may still be served encoded if not rewritten
+        """
+        if self._encoded_peek is None:
+            self._encoded_peek = self.record.raw_stream.read(BUFF_SIZE)
+            self.record.raw_stream = BufferedReader(self.record.raw_stream,
+                                                    starting_data=self._encoded_peek)
+
+        try:
+            reader = BufferedReader(BytesIO(self._encoded_peek), decomp_type=encoding)
+            return reader.read(size)
+        except Exception:
+            return b''
+
     def should_rw_content(self):
         if not self.text_type:
             return False
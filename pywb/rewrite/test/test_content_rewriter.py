@@ -14,10 +14,12 @@ from pywb.utils.io import chunk_encode_iter
 from pywb.rewrite.wburl import WbUrl
 from pywb.rewrite.url_rewriter import UrlRewriter
 from pywb.rewrite.default_rewriter import RewriterWithJSProxy
+from pywb.rewrite.content_rewriter import is_encoding_accepted
 
 from pywb import get_test_dir
 
 import os
+import gzip
 import json
 import pytest
 import six
@@ -59,7 +61,8 @@ class TestContentRewriter(object):
 
     def rewrite_record(self, headers, content, ts, url='http://example.com/',
                        prefix='http://localhost:8080/prefix/', warc_headers=None,
-                       request_url=None, is_live=None, use_js_proxy=True, environ=None):
+                       request_url=None, is_live=None, use_js_proxy=True, environ=None,
+                       passthrough=False):
 
         record = self._create_response_record(url, headers, content, warc_headers)
 
@@ -83,11 +86,28 @@ class TestContentRewriter(object):
 
         url_rewriter = UrlRewriter(wburl, prefix, rewrite_opts=rewrite_opts)
 
+        if passthrough:
+            cdx['mime'] = headers.get('Content-Type', '-')
+            assert self.content_rewriter.is_passthrough(cdx, record, wburl.mod)
+            return self.content_rewriter.passthrough(record, url_rewriter,
+                                                     cdx=cdx,
+                                                     environ=environ)
+
         return self.content_rewriter(record, url_rewriter, cookie_rewriter=None,
                         head_insert_func=insert_func,
                         cdx=cdx,
                         environ=environ)
 
+    def is_passthrough(self, content_type, mod, url='http://example.com/', cdx_mime=None):
+        headers = {'Content-Type': content_type} if content_type else {}
+        record = self._create_response_record(url, headers, b'', None)
+
+        cdx = CDXObject()
+        cdx['urlkey'] = canonicalize(url)
+        cdx['mime'] = cdx_mime or content_type or '-'
+
+        return self.content_rewriter.is_passthrough(cdx, record, mod)
+
     def test_rewrite_html(self, headers):
         content = '<html><body><a href="http://example.com/"></a></body></html>'
 
@@ -393,6 +413,60 @@ class TestContentRewriter(object):
 
         assert ('Transfer-Encoding', 'chunked') not in headers.headers
 
+    def test_is_passthrough(self):
+        assert self.is_passthrough('image/png', 'mp_')
+        assert self.is_passthrough('video/mp4; codecs="avc1"', 'im_')
+        assert self.is_passthrough('image/png', 'id_')
+
+        # octet-stream checked for js/css only with js_ and cs_
+        assert self.is_passthrough('application/octet-stream', 'mp_')
+        assert not self.is_passthrough('application/octet-stream', 'js_')
+        assert not self.is_passthrough('application/octet-stream', 'cs_')
+
+        assert not self.is_passthrough('text/html', 'mp_')
+        assert not self.is_passthrough('text/html', 'id_')
+        assert not self.is_passthrough('application/json', 'mp_')
+        assert not self.is_passthrough(None, 'mp_')
+
+        # workers always rewritten
+        assert not self.is_passthrough('image/png', 'sw_')
+
+        # cdx and record content-type must both be binary
+        assert not self.is_passthrough('image/png', 'mp_', cdx_mime='text/html')
+        assert not self.is_passthrough('text/html', 'mp_', cdx_mime='image/png')
+        assert self.is_passthrough('image/png', 'mp_', cdx_mime='warc/revisit')
+
+        # rule with mixin, rewritten regardless of content-type
+        url = 'https://www.facebook.com/ajax/pagelet/generic.php/PhotoViewerInitPagelet?data=1'
+        assert not self.is_passthrough('image/png', 'mp_', url=url)
+
+    @pytest.mark.parametrize('headers,environ', [
+        ({'Content-Type': 'image/png', 'Content-Length': '4'}, {}),
+        ({'Content-Type': 'image/png', 'Location': 'http://example.com/other',
+          'Set-Cookie': 'foo=bar; Path=/', 'Date': 'Mon, 01 Jan 2018 00:00:00 GMT'}, {}),
+        ({'Content-Type': 'application/octet-stream', 'Transfer-Encoding': 'chunked'}, {}),
+        ({'Content-Type': 'image/png', 'Content-Encoding': 'gzip'}, {'HTTP_ACCEPT_ENCODING': 'gzip'}),
+        ({'Content-Type': 'image/png', 'Content-Encoding': 'gzip'}, {}),
+    ], ids=['content-length', 'rewritten-headers', 'chunked', 'gzip-accepted', 'gzip-not-accepted'])
+    def test_passthrough_same_as_rewrite(self, headers, environ):
+        if headers.get('Transfer-Encoding'):
+            content = b''.join(chunk_encode_iter([b'ABCD'] * 10))
+        elif headers.get('Content-Encoding'):
+            content = gzip.compress(b'ABCD' * 10)
+        else:
+            content = b'\x11\x12\x13\x14'
+
+        exp_headers, exp_gen, exp_is_rw = self.rewrite_record(headers, content, ts='201701mp_',
+                                                              environ=environ)
+
+        res_headers, gen, is_rw = self.rewrite_record(headers, content, ts='201701mp_',
+                                                      environ=environ, passthrough=True)
+
+        assert res_headers.statusline == exp_headers.statusline
+        assert res_headers.headers == exp_headers.headers
+        assert b''.join(gen) == b''.join(exp_gen)
+        assert is_rw == exp_is_rw == False
+
     @pytest.mark.importorskip('brotli')
     def test_brotli_accepted_no_change(self):
         import brotli
@@ -429,6 +503,80 @@ class TestContentRewriter(object):
 
         assert b''.join(gen).decode('utf-8') == 'ABCDEFG'
 
+    def _gzip_headers(self, content_type, content):
+        return {'Content-Type': content_type,
+                'Content-Encoding': 'gzip',
+                'Content-Length': str(len(content))
+               }
+
+    def test_gzip_accepted_guess_text_not_decoded(self):
+        content = gzip.compress(b'Some Text Content')
+        headers = self._gzip_headers('text/plain', content)
+
+        headers, gen, is_rw = self.rewrite_record(headers, content, ts='201701mp_',
+                                                  environ={'HTTP_ACCEPT_ENCODING': 'gzip, deflate'})
+
+        assert is_rw == False
+        assert headers['Content-Encoding'] == 'gzip'
+        assert headers['Content-Length'] == str(len(content))
+        assert headers['Vary'] == 'Accept-Encoding'
+
+        # stored encoded bytes, after checking decoded start for html
+        assert b''.join(gen) == content
+
+    def test_gzip_accepted_id_json_not_decoded(self):
+        content = gzip.compress(b'{"a": "b"}')
+        headers = self._gzip_headers('text/html', content)
+
+        headers, gen, is_rw = self.rewrite_record(headers, content, ts='201701id_',
+                                                  url='http://example.com/data.json',
+                                                  environ={'HTTP_ACCEPT_ENCODING': 'gzip'})
+
+        assert is_rw == False
+        assert headers['Content-Encoding'] == 'gzip'
+        assert headers['Content-Length'] == str(len(content))
+        assert b''.join(gen) == content
+
+    def test_gzip_not_accepted_q_zero_decode(self):
+        content = gzip.compress(b'ABCDEFG')
+        headers = self._gzip_headers('application/octet-stream', content)
+
+        headers, gen, is_rw = self.rewrite_record(headers, content, ts='201701id_',
+                                                  environ={'HTTP_ACCEPT_ENCODING': 'gzip;q=0, br'})
+
+        assert 'Content-Encoding' not in headers
+        assert 'Content-Length' not in headers
+        assert headers['X-Archive-Orig-Content-Encoding'] == 'gzip'
+        assert headers['Vary'] == 'Accept-Encoding'
+
+        assert b''.join(gen) == b'ABCDEFG'
+
+    def test_gzip_rewritten_html_decoded(self):
+        content = gzip.compress(b'<html><body><a href="http://example.com/">Link</a></body></html>')
+        headers = self._gzip_headers('text/html', content)
+
+        headers, gen, is_rw = self.rewrite_record(headers, content, ts='201701mp_',
+                                                  environ={'HTTP_ACCEPT_ENCODING': 'gzip'})
+
+        assert is_rw
+        assert 'Content-Encoding' not in headers
+        assert 'Vary' not in headers
+
+        assert '"http://localhost:8080/prefix/201701/http://example.com/"' in b''.join(gen).decode('utf-8')
+
+    def test_is_encoding_accepted(self):
+        assert is_encoding_accepted('gzip', 'gzip, deflate, br')
+        assert is_encoding_accepted('GZIP', 'deflate, Gzip')
+        assert is_encoding_accepted('x-gzip', 'gzip')
+        assert is_encoding_accepted('br', '*')
+        assert is_encoding_accepted('identity', '')
+
+        assert not is_encoding_accepted('gzip', '')
+        assert not is_encoding_accepted('gzip', 'x-gzipped')
+        assert not is_encoding_accepted('br', 'gzip, *;q=0')
+        assert not is_encoding_accepted('gzip', 'gzip;q=0.0, *')
+        assert not is_encoding_accepted('gzip, br', 'gzip')
+
     def test_rewrite_json(self):
         headers = {'Content-Type': 'application/json'}
         content = '/**/ jQuery_ABC({"foo": "bar"});'
@@ -0,0 +1,248 @@
+"""
+Pool of open read-only file descriptors, shared by many concurrent readers
+using positional reads (pread), to avoid an open() and seek() per record load
+"""
+
+import os
+import threading
+import time
+
+from collections import OrderedDict, deque
+
+
+# =============================================================================
+class PooledFile(object):
+    """ An open file descriptor in the pool, with the inode and mtime
+    of the file when opened, to detect when the path has been replaced
+    or modified
+    """
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+
+        st = os.fstat(self.fd)
+        self.ino = st.st_ino
+        self.mtime = st.st_mtime
+        self.last_check = time.time()
+
+        self.refs = 0
+        self.evicted = False
+
+    def is_stale(self, st):
+        return st.st_ino != self.ino or st.st_mtime != self.mtime
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+# =============================================================================
+class FileHandlePool(object):
+    """ LRU pool of open file descriptors, keyed by path.
+
+    Each open() returns a new PreadReader sharing the pooled descriptor.
+    Descriptors evicted from the pool, or found to be stale, are closed
+    once the last reader using them is closed.
+
+    The path is re-checked with stat() for a changed inode or mtime
+    at most every check_interval seconds (0 to check on every open)
+
+    Readers garbage collected without being closed are released
+    without locking, and the release completed on the next open or close
+    """
+    DEFAULT_MAX_SIZE = 128
+
+    DEFAULT_CHECK_INTERVAL = 2.0
+
+    def __init__(self, max_size=None, check_interval=None):
+        self.max_size = max_size or self.DEFAULT_MAX_SIZE
+        if check_interval is None:
+            check_interval = self.DEFAULT_CHECK_INTERVAL
+
+        self.check_interval = check_interval
+
+        self.files = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.pending_release = deque()
+
+    @staticmethod
+    def is_supported():
+        return hasattr(os, 'pread')
+
+    def open(self, path, offset=0, length=-1):
+        """ Return a reader for length bytes of path starting at offset,
+        or until the end of the file if length is -1
+        """
+        return PreadReader(self, self._acquire(path), offset, length)
+
+    def _acquire(self, path):
+        with self.lock:
+            self._release_pending()
+
+            pooled = self.files.get(path)
+            if pooled:
+                pooled = self._check_stale(pooled)
+
+            if pooled:
+                self.files.move_to_end(path)
+            else:
+                pooled = PooledFile(path)
+                self.files[path] = pooled
+                self._evict()
+
+            pooled.refs += 1
+            return pooled
+
+    def _check_stale(self, pooled):
+        now = time.time()
+        if now - pooled.last_check < self.check_interval:
+            return pooled
+
+        try:
+            st = os.stat(pooled.path)
+        except OSError:
+            st = None
+
+        if st and not pooled.is_stale(st):
+            pooled.last_check = now
+            return pooled
+
+        self._remove(pooled)
+        return None
+
+    def _evict(self):
+        while len(self.files) > self.max_size:
+            path, pooled = self.files.popitem(last=False)
+            self._remove(pooled)
+
+    def _remove(self, pooled):
+        if self.files.get(pooled.path) is pooled:
+            del self.files[pooled.path]
+
+        pooled.evicted = True
+        if not pooled.refs:
+            pooled.close()
+
+    def release(self, pooled):
+        with self.lock:
+            self._release_pending()
+            self._release(pooled)
+
+    def release_later(self, pooled):
+        """ Release without locking, eg. during garbage collection
+        """
+        self.pending_release.append(pooled)
+
+    def _release_pending(self):
+        while self.pending_release:
+            self._release(self.pending_release.popleft())
+
+    def _release(self, pooled):
+        pooled.refs -= 1
+        if pooled.evicted and not pooled.refs:
+            pooled.close()
+
+    def close(self):
+        with self.lock:
+            self._release_pending()
+
+            for pooled in list(self.files.values()):
+                self._remove(pooled)
+
+
+# =============================================================================
+class PreadReader(object):
+    """ File-like reader of a range of a pooled file descriptor.
+    Reads are positional, so that any number of readers
+    may share the same descriptor. As with a regular file,
+    tell() and seek() positions are absolute, but no data
+    is read past the end of the range
+    """
+    def __init__(self, pool, pooled, offset=0, length=-1):
+        self.pool = pool
+        self.pooled = pooled
+        self.name = pooled.path
+
+        self.pos = offset
+        self.end = offset + length if length >= 0 else None
+
+    @property
+    def closed(self):
+        return self.pooled is None
+
+    def _remaining(self, length):
+        if length is None or length < 0:
+            length = (self.end if self.end is not None
+                      else os.fstat(self.pooled.fd).st_size) - self.pos
+
+        elif self.end is not None:
+            length = min(length, self.end - self.pos)
+
+        return max(length, 0)
+
+    def read(self, length=-1):
+        if self.closed:
+            raise ValueError('read of closed file')
+
+        length = self._remaining(length)
+        if not length:
+            return b''
+
+        buff = os.pread(self.pooled.fd, length, self.pos)
+        self.pos += len(buff)
+        return buff
+
+    def readline(self, length=-1):
+        line = b''
+        while length < 0 or len(line) < length:
+            size = 1024 if length < 0 else min(1024, length - len(line))
+            buff = self.read(size)
+            if not buff:
+                break
+
+            inx = buff.find(b'\n')
+            if inx >= 0:
+                # rewind to just past the newline
+                self.pos -= len(buff) - inx - 1
+                line += buff[:inx + 1]
+                break
+
+            line += buff
+
+        return line
+
+    def tell(self):
+        return self.pos
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            self.pos = offset
+        elif whence == 1:
+            self.pos += offset
+        else:
+            self.pos = os.fstat(self.pooled.fd).st_size + offset
+
+        return self.pos
+
+    def close(self):
+        if self.pooled:
+            self.pool.release(self.pooled)
+            self.pooled = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        # if not closed, release without locking, as may be called during gc
+        pooled = self.pooled
+        if pooled:
+            self.pooled = None
+            self.pool.release_later(pooled)
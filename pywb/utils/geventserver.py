@@ -10,7 +10,7 @@ class GeventServer(object):
     """Class for optionally running a WSGI application in a greenlet"""
 
     def __init__(self, app, port=0, hostname='localhost', handler_class=None,
-                 direct=False):
+                 direct=False, listener=None):
         """Initialize a new GeventServer instance
 
         :param app: The WSGI application instance to be used
@@ -19,11 +19,13 @@ class GeventServer(object):
         :param handler_class: The class to be used for handling WSGI requests
         :param bool direct: T/F indicating if the server should be run in a greenlet
         or in current thread
+        :param listener: An already listening socket to use instead of hostname and port
         """
         self.port = port
         self.server = None
         self.ge = None
-        self.make_server(app, port, hostname, handler_class, direct=direct)
+        self.make_server(app, port, hostname, handler_class, direct=direct,
+                         listener=listener)
 
     def stop(self):
         """Stops the running server if it was started"""
@@ -44,7 +46,8 @@ class GeventServer(object):
             logging.debug('server failed to start on ' + str(port))
             traceback.print_exc()
 
-    def make_server(self, app, port, hostname, handler_class, direct=False):
+    def make_server(self, app, port, hostname, handler_class, direct=False,
+                    listener=None):
         """Creates and starts the server. If direct is true the server is run
         in the current thread otherwise in a greenlet.
 
@@ -54,8 +57,9 @@ class GeventServer(object):
         :param handler_class: The class to be used for handling WSGI requests
         :param bool direct: T/F indicating if the server should be run in a greenlet
         or in current thread
+        :param listener: An already listening socket to use instead of hostname and port
         """
-        server = WSGIServer((hostname, port), app, handler_class=handler_class)
+        server = WSGIServer(listener or (hostname, port), app, handler_class=handler_class)
         server.init_socket()
         self.port = server.address[1]
 
@@ -0,0 +1,439 @@
+"""
+Random access into WARCs compressed as a single gzip member, rather than
+one gzip member per record, using a sidecar index of decompression
+seek points, as in zlib's examples/zran.c
+
+At every seek point, the seek index stores the compressed offset and bit
+position of a deflate block boundary and the 32K window of uncompressed
+data preceding it, which is all that is needed to resume decompression.
+
+Records in such WARCs are indexed by uncompressed offset and length,
+and a record is loaded by resuming decompression from the nearest seek point
+before its offset, instead of from the start of the file.
+
+Building a seek index requires the zlib shared library (loaded with ctypes),
+as locating block boundaries is not possible with the zlib module.
+Reading with a seek index only requires the zlib module
+"""
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import threading
+import time
+import zlib
+
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+
+from pywb.utils.io import no_except_close, BUFF_SIZE
+from pywb.utils.loaders import from_file_url
+
+
+WINDOW_SIZE = 32768
+
+SeekPoint = namedtuple('SeekPoint', 'uncomp_offset comp_offset bits window_pos window_len')
+
+
+# =============================================================================
+class ZStream(ctypes.Structure):
+    _fields_ = [('next_in', ctypes.c_void_p),
+                ('avail_in', ctypes.c_uint),
+                ('total_in', ctypes.c_ulong),
+                ('next_out', ctypes.c_void_p),
+                ('avail_out', ctypes.c_uint),
+                ('total_out', ctypes.c_ulong),
+                ('msg', ctypes.c_char_p),
+                ('state', ctypes.c_void_p),
+                ('zalloc', ctypes.c_void_p),
+                ('zfree', ctypes.c_void_p),
+                ('opaque', ctypes.c_void_p),
+                ('data_type', ctypes.c_int),
+                ('adler', ctypes.c_ulong),
+                ('reserved', ctypes.c_ulong),
+               ]
+
+
+_libz = None
+
+
+def load_libz():
+    """ Load the zlib shared library, or return None if not available
+    """
+    global _libz
+    if _libz is None:
+        try:
+            _libz = ctypes.CDLL(ctypes.util.find_library('z') or 'libz.so.1')
+            _libz.zlibVersion.restype = ctypes.c_char_p
+            _libz.inflateInit2_.argtypes = [ctypes.POINTER(ZStream), ctypes.c_int,
+                                            ctypes.c_char_p, ctypes.c_int]
+            _libz.inflate.argtypes = [ctypes.POINTER(ZStream), ctypes.c_int]
+            _libz.inflateEnd.argtypes = [ctypes.POINTER(ZStream)]
+        except (OSError, AttributeError):
+            _libz = False
+
+    return _libz or None
+
+
+# =============================================================================
+class GzipSeekIndex(object):
+    """ Seek points of a single gzip member file, loaded from
+    the sidecar file at <path>.zidx
+    """
+    EXT = '.zidx'
+
+    MAGIC = b'PYWB-ZIDX-1\n'
+
+    POINT_STRUCT = struct.Struct('<QQBI')
+
+    DEFAULT_INTERVAL = 1024 * 1024
+
+    Z_BLOCK = 5
+    Z_STREAM_END = 1
+    Z_BUF_ERROR = -5
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.points = []
+
+        with open(index_path, 'rb') as fh:
+            if fh.read(len(self.MAGIC)) != self.MAGIC:
+                raise IOError('Not a seek index: ' + index_path)
+
+            while True:
+                buff = fh.read(self.POINT_STRUCT.size)
+                if not buff:
+                    break
+
+                uncomp_offset, comp_offset, bits, window_len = self.POINT_STRUCT.unpack(buff)
+                self.points.append(SeekPoint(uncomp_offset, comp_offset, bits,
+                                             fh.tell(), window_len))
+                fh.seek(window_len, 1)
+
+        self.offsets = [point.uncomp_offset for point in self.points]
+
+    @classmethod
+    def get_index_path(cls, path):
+        return path + cls.EXT
+
+    @staticmethod
+    def is_build_supported():
+        return load_libz() is not None
+
+    @classmethod
+    def build(cls, path, interval=None):
+        """ Build seek index for gzip file at path, with a seek point
+        about every interval uncompressed bytes, and write it to <path>.zidx
+
+        Return the seek index, or None, and no index is written,
+        if the file is not a single gzip member
+        """
+        libz = load_libz()
+        if not libz:
+            raise IOError('zlib library not available, can not build seek index')
+
+        interval = interval or cls.DEFAULT_INTERVAL
+        index_path = cls.get_index_path(path)
+        temp_path = index_path + '.tmp'
+
+        strm = ZStream()
+        # 15 + 32: gzip or zlib header detection
+        version = libz.zlibVersion()
+        if libz.inflateInit2_(ctypes.byref(strm), 47, version, ctypes.sizeof(strm)) != 0:
+            raise IOError('zlib inflateInit2 failed')
+
+        inbuff = ctypes.create_string_buffer(BUFF_SIZE)
+        window = ctypes.create_string_buffer(WINDOW_SIZE)
+
+        total_in = 0
+        total_out = 0
+        last = None
+
+        try:
+            with open(path, 'rb') as fh, open(temp_path, 'wb') as out:
+                out.write(cls.MAGIC)
+
+                strm.avail_out = 0
+                ret = 0
+                while ret != cls.Z_STREAM_END:
+                    data = fh.read(BUFF_SIZE)
+                    if not data:
+                        raise IOError('Unexpected end of gzip file: ' + path)
+
+                    ctypes.memmove(inbuff, data, len(data))
+                    strm.next_in = ctypes.addressof(inbuff)
+                    strm.avail_in = len(data)
+
+                    while strm.avail_in:
+                        if not strm.avail_out:
+                            strm.next_out = ctypes.addressof(window)
+                            strm.avail_out = WINDOW_SIZE
+
+                        total_in += strm.avail_in
+                        total_out += strm.avail_out
+                        ret = libz.inflate(ctypes.byref(strm), cls.Z_BLOCK)
+                        total_in -= strm.avail_in
+                        total_out -= strm.avail_out
+
+                        if ret == cls.Z_STREAM_END:
+                            break
+
+                        if ret < 0 and ret != cls.Z_BUF_ERROR:
+                            raise IOError('Invalid gzip data in {0}: {1}'.format(path, ret))
+
+                        # at block boundary, and not after last block
+                        if ((strm.data_type & 128) and not (strm.data_type & 64) and
+                            (last is None or total_out - last > interval)):
+                            cls._write_point(out, total_out, total_in,
+                                             strm.data_type & 7,
+                                             cls._get_window(window, strm.avail_out, total_out))
+                            last = total_out
+
+                # any data after end of first member is another member
+                is_single = not strm.avail_in and not fh.read(1)
+
+            if is_single:
+                os.replace(temp_path, index_path)
+
+        finally:
+            libz.inflateEnd(ctypes.byref(strm))
+
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+
+        if not is_single:
+            return None
+
+        return cls(index_path)
+
+    @staticmethod
+    def _get_window(window, avail_out, total_out):
+        # window is circular: oldest data starts at current output position
+        pos = WINDOW_SIZE - avail_out
+        data = window.raw[pos:] + window.raw[:pos]
+        if total_out < WINDOW_SIZE:
+            data = data[WINDOW_SIZE - total_out:]
+
+        return data
+
+    @classmethod
+    def _write_point(cls, out, uncomp_offset, comp_offset, bits, window):
+        window = zlib.compress(window) if window else b''
+        out.write(cls.POINT_STRUCT.pack(uncomp_offset, comp_offset, bits, len(window)))
+        out.write(window)
+
+    def find_point(self, offset):
+        """ Return last seek point at or before uncompressed offset
+        """
+        inx = bisect_right(self.offsets, offset) - 1
+        return self.points[max(inx, 0)]
+
+    def load_window(self, point):
+        if not point.window_len:
+            return b''
+
+        with open(self.index_path, 'rb') as fh:
+            fh.seek(point.window_pos)
+            return zlib.decompress(fh.read(point.window_len))
+
+    def open(self, loader, url, offset, length=-1):
+        """ Return a reader for length uncompressed bytes starting at
+        uncompressed offset, reading compressed data from url with loader
+        starting at the nearest seek point
+        """
+        point = self.find_point(offset)
+
+        # if not byte-aligned, start with partial previous byte
+        comp_offset = point.comp_offset - 1 if point.bits else point.comp_offset
+
+        stream = loader.load(url, comp_offset, -1)
+
+        return SeekPointReader(stream, point, self.load_window(point),
+                               offset - point.uncomp_offset, length)
+
+
+# =============================================================================
+class SeekPointReader(object):
+    """ Reader of decompressed data resuming decompression at a seek point,
+    skipping the first skip bytes and reading at most length bytes
+    """
+    def __init__(self, stream, point, window, skip, length=-1):
+        self.stream = stream
+        self.shift = (8 - point.bits) if point.bits else 0
+        self.carry = b''
+
+        if window:
+            self.decomp = zlib.decompressobj(-zlib.MAX_WBITS, zdict=window)
+        else:
+            self.decomp = zlib.decompressobj(-zlib.MAX_WBITS)
+
+        self.buff = b''
+        self.remaining = length if length >= 0 else None
+        self.done = False
+
+        while skip > 0:
+            buff = self._read_block()
+            if not buff:
+                break
+
+            if len(buff) > skip:
+                self.buff = buff[skip:]
+                break
+
+            skip -= len(buff)
+
+    def _read_compressed(self):
+        while True:
+            data = self.stream.read(BUFF_SIZE)
+            if not self.shift:
+                return data
+
+            if not data:
+                # remaining bits of last byte
+                data, self.carry = self.carry, b''
+                return bytes([data[0] >> self.shift]) if data else b''
+
+            # align bit stream, starting at remaining bits of first byte.
+            # last byte is kept until next bits are read
+            data = self.carry + data
+            self.carry = data[-1:]
+            if len(data) > 1:
+                value = int.from_bytes(data, 'little') >> self.shift
+                return value.to_bytes(len(data), 'little')[:-1]
+
+    def _read_block(self):
+        while not self.done:
+            if self.decomp.unconsumed_tail:
+                data = self.decomp.unconsumed_tail
+            else:
+                data = self._read_compressed()
+                if not data:
+                    self.done = True
+                    return self.decomp.flush()
+
+            buff = self.decomp.decompress(data, BUFF_SIZE)
+            if self.decomp.eof:
+                self.done = True
+
+            if buff:
+                return buff
+
+        return b''
+
+    def read(self, length=-1):
+        if self.remaining is not None:
+            if length is None or length < 0:
+                length = self.remaining
+            else:
+                length = min(length, self.remaining)
+
+        result = []
+        size = 0
+        while length is None or length < 0 or size < length:
+            if not self.buff:
+                self.buff = self._read_block()
+                if not self.buff:
+                    break
+
+            if length is None or length < 0:
+                chunk = self.buff
+            else:
+                chunk = self.buff[:length - size]
+
+            self.buff = self.buff[len(chunk):]
+            result.append(chunk)
+            size += len(chunk)
+
+        if self.remaining is not None:
+            self.remaining -= size
+
+        return b''.join(result)
+
+    def readline(self, length=-1):
+        line = b''
+        while length is None or length < 0 or len(line) < length:
+            if not self.buff:
+                if self.remaining == 0:
+                    break
+
+                self.buff = self._read_block()
+                if not self.buff:
+                    break
+
+            inx = self.buff.find(b'\n')
+            end = inx + 1 if inx >= 0 else len(self.buff)
+            if length is not None and length >= 0:
+                end = min(end, length - len(line))
+
+            if self.remaining is not None:
+                end = min(end, self.remaining)
+                self.remaining -= end
+
+            line += self.buff[:end]
+            self.buff = self.buff[end:]
+
+            if line.endswith(b'\n'):
+                break
+
+        return line
+
+    def close(self):
+        no_except_close(self.stream)
+
+
+# =============================================================================
+class GzipSeekIndexCache(object):
+    """ Cache of seek indexes of local files, checking whether
+    a file has a seek index at most every check_interval seconds
+    """
+    DEFAULT_CHECK_INTERVAL = 10.0
+
+    MAX_SIZE = 256
+
+    def __init__(self, check_interval=None):
+        if check_interval is None:
+            check_interval = self.DEFAULT_CHECK_INTERVAL
+
+        self.check_interval = check_interval
+        self.indexes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def find(self, url):
+        """ Return the seek index for url, or None if url is not
+        a local .gz file with a seek index
+        """
+        if not url.endswith('.gz'):
+            return None
+
+        path = from_file_url(url)
+        if '://' in path:
+            return None
+
+        now = time.time()
+        with self.lock:
+            entry = self.indexes.get(path)
+            if entry and now - entry[0] < self.check_interval:
+                self.indexes.move_to_end(path)
+                return entry[2]
+
+        index_path = GzipSeekIndex.get_index_path(path)
+        try:
+            mtime = os.path.getmtime(index_path)
+        except OSError:
+            mtime = None
+
+        if mtime is None:
+            index = None
+        elif entry and entry[1] == mtime:
+            index = entry[2]
+        else:
+            index = GzipSeekIndex(index_path)
+
+        with self.lock:
+            self.indexes[path] = (now, mtime, index)
+            self.indexes.move_to_end(path)
+            while len(self.indexes) > self.MAX_SIZE:
+                self.indexes.popitem(last=False)
+
+        return index
@@ -42,6 +42,23 @@ def StreamIter(stream, header1=None, header2=None, size=BUFF_SIZE, closer=closin
             yield buff
 
 
+# =============================================================================
+def wrap_file(environ, filelike, block_size=BUFF_SIZE):
+    """ Return filelike wrapped with the server's wsgi.file_wrapper,
+    noting the returned body in the environ, as the wrapper may be
+    a function (eg. with uWSGI) and so not usable with isinstance()
+    """
+    body = environ['wsgi.file_wrapper'](filelike, block_size)
+    environ['pywb.file_wrapper_body'] = body
+    return body
+
+
+def is_file_wrapper_body(environ, body):
+    """ Return true if body was returned by wrap_file() for this request
+    """
+    return body is not None and body is environ.get('pywb.file_wrapper_body')
+
+
 # =============================================================================
 @contextmanager
 def call_release_conn(stream):
@@ -95,21 +112,45 @@ def compress_gzip_iter(orig_iter):
     yield compressobj.flush()
 
 
+# ============================================================================
+def skip_stream(stream, length):
+    """Skips up to length bytes of the supplied stream, using its skip()
+    method if available, otherwise reading and discarding them
+
+    :param stream: The stream to skip
+    :param int length: The number of bytes to skip
+    :return: The number of bytes skipped
+    :rtype: int
+    """
+    if hasattr(stream, 'skip'):
+        return stream.skip(length)
+
+    return _read_skip(stream, length)
+
+
+def _read_skip(stream, length):
+    skipped = 0
+    while skipped < length:
+        buff = stream.read(min(BUFF_SIZE, length - skipped))
+        if not buff:
+            break
+
+        skipped += len(buff)
+
+    return skipped
+
+
 # ============================================================================
 class OffsetLimitReader(LimitReader):
     def __init__(self, stream, offset, length):
         super(OffsetLimitReader, self).__init__(stream, length)
         self.offset = offset
-        if offset > 0:
-            self._skip_reader = LimitReader(stream, offset)
-        else:
-            self._skip_reader = None
+        self._skip_len = max(offset, 0)
 
     def _skip(self):
-        while self._skip_reader:
-            buff = self._skip_reader.read()
-            if not buff:
-                self._skip_reader = None
+        if self._skip_len:
+            skip_stream(self.stream, self._skip_len)
+            self._skip_len = 0
 
     def read(self, length=None):
         self._skip()
@@ -120,6 +161,81 @@ class OffsetLimitReader(LimitReader):
         return super(OffsetLimitReader, self).readline(length)
 
 
+# ============================================================================
+class SeekingLimitReader(LimitReader):
+    """LimitReader over stored data, with the next byte at a known offset,
+    which skips ahead by loading the remaining data directly from the new
+    offset with load_func(offset, length), rather than reading through
+    the skipped data, unless fewer than min_seek bytes are skipped.
+
+    If the data is stored as is in a local file, file_path is set to its path
+    """
+    MIN_SEEK = 65536
+
+    def __init__(self, stream, limit, offset, load_func, min_seek=None, file_path=None):
+        super(SeekingLimitReader, self).__init__(stream, limit)
+        self.offset = offset
+        self.load_func = load_func
+        self.min_seek = min_seek if min_seek is not None else self.MIN_SEEK
+        self.file_path = file_path
+
+    @classmethod
+    def from_reader(cls, reader, offset, load_func, file_path=None):
+        """Create from existing LimitReader positioned at offset,
+        keeping its tell() position
+        """
+        seeking = cls(reader.stream, reader.limit, offset, load_func,
+                      file_path=file_path)
+        seeking._orig_limit = reader._orig_limit
+        return seeking
+
+    def _update(self, buff):
+        self.offset += len(buff)
+        return super(SeekingLimitReader, self)._update(buff)
+
+    def skip(self, length):
+        length = min(length, self.limit)
+        if length < self.min_seek:
+            return _read_skip(self, length)
+
+        no_except_close(self.stream)
+
+        self.offset += length
+        self.limit -= length
+        self.stream = self.load_func(self.offset, self.limit)
+        return length
+
+
+# ============================================================================
+class FileRangeReader(LimitReader):
+    """LimitReader over length bytes of the local file at path,
+    starting at offset.
+
+    The file is unbuffered, so that its fileno() position always matches
+    the read position, allowing the remaining range to be sent with
+    wsgi.file_wrapper (eg. using sendfile) when Content-Length is set
+    to the remaining limit
+    """
+    def __init__(self, path, offset, length):
+        fh = open(path, 'rb', buffering=0)
+        try:
+            fh.seek(offset)
+        except Exception:
+            fh.close()
+            raise
+
+        super(FileRangeReader, self).__init__(fh, length)
+
+    def fileno(self):
+        return self.stream.fileno()
+
+    def skip(self, length):
+        length = min(length, self.limit)
+        self.stream.seek(length, 1)
+        self.limit -= length
+        return length
+
+
 # ============================================================================
 class StreamClosingReader(object):
     def __init__(self, stream):
@@ -133,3 +249,39 @@ class StreamClosingReader(object):
 
     def close(self):
         no_except_close(self.stream)
+
+
+# ============================================================================
+class IterReader(object):
+    """ File-like reader over an iterator of bytes chunks,
+    closing the iterator, if supported, on close()
+    """
+    def __init__(self, iterable):
+        self.iterable = iterable
+        self._iter = iter(iterable)
+        self.buff = b''
+
+    def _next_chunk(self):
+        for chunk in self._iter:
+            if chunk:
+                return chunk
+
+        return b''
+
+    def read(self, length=None):
+        if length is None or length < 0:
+            buff = self.buff + b''.join(self._iter)
+            self.buff = b''
+            return buff
+
+        if not self.buff:
+            self.buff = self._next_chunk()
+
+        buff = self.buff[:length]
+        self.buff = self.buff[length:]
+        return buff
+
+    def close(self):
+        self.buff = b''
+        if hasattr(self.iterable, 'close'):
+            no_except_close(self.iterable)
@@ -192,6 +192,8 @@ class BlockLoader(BaseLoader):
     loaders = {}
     profile_loader = None
 
+    REMOTE_TYPES = ('http', 'https', 's3', 'webhdfs')
+
     def __init__(self, **kwargs):
         super(BlockLoader, self).__init__()
         self.cached = {}
@@ -233,11 +235,41 @@ class BlockLoader(BaseLoader):
         if self.profile_loader:
             profile = self.profile_loader(profile_name, scheme)
 
+            # shared file pool is not part of the profile
+            if self.kwargs.get('file_pool') and 'file_pool' not in profile:
+                profile = dict(profile, file_pool=self.kwargs['file_pool'])
+
         loader = loader_cls(**profile)
 
+        if scheme in self.REMOTE_TYPES:
+            loader = self._init_read_ahead(loader, profile)
+            loader = self._init_range_cache(loader, profile)
+
         self.cached[type_] = loader
         return loader, url
 
+    def _init_read_ahead(self, loader, profile):
+        """ Wrap remote loader to coalesce nearby ranges and read ahead,
+        if configured for the profile, or for this loader
+        """
+        config = profile.get('read_ahead', self.kwargs.get('read_ahead'))
+        if not config:
+            return loader
+
+        from pywb.utils.readahead import ReadAheadBuffer, ReadAheadLoader
+        return ReadAheadLoader(loader, ReadAheadBuffer.from_config(config))
+
+    def _init_range_cache(self, loader, profile):
+        """ Wrap remote loader to read through a disk range cache,
+        if one is configured for the profile, or for this loader
+        """
+        config = profile.get('range_cache', self.kwargs.get('range_cache'))
+        if not config:
+            return loader
+
+        from pywb.utils.rangecache import DiskRangeCache, RangeCachingLoader
+        return RangeCachingLoader(loader, DiskRangeCache.from_config(config))
+
     def _get_loader_class_for_type(self, type_):
         loader_cls = self.loaders.get(type_)
         return loader_cls
@@ -293,6 +325,11 @@ class PackageLoader(BaseLoader):
 
 # =================================================================
 class LocalFileLoader(PackageLoader):
+    def __init__(self, **kwargs):
+        super(LocalFileLoader, self).__init__(**kwargs)
+        # optional FileHandlePool, shared open file descriptors
+        self.file_pool = kwargs.get('file_pool')
+
     def load(self, url, offset=0, length=-1):
         """
         Load a file-like reader from the local file system
@@ -310,6 +347,9 @@ class LocalFileLoader(PackageLoader):
         afile = None
         try:
             # first, try as file
+            if self.file_pool:
+                return self.file_pool.open(url, offset, length)
+
             afile = open(url, 'rb')
 
         except IOError:
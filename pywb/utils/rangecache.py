@@ -0,0 +1,258 @@
+"""
+Disk-backed read-through cache of byte ranges loaded from remote storage
+(http/https, s3, webhdfs), used by BlockLoader when a range_cache is
+configured for the loader profile
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+from collections import OrderedDict
+
+from pywb.utils.io import no_except_close, BUFF_SIZE
+
+
+# =============================================================================
+class DiskRangeCache(object):
+    """ Size-bounded LRU cache of byte ranges, stored as files in cache_dir,
+    content-addressed by a hash of (url, offset, length).
+
+    A range is filled only once, even if requested concurrently:
+    other requests for the same range wait for the fill to finish.
+    Files are written to a temp file and renamed into place, so a partial
+    range is never served, even to other processes sharing the cache_dir.
+
+    Only ranges with a known length of at most max_entry_size are cached,
+    and only if exactly length bytes are loaded: a truncated range, or
+    a full response from a server ignoring the range, is never cached
+    """
+    DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+    DEFAULT_MAX_ENTRY_SIZE = 16 * 1024 * 1024
+
+    TEMP_SUFFIX = '.tmp'
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, cache_dir, max_size=None, max_entry_size=None):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size = max_size or self.DEFAULT_MAX_SIZE
+        self.max_entry_size = min(max_entry_size or self.DEFAULT_MAX_ENTRY_SIZE,
+                                  self.max_size)
+
+        self.lock = threading.Lock()
+        self.fill_locks = {}
+
+        self.entries = OrderedDict()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_entries()
+
+    @classmethod
+    def from_config(cls, config):
+        """ Return the shared cache for the config dict 'dir',
+        so that all loaders using the same dir share one cache
+        """
+        cache_dir = os.path.abspath(config['dir'])
+
+        with cls._instances_lock:
+            cache = cls._instances.get(cache_dir)
+            if not cache:
+                cache = cls(cache_dir,
+                            config.get('max_size'),
+                            config.get('max_entry_size'))
+
+                cls._instances[cache_dir] = cache
+
+            return cache
+
+    def _load_entries(self):
+        """ Add existing cached ranges, least recently used first
+        """
+        found = []
+        for dirpath, dirnames, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if filename.endswith(self.TEMP_SUFFIX):
+                    continue
+
+                try:
+                    st = os.stat(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+
+                found.append((st.st_mtime, filename, st.st_size))
+
+        for mtime, key, size in sorted(found):
+            self.entries[key] = size
+            self.size += size
+
+        self._evict()
+
+    @staticmethod
+    def make_key(url, offset, length):
+        key = '{0}\n{1}\n{2}'.format(url, offset, length)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def is_cacheable(self, length):
+        return 0 < length <= self.max_entry_size
+
+    def load(self, url, offset, length, loader):
+        """ Return a reader for the cached range, filling it from
+        loader.load(url, offset, length) if not yet cached
+        """
+        key = self.make_key(url, offset, length)
+
+        fh = self._open_cached(key)
+        if fh:
+            return fh
+
+        with self._get_fill_lock(key):
+            # may have been filled while waiting
+            fh = self._open_cached(key)
+            if fh:
+                return fh
+
+            with self.lock:
+                self.misses += 1
+
+            try:
+                return self._fill(key, loader.load(url, offset, length), length)
+            finally:
+                with self.lock:
+                    self.fill_locks.pop(key, None)
+
+    def _get_fill_lock(self, key):
+        with self.lock:
+            lock = self.fill_locks.get(key)
+            if not lock:
+                lock = self.fill_locks[key] = threading.Lock()
+
+            return lock
+
+    def _open_cached(self, key):
+        path = self.get_path(key)
+        try:
+            fh = open(path, 'rb')
+        except IOError:
+            with self.lock:
+                size = self.entries.pop(key, None)
+                if size is not None:
+                    self.size -= size
+
+            return None
+
+        size = os.fstat(fh.fileno()).st_size
+
+        try:
+            os.utime(path, None)
+        except OSError:  # pragma: no cover
+            pass
+
+        with self.lock:
+            # may be filled by another process sharing the cache dir
+            if key not in self.entries:
+                self.entries[key] = size
+                self.size += size
+            else:
+                self.entries.move_to_end(key)
+
+            self.hits += 1
+            self.bytes_saved += size
+
+        return fh
+
+    def _fill(self, key, stream, length):
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                         suffix=self.TEMP_SUFFIX)
+
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                # read at most one byte past length to detect oversized ranges
+                while size <= length:
+                    buff = stream.read(min(BUFF_SIZE, length + 1 - size))
+                    if not buff:
+                        break
+
+                    out.write(buff)
+                    size += len(buff)
+
+            if size != length:
+                msg = 'Range cache fill expected {0} bytes, got {1}'
+                raise IOError(msg.format(length, size if size < length else 'more'))
+
+            os.replace(temp_path, path)
+
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+        finally:
+            no_except_close(stream)
+
+        with self.lock:
+            if key not in self.entries:
+                self.size += size
+
+            self.entries[key] = size
+            self._evict()
+
+        return open(path, 'rb')
+
+    def _evict(self):
+        while self.size > self.max_size and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+            try:
+                os.remove(self.get_path(key))
+            except OSError as e:
+                logging.debug('Range cache evict failed: ' + str(e))
+
+    def get_stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': float(self.hits) / total if total else 0.0,
+                    'bytes_saved': self.bytes_saved,
+                    'evictions': self.evictions,
+                    'entries': len(self.entries),
+                    'size': self.size,
+                    'max_size': self.max_size,
+                    'max_entry_size': self.max_entry_size,
+                    'dir': self.cache_dir,
+                   }
+
+
+# =============================================================================
+class RangeCachingLoader(object):
+    """ Loader wrapping a remote loader, reading cacheable ranges
+    through a DiskRangeCache
+    """
+    def __init__(self, loader, cache):
+        self.loader = loader
+        self.cache = cache
+
+    def load(self, url, offset=0, length=-1):
+        if not self.cache.is_cacheable(length):
+            return self.loader.load(url, offset, length)
+
+        return self.cache.load(url, offset, length, self.loader)
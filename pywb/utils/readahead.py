@@ -0,0 +1,259 @@
+"""
+Coalescing of nearby range requests and adaptive read-ahead for loads
+from remote storage (http/https, s3, webhdfs), used by BlockLoader
+when read_ahead is configured for the loader profile
+"""
+
+import threading
+
+from collections import OrderedDict
+from io import BytesIO
+
+from pywb.utils.io import no_except_close, BUFF_SIZE
+
+
+# =============================================================================
+class ReadAheadBlock(object):
+    """ A range of a remote url, read or being read in a single request
+    """
+    def __init__(self, url, start, length, read_ahead):
+        self.url = url
+        self.start = start
+        self.length = length
+        self.end = start + length + read_ahead
+        self.data = None
+        self.done = threading.Event()
+
+    def covers(self, offset, length):
+        if self.data is not None:
+            end = self.start + len(self.data)
+        else:
+            end = self.end
+
+        return self.start <= offset and offset + length <= end
+
+
+# =============================================================================
+class ReadAheadBuffer(object):
+    """ Size-bounded LRU buffer of blocks read from remote urls.
+
+    A range that falls within a block already read, or being read
+    by a concurrent request, is served from that block without
+    a new remote request.
+
+    Otherwise, the range is read together with read-ahead bytes past its end:
+    min_size for the first access to a url, doubling up to max_size as long
+    as each range starts within max_gap bytes after the end of the previous one.
+    Ranges longer than max_size are not buffered
+    """
+    DEFAULT_MIN_SIZE = 32 * 1024
+
+    DEFAULT_MAX_SIZE = 1024 * 1024
+
+    DEFAULT_MAX_GAP = 16 * 1024
+
+    DEFAULT_BUFFER_SIZE = 16 * 1024 * 1024
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, min_size=None, max_size=None, max_gap=None, buffer_size=None):
+        self.min_size = min_size if min_size is not None else self.DEFAULT_MIN_SIZE
+        self.max_size = max_size or self.DEFAULT_MAX_SIZE
+        self.max_gap = max_gap if max_gap is not None else self.DEFAULT_MAX_GAP
+        self.buffer_size = buffer_size or self.DEFAULT_BUFFER_SIZE
+
+        self.lock = threading.Lock()
+
+        self.blocks = OrderedDict()
+        self.size = 0
+
+        # url -> (end of last range requested, current read-ahead)
+        self.streams = OrderedDict()
+
+        self.loads = 0
+        self.requests = 0
+        self.bytes_read = 0
+        self.read_ahead_bytes = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """ Return the shared buffer for the config, which may be
+        a dict of min_size, max_size, max_gap and buffer_size or True
+        to use the defaults
+        """
+        if not isinstance(config, dict):
+            config = {}
+
+        key = tuple(config.get(name) for name in
+                    ('min_size', 'max_size', 'max_gap', 'buffer_size'))
+
+        with cls._instances_lock:
+            buff = cls._instances.get(key)
+            if not buff:
+                buff = cls._instances[key] = cls(*key)
+
+            return buff
+
+    def is_bufferable(self, length):
+        return 0 < length <= self.max_size
+
+    def load(self, url, offset, length, loader):
+        """ Return a reader for the range, from a buffered block if possible,
+        otherwise from a new block read from loader.load()
+        """
+        with self.lock:
+            self.loads += 1
+
+            block = self._find_block(url, offset, length)
+            if not block:
+                block = self._new_block(url, offset, length)
+                fill = True
+            else:
+                fill = False
+
+            self._update_stream(url, offset + length)
+
+        if fill:
+            self._fill(block, loader)
+        else:
+            block.done.wait()
+
+        if block.data is None:
+            # failed to read block: load directly
+            with self.lock:
+                self.requests += 1
+
+            return loader.load(url, offset, length)
+
+        # may be short if block ends at end of file
+        start = offset - block.start
+        return BytesIO(block.data[start:start + length])
+
+    def _find_block(self, url, offset, length):
+        for block in reversed(self.blocks.get(url, {}).values()):
+            if block.covers(offset, length):
+                self.blocks[url].move_to_end(block.start)
+                self.blocks.move_to_end(url)
+                return block
+
+        return None
+
+    def _new_block(self, url, offset, length):
+        last_end, read_ahead = self.streams.get(url, (None, 0))
+
+        if last_end is not None and 0 <= offset - last_end <= self.max_gap:
+            read_ahead = min(max(read_ahead * 2, self.min_size), self.max_size)
+        else:
+            read_ahead = self.min_size
+
+        self.streams[url] = (last_end, read_ahead)
+
+        block = ReadAheadBlock(url, offset, length, read_ahead)
+
+        blocks = self.blocks.get(url)
+        if blocks is None:
+            blocks = self.blocks[url] = OrderedDict()
+
+        elif offset in blocks:
+            self._remove(blocks[offset])
+            blocks = self.blocks.setdefault(url, OrderedDict())
+
+        blocks[offset] = block
+        self.blocks.move_to_end(url)
+
+        self.requests += 1
+        return block
+
+    def _update_stream(self, url, end):
+        _, read_ahead = self.streams.pop(url, (None, 0))
+        self.streams[url] = (end, read_ahead)
+
+        while len(self.streams) > 1024:
+            self.streams.popitem(last=False)
+
+    def _fill(self, block, loader):
+        length = block.end - block.start
+        stream = None
+        data = None
+
+        try:
+            stream = loader.load(block.url, block.start, length)
+            buff = BytesIO()
+            while buff.tell() < length:
+                chunk = stream.read(min(BUFF_SIZE, length - buff.tell()))
+                if not chunk:
+                    break
+
+                buff.write(chunk)
+
+            data = buff.getvalue()
+
+        finally:
+            no_except_close(stream)
+
+            with self.lock:
+                if data is None:
+                    self._remove(block)
+                else:
+                    block.data = data
+                    self.bytes_read += len(data)
+                    self.read_ahead_bytes += max(len(data) - block.length, 0)
+
+                    # may have been evicted while being read
+                    if self._is_buffered(block):
+                        self.size += len(data)
+                        self._evict()
+
+            block.done.set()
+
+    def _is_buffered(self, block):
+        blocks = self.blocks.get(block.url)
+        return blocks is not None and blocks.get(block.start) is block
+
+    def _remove(self, block):
+        if not self._is_buffered(block):
+            return
+
+        blocks = self.blocks[block.url]
+        del blocks[block.start]
+        if not blocks:
+            del self.blocks[block.url]
+
+        if block.data is not None:
+            self.size -= len(block.data)
+
+    def _evict(self):
+        while self.size > self.buffer_size and self.blocks:
+            url, blocks = next(iter(self.blocks.items()))
+            start, block = next(iter(blocks.items()))
+            self._remove(block)
+
+    def get_stats(self):
+        with self.lock:
+            saved = self.loads - self.requests
+            return {'loads': self.loads,
+                    'requests': self.requests,
+                    'requests_saved': saved,
+                    'bytes_read': self.bytes_read,
+                    'read_ahead_bytes': self.read_ahead_bytes,
+                    'blocks': sum(len(blocks) for blocks in self.blocks.values()),
+                    'size': self.size,
+                    'buffer_size': self.buffer_size,
+                   }
+
+
+# =============================================================================
+class ReadAheadLoader(object):
+    """ Loader wrapping a remote loader, reading ranges of known
+    length through a ReadAheadBuffer
+    """
+    def __init__(self, loader, buffer):
+        self.loader = loader
+        self.buffer = buffer
+
+    def load(self, url, offset=0, length=-1):
+        if not self.buffer.is_bufferable(length):
+            return self.loader.load(url, offset, length)
+
+        return self.buffer.load(url, offset, length, self.loader)
@@ -0,0 +1,128 @@
+"""
+Coalescing of identical concurrent calls, so that only one of them
+does the work and the others share its result
+"""
+
+import sys
+import threading
+import time
+
+
+# =============================================================================
+def wait_event(event, timeout, poll_interval=0.005):
+    """ Wait for a threading.Event to be set, return False on timeout.
+
+    Works with threads, and with greenlets, whether or not gevent has
+    patched threading
+    """
+    if not _is_cooperative():
+        return event.wait(timeout)
+
+    # gevent without patched threading: a native wait would block the hub,
+    # and with it the greenlet setting the event, so poll with gevent sleep
+    deadline = time.time() + timeout
+    while not event.is_set():
+        if time.time() >= deadline:
+            return False
+
+        time.sleep(poll_interval)
+
+    return True
+
+
+def _is_cooperative():
+    monkey = sys.modules.get('gevent.monkey')
+    if not monkey:
+        return False
+
+    return (monkey.is_module_patched('time') and
+            not monkey.is_module_patched('threading'))
+
+
+# =============================================================================
+class _Call(object):
+    """ A call in flight, and its result or exception once done
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc = None
+
+
+# =============================================================================
+class SingleFlight(object):
+    """ While a call for a key is in flight, concurrent calls for the same key
+    wait for it to finish and share its result, or exception, instead
+    of repeating the work. The key is released as soon as the call finishes:
+    results are not cached.
+
+    Works with threads, and with greenlets, whether or not gevent has
+    patched threading. A waiter that times out makes the call itself
+    """
+    DEFAULT_WAIT_TIMEOUT = 60.0
+
+    POLL_INTERVAL = 0.005
+
+    def __init__(self, wait_timeout=None):
+        self.wait_timeout = wait_timeout or self.DEFAULT_WAIT_TIMEOUT
+
+        self.calls = {}
+        self.lock = threading.Lock()
+
+        self.leaders = 0
+        self.followers = 0
+        self.timeouts = 0
+
+    def do(self, key, func):
+        """ Return (result, shared), the result of func() or of the
+        concurrent call for the same key, and whether it was shared
+        from another call, in which case it must not be mutated
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = self.calls[key] = _Call()
+                self.leaders += 1
+                is_leader = True
+            else:
+                self.followers += 1
+                is_leader = False
+
+        if not is_leader:
+            if self._wait(call):
+                if call.exc is not None:
+                    raise call.exc
+
+                return call.result, True
+
+            with self.lock:
+                self.timeouts += 1
+
+            return func(), False
+
+        try:
+            call.result = func()
+            return call.result, False
+
+        except Exception as e:
+            call.exc = e
+            raise
+
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+
+            call.done.set()
+
+    def _wait(self, call):
+        """ Wait for call to finish, return False on timeout
+        """
+        return wait_event(call.done, self.wait_timeout, self.POLL_INTERVAL)
+
+    def get_stats(self):
+        with self.lock:
+            return {'leaders': self.leaders,
+                    'followers': self.followers,
+                    'timeouts': self.timeouts,
+                    'in_flight': len(self.calls),
+                   }
@@ -0,0 +1,218 @@
+import os
+import threading
+
+import pytest
+
+from pywb.utils.filepool import FileHandlePool
+from pywb.utils.loaders import BlockLoader
+from pywb.warcserver.resource.blockrecordloader import BlockArcWarcRecordLoader
+
+from pywb import get_test_dir
+
+
+pytestmark = pytest.mark.skipif(not FileHandlePool.is_supported(),
+                                reason='os.pread not available')
+
+
+# ============================================================================
+def write_file(path, data):
+    with open(path, 'wb') as fh:
+        fh.write(data)
+
+    return str(path)
+
+
+# ============================================================================
+def test_range_read(tmpdir):
+    path = write_file(tmpdir.join('test.txt'), b'line one\nline two\nline three\n')
+    pool = FileHandlePool()
+
+    with pool.open(path, 5, 12) as reader:
+        assert reader.tell() == 5
+        assert reader.readline() == b'one\n'
+        assert reader.read(4) == b'line'
+        assert reader.read() == b' two'
+        assert reader.read() == b''
+
+    with pool.open(path, 18) as reader:
+        assert reader.read() == b'line three\n'
+
+    with pool.open(path) as reader:
+        reader.seek(-6, 2)
+        assert reader.read() == b'three\n'
+
+    assert len(pool.files) == 1
+    assert reader.closed
+
+
+def test_shared_descriptor(tmpdir):
+    path = write_file(tmpdir.join('test.txt'), b'abcdefghij')
+    pool = FileHandlePool()
+
+    reader1 = pool.open(path, 0, 5)
+    reader2 = pool.open(path, 5, 5)
+
+    assert reader1.pooled is reader2.pooled
+
+    # interleaved reads do not affect each other
+    assert reader2.read(2) == b'fg'
+    assert reader1.read(2) == b'ab'
+    assert reader2.read() == b'hij'
+    assert reader1.read() == b'cde'
+
+    reader1.close()
+    reader2.close()
+
+    assert len(pool.files) == 1
+
+
+def test_lru_evict(tmpdir):
+    paths = [write_file(tmpdir.join('file-{0}'.format(i)), b'data %d' % i)
+             for i in range(3)]
+
+    pool = FileHandlePool(max_size=2)
+
+    reader = pool.open(paths[0])
+    pooled = reader.pooled
+
+    pool.open(paths[1]).close()
+    pool.open(paths[2]).close()
+
+    assert list(pool.files.keys()) == paths[1:]
+
+    # still usable until closed
+    assert pooled.fd is not None
+    assert reader.read() == b'data 0'
+
+    reader.close()
+    assert pooled.fd is None
+
+    pool.close()
+    assert len(pool.files) == 0
+
+
+def test_released_when_collected(tmpdir):
+    paths = [write_file(tmpdir.join('file-{0}'.format(i)), b'data %d' % i)
+             for i in range(2)]
+
+    pool = FileHandlePool(max_size=1)
+
+    reader = pool.open(paths[0])
+    pooled = reader.pooled
+
+    # collected while holding the lock, not released until next open
+    with pool.lock:
+        del reader
+
+    assert pooled.refs == 1
+    assert len(pool.pending_release) == 1
+
+    pool.open(paths[1]).close()
+
+    assert len(pool.pending_release) == 0
+    assert pooled.refs == 0
+    assert pooled.fd is None
+
+def test_stale_replaced(tmpdir):
+    path = write_file(tmpdir.join('test.txt'), b'first')
+    pool = FileHandlePool(check_interval=0)
+
+    reader = pool.open(path)
+    pooled = reader.pooled
+
+    # replace with a new file at same path
+    new_path = write_file(tmpdir.join('test.txt.new'), b'second')
+    os.rename(new_path, path)
+
+    with pool.open(path) as reader2:
+        assert reader2.pooled is not pooled
+        assert reader2.read() == b'second'
+
+    # existing reader keeps reading the original file
+    assert reader.read() == b'first'
+    reader.close()
+    assert pooled.fd is None
+
+    os.remove(path)
+    with pytest.raises(IOError):
+        pool.open(path)
+
+    assert len(pool.files) == 0
+
+
+def test_stale_not_checked_in_interval(tmpdir):
+    path = write_file(tmpdir.join('test.txt'), b'first')
+    pool = FileHandlePool(check_interval=1000)
+
+    with pool.open(path) as reader:
+        pooled = reader.pooled
+
+    os.utime(path, (0, 0))
+
+    with pool.open(path) as reader:
+        assert reader.pooled is pooled
+
+
+def test_concurrent_readers(tmpdir):
+    data = bytes(bytearray(range(256))) * 64
+    path = write_file(tmpdir.join('test.bin'), data)
+    pool = FileHandlePool()
+
+    errors = []
+
+    def read_range(offset):
+        with pool.open(path, offset, 1000) as reader:
+            buff = b''
+            while True:
+                chunk = reader.read(7)
+                if not chunk:
+                    break
+                buff += chunk
+
+        if buff != data[offset:offset + 1000]:
+            errors.append(offset)
+
+    threads = [threading.Thread(target=read_range, args=(i * 100,)) for i in range(50)]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(pool.files) == 1
+    assert pool.files[path].refs == 0
+
+
+def test_pooled_record_loader():
+    pool = FileHandlePool()
+    loader = BlockArcWarcRecordLoader(file_pool=pool)
+
+    path = os.path.join(get_test_dir(), 'warcs', 'example.warc.gz')
+
+    record = loader.load(path, 333, 1043)
+    assert record.rec_headers.get_header('WARC-Target-URI') == 'http://example.com?example=1'
+    assert b'Example Domain' in record.content_stream().read()
+    record.raw_stream.close()
+
+    record = loader.load('file://' + path, 1864, 553)
+    assert record.rec_type == 'revisit'
+    record.raw_stream.close()
+
+    assert len(pool.files) == 1
+    assert pool.files[path].refs == 0
+
+    # non-file urls not pooled
+    assert BlockLoader(file_pool=pool).load('pkg://pywb/static/wombat.js', 0, 10).read() != b''
+    assert len(pool.files) == 1
+
+
+def test_pooled_with_profile_loader():
+    pool = FileHandlePool()
+    loader = BlockLoader(file_pool=pool)
+    loader.profile_loader = lambda profile_name, scheme: {}
+
+    path = os.path.join(get_test_dir(), 'warcs', 'example.warc.gz')
+
+    loader.load(path, 333, 1043).close()
+    assert len(pool.files) == 1
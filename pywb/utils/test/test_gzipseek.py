@@ -0,0 +1,167 @@
+import gzip
+import json
+import os
+import random
+import shutil
+import tempfile
+
+from io import BytesIO
+
+import pytest
+
+from warcio.statusandheaders import StatusAndHeaders
+from warcio.warcwriter import WARCWriter
+
+from pywb.indexer.cdxindexer import main as cdxindexer_main
+from pywb.utils.gzipseek import GzipSeekIndex, GzipSeekIndexCache
+from pywb.utils.io import skip_stream
+from pywb.utils.loaders import BlockLoader
+from pywb.warcserver.resource.blockrecordloader import BlockArcWarcRecordLoader
+
+from pywb import get_test_dir
+
+
+# ============================================================================
+def make_text(rand, size):
+    """ Random hex lines, compressing to many small deflate blocks
+    """
+    lines = []
+    total = 0
+    while total < size:
+        line = '{0:032x}\n'.format(rand.getrandbits(128)).encode('ascii')
+        lines.append(line)
+        total += len(line)
+
+    return b''.join(lines)
+
+
+# ============================================================================
+@pytest.mark.skipif(not GzipSeekIndex.is_build_supported(),
+                    reason='zlib library not available')
+class TestGzipSeekIndex(object):
+    @classmethod
+    def setup_class(cls):
+        cls.root_dir = os.path.realpath(tempfile.mkdtemp())
+
+        rand = random.Random(1234)
+        cls.payloads = {}
+
+        raw = BytesIO()
+        writer = WARCWriter(raw, gzip=False)
+        for i in range(20):
+            url = 'http://example.com/page-{0}'.format(i)
+            payload = make_text(rand, rand.randint(10000, 60000))
+            cls.payloads[url] = payload
+
+            http_headers = StatusAndHeaders('200 OK', [('Content-Type', 'text/plain')],
+                                            protocol='HTTP/1.1')
+
+            record = writer.create_warc_record(url, 'response',
+                                               payload=BytesIO(payload),
+                                               http_headers=http_headers)
+            writer.write_record(record)
+
+        cls.raw = raw.getvalue()
+
+        cls.warc_path = os.path.join(cls.root_dir, 'single.warc.gz')
+        with gzip.open(cls.warc_path, 'wb') as fh:
+            fh.write(cls.raw)
+
+        cls.cdx_path = os.path.join(cls.root_dir, 'single.cdxj')
+        cdxindexer_main(['--seek-index', '--seek-interval', '0.05', '-j',
+                         '-o', cls.cdx_path, cls.warc_path])
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.root_dir)
+
+    def iter_cdx(self):
+        with open(self.cdx_path) as fh:
+            for line in fh:
+                if line.startswith('!'):
+                    continue
+
+                yield json.loads(line.split(' ', 2)[2])
+
+    def test_index(self):
+        index = GzipSeekIndex(self.warc_path + '.zidx')
+
+        assert len(index.points) > 5
+        assert index.points[0].uncomp_offset == 0
+
+        # offsets and lengths are uncompressed
+        entries = list(self.iter_cdx())
+        assert len(entries) == 20
+
+        last = entries[-1]
+        # as for uncompressed WARCs, excluding record trailing newlines
+        assert int(last['offset']) + int(last['length']) + 4 == len(self.raw)
+
+        assert index.find_point(0) == index.points[0]
+        assert index.find_point(len(self.raw)) == index.points[-1]
+
+        point = index.points[3]
+        assert index.find_point(point.uncomp_offset) == point
+        assert index.find_point(point.uncomp_offset - 1) == index.points[2]
+
+    def test_open_ranges(self):
+        index = GzipSeekIndex(self.warc_path + '.zidx')
+        loader = BlockLoader()
+
+        offsets = [0, 1, len(self.raw) - 10] + [point.uncomp_offset + delta
+                                                 for point in index.points
+                                                 for delta in (-1, 0, 1)]
+
+        for offset in offsets:
+            offset = max(offset, 0)
+            reader = index.open(loader, self.warc_path, offset, 5000)
+            assert reader.read() == self.raw[offset:offset + 5000]
+            reader.close()
+
+        # to end of file
+        reader = index.open(loader, self.warc_path, index.points[-1].uncomp_offset + 7)
+        assert reader.read() == self.raw[index.points[-1].uncomp_offset + 7:]
+
+        # readline
+        reader = index.open(loader, self.warc_path, 0, 100)
+        assert reader.readline() == self.raw.split(b'\n', 1)[0] + b'\n'
+
+    def test_load_records(self):
+        loader = BlockArcWarcRecordLoader()
+
+        for entry in self.iter_cdx():
+            record = loader.load(self.warc_path, entry['offset'], entry['length'])
+            url = record.rec_headers.get_header('WARC-Target-URI')
+            assert record.raw_stream.read() == self.payloads[url]
+
+    def test_skip_payload(self):
+        loader = BlockArcWarcRecordLoader()
+
+        for entry in self.iter_cdx():
+            record = loader.load(self.warc_path, entry['offset'], entry['length'])
+            url = record.rec_headers.get_header('WARC-Target-URI')
+
+            # resumes from seek point nearest to new offset
+            skip = len(self.payloads[url]) - 5000
+            assert skip_stream(record.raw_stream, skip) == skip
+            assert record.raw_stream.read() == self.payloads[url][skip:]
+
+    def test_multi_member_not_indexed(self):
+        path = os.path.join(self.root_dir, 'example.warc.gz')
+        shutil.copy(os.path.join(get_test_dir(), 'warcs', 'example.warc.gz'), path)
+
+        assert GzipSeekIndex.build(path) is None
+        assert not os.path.isfile(path + '.zidx')
+        assert os.listdir(self.root_dir).count('example.warc.gz') == 1
+
+    def test_index_cache(self):
+        cache = GzipSeekIndexCache()
+
+        index = cache.find(self.warc_path)
+        assert index is not None
+        assert cache.find('file://' + self.warc_path) is not None
+        assert cache.find(self.warc_path) is index
+
+        assert cache.find(os.path.join(get_test_dir(), 'warcs', 'example.warc.gz')) is None
+        assert cache.find(os.path.join(get_test_dir(), 'warcs', 'example.warc')) is None
+        assert cache.find('http://example.com/single.warc.gz') is None
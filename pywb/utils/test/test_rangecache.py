@@ -0,0 +1,215 @@
+from gevent import monkey; monkey.patch_all(thread=False)
+
+import os
+import threading
+import time
+
+from io import BytesIO
+
+import pytest
+
+from pywb.utils.geventserver import GeventServer
+from pywb.utils.loaders import BlockLoader
+from pywb.utils.rangecache import DiskRangeCache, RangeCachingLoader
+
+
+DATA = bytes(bytearray(range(256))) * 16
+
+
+# ============================================================================
+class RangeApp(object):
+    """ Stand-in for remote storage, serving byte ranges of DATA
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, env, start_response):
+        self.count += 1
+
+        range_ = env.get('HTTP_RANGE')
+        if range_:
+            start, end = range_.split('=', 1)[1].split('-')
+            end = int(end) + 1 if end else len(DATA)
+            data = DATA[int(start):end]
+            status = '206 Partial Content'
+        else:
+            data = DATA
+            status = '200 OK'
+
+        start_response(status, [('Content-Length', str(len(data)))])
+        return [data]
+
+
+# ============================================================================
+class SlowLoader(object):
+    def __init__(self):
+        self.count = 0
+
+    def load(self, url, offset, length):
+        self.count += 1
+        time.sleep(0.1)
+        return BlockLoader().load(url, offset, length)
+
+
+# ============================================================================
+class FixedLoader(object):
+    """ Loader returning data regardless of the range requested
+    """
+    def __init__(self, data):
+        self.data = data
+
+    def load(self, url, offset, length):
+        return BytesIO(self.data)
+
+
+# ============================================================================
+class TestRangeCache(object):
+    @classmethod
+    def setup_class(cls):
+        cls.app = RangeApp()
+        cls.server = GeventServer(cls.app)
+        cls.url = 'http://localhost:{0}/test.warc.gz'.format(cls.server.port)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def setup_method(self):
+        self.app.count = 0
+
+    def test_read_through(self, tmpdir):
+        cache = DiskRangeCache(str(tmpdir))
+        loader = RangeCachingLoader(BlockLoader(), cache)
+
+        for i in range(3):
+            assert loader.load(self.url, 100, 50).read() == DATA[100:150]
+
+        assert loader.load(self.url, 200, 50).read() == DATA[200:250]
+
+        assert self.app.count == 2
+
+        stats = cache.get_stats()
+        assert stats['hits'] == 2
+        assert stats['misses'] == 2
+        assert stats['bytes_saved'] == 100
+        assert stats['entries'] == 2
+        assert stats['size'] == 100
+
+        # existing entries found by new cache on same dir
+        cache = DiskRangeCache(str(tmpdir))
+        assert cache.get_stats()['entries'] == 2
+
+        loader = RangeCachingLoader(BlockLoader(), cache)
+        assert loader.load(self.url, 100, 50).read() == DATA[100:150]
+        assert self.app.count == 2
+
+    def test_not_cacheable(self, tmpdir):
+        cache = DiskRangeCache(str(tmpdir), max_entry_size=100)
+        loader = RangeCachingLoader(BlockLoader(), cache)
+
+        # unknown length
+        assert loader.load(self.url, 4000).read() == DATA[4000:]
+        assert loader.load(self.url, 4000).read() == DATA[4000:]
+
+        # too large
+        assert loader.load(self.url, 0, 101).read() == DATA[:101]
+        assert loader.load(self.url, 0, 101).read() == DATA[:101]
+
+        assert self.app.count == 4
+        assert cache.get_stats()['entries'] == 0
+
+    def test_wrong_size_not_cached(self, tmpdir):
+        cache = DiskRangeCache(str(tmpdir))
+
+        # truncated range
+        with pytest.raises(IOError):
+            cache.load(self.url, 0, 100, FixedLoader(DATA[:60]))
+
+        # range ignored, full data returned
+        with pytest.raises(IOError):
+            cache.load(self.url, 0, 100, FixedLoader(DATA))
+
+        stats = cache.get_stats()
+        assert stats['entries'] == 0
+        assert stats['size'] == 0
+
+        # no cached or temp files left
+        assert all(not files for _, _, files in os.walk(str(tmpdir)))
+
+        # filled once correct data is loaded
+        assert cache.load(self.url, 0, 100, FixedLoader(DATA[:100])).read() == DATA[:100]
+        assert cache.get_stats()['entries'] == 1
+
+    def test_evict(self, tmpdir):
+        cache = DiskRangeCache(str(tmpdir), max_size=100)
+        loader = RangeCachingLoader(BlockLoader(), cache)
+
+        loader.load(self.url, 0, 40).read()
+        loader.load(self.url, 100, 40).read()
+
+        # mark first as recently used
+        loader.load(self.url, 0, 40).read()
+
+        loader.load(self.url, 200, 40).read()
+
+        stats = cache.get_stats()
+        assert stats['evictions'] == 1
+        assert stats['entries'] == 2
+        assert stats['size'] == 80
+
+        assert not os.path.isfile(cache.get_path(cache.make_key(self.url, 100, 40)))
+
+        assert loader.load(self.url, 0, 40).read() == DATA[:40]
+        assert self.app.count == 3
+
+    def test_concurrent_single_fill(self, tmpdir):
+        cache = DiskRangeCache(str(tmpdir))
+        slow_loader = SlowLoader()
+
+        path = str(tmpdir.join('test.bin'))
+        with open(path, 'wb') as fh:
+            fh.write(DATA)
+
+        results = []
+
+        def load():
+            results.append(cache.load(path, 10, 100, slow_loader).read())
+
+        threads = [threading.Thread(target=load) for i in range(5)]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        assert results == [DATA[10:110]] * 5
+        assert slow_loader.count == 1
+        assert cache.get_stats()['hits'] == 4
+        assert cache.fill_locks == {}
+
+    def test_loader_profile(self, tmpdir):
+        config = {'dir': str(tmpdir.join('profile-cache'))}
+
+        loader = BlockLoader(range_cache=config)
+
+        assert loader.load(self.url, 10, 20).read() == DATA[10:30]
+        assert loader.load(self.url, 10, 20).read() == DATA[10:30]
+        assert self.app.count == 1
+
+        cache = DiskRangeCache.from_config(config)
+        assert cache.get_stats()['hits'] == 1
+
+        # local files not cached
+        local_loader, _ = loader._get_loader_for_url('file:///tmp/test')
+        assert not isinstance(local_loader, RangeCachingLoader)
+
+        # no cache by default
+        loader = BlockLoader()
+        assert loader.load(self.url, 10, 20).read() == DATA[10:30]
+        assert self.app.count == 2
+
+        # from loader config, if not set in loader profile
+        loader = BlockLoader(range_cache=config)
+        loader.profile_loader = lambda profile_name, scheme: {}
+        remote_loader, _ = loader._get_loader_for_url(self.url)
+        assert isinstance(remote_loader, RangeCachingLoader)
@@ -0,0 +1,189 @@
+from gevent import monkey; monkey.patch_all(thread=False)
+
+import threading
+import time
+
+from pywb.utils.geventserver import GeventServer
+from pywb.utils.loaders import BlockLoader
+from pywb.utils.readahead import ReadAheadBuffer, ReadAheadLoader
+
+
+DATA = bytes(bytearray(range(256))) * 16
+
+
+# ============================================================================
+class RangeApp(object):
+    """ Stand-in for remote storage, serving byte ranges of DATA
+    """
+    def __init__(self):
+        self.ranges = []
+
+    def __call__(self, env, start_response):
+        start, end = env['HTTP_RANGE'].split('=', 1)[1].split('-')
+        start = int(start)
+        end = int(end) + 1 if end else len(DATA)
+
+        self.ranges.append((start, end - start))
+
+        data = DATA[start:end]
+        start_response('206 Partial Content', [('Content-Length', str(len(data)))])
+        return [data]
+
+
+# ============================================================================
+class SlowLoader(object):
+    def __init__(self, loader):
+        self.loader = loader
+        self.count = 0
+
+    def load(self, url, offset, length):
+        self.count += 1
+        time.sleep(0.1)
+        return self.loader.load(url, offset, length)
+
+
+# ============================================================================
+class TestReadAhead(object):
+    @classmethod
+    def setup_class(cls):
+        cls.app = RangeApp()
+        cls.server = GeventServer(cls.app)
+        cls.url = 'http://localhost:{0}/test.warc.gz'.format(cls.server.port)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def setup_method(self):
+        self.app.ranges = []
+
+    def get_loader(self, **kwargs):
+        buff = ReadAheadBuffer(**kwargs)
+        return ReadAheadLoader(BlockLoader(), buff), buff
+
+    def test_adjacent_ranges(self):
+        loader, buff = self.get_loader(min_size=500)
+
+        assert loader.load(self.url, 0, 100).read() == DATA[0:100]
+        assert loader.load(self.url, 100, 200).read() == DATA[100:300]
+        assert loader.load(self.url, 310, 50).read() == DATA[310:360]
+
+        assert self.app.ranges == [(0, 600)]
+
+        stats = buff.get_stats()
+        assert stats['loads'] == 3
+        assert stats['requests'] == 1
+        assert stats['requests_saved'] == 2
+        assert stats['bytes_read'] == 600
+        assert stats['read_ahead_bytes'] == 500
+
+    def test_sequential_read_ahead_grows(self):
+        loader, buff = self.get_loader(min_size=100, max_size=400, max_gap=10)
+
+        for offset in range(0, 2000, 50):
+            assert loader.load(self.url, offset, 50).read() == DATA[offset:offset + 50]
+
+        sizes = [length for start, length in self.app.ranges]
+        assert sizes[:4] == [150, 250, 450, 450]
+        assert buff.get_stats()['requests'] == len(sizes)
+
+    def test_random_access(self):
+        loader, buff = self.get_loader(min_size=100, max_gap=10)
+
+        for offset in (3000, 0, 2000, 1000):
+            assert loader.load(self.url, offset, 50).read() == DATA[offset:offset + 50]
+
+        # no growth for non-sequential ranges
+        assert self.app.ranges == [(3000, 150), (0, 150), (2000, 150), (1000, 150)]
+
+        # served from existing blocks
+        assert loader.load(self.url, 2100, 50).read() == DATA[2100:2150]
+        assert loader.load(self.url, 3010, 20).read() == DATA[3010:3030]
+        assert len(self.app.ranges) == 4
+
+    def test_end_of_file(self):
+        loader, buff = self.get_loader(min_size=100)
+
+        assert loader.load(self.url, 4000, 50).read() == DATA[4000:4050]
+        assert self.app.ranges == [(4000, 150)]
+        assert buff.get_stats()['bytes_read'] == 96
+
+        # past end of block read, loaded directly
+        assert loader.load(self.url, 4090, 10).read() == DATA[4090:]
+        assert len(self.app.ranges) == 2
+
+    def test_not_bufferable(self):
+        loader, buff = self.get_loader(max_size=100)
+
+        assert loader.load(self.url, 0, 101).read() == DATA[:101]
+        assert loader.load(self.url, 0, 101).read() == DATA[:101]
+        assert loader.load(self.url, 4000).read() == DATA[4000:]
+
+        assert len(self.app.ranges) == 3
+        assert buff.get_stats()['loads'] == 0
+
+    def test_evict(self):
+        loader, buff = self.get_loader(min_size=100, max_gap=10, buffer_size=400)
+
+        for offset in (0, 1000, 2000):
+            loader.load(self.url, offset, 50).read()
+
+        stats = buff.get_stats()
+        assert stats['blocks'] == 2
+        assert stats['size'] == 300
+
+        loader.load(self.url, 0, 50).read()
+        assert len(self.app.ranges) == 4
+
+    def test_concurrent_coalesced(self, tmpdir):
+        buff = ReadAheadBuffer(min_size=1000)
+        slow_loader = SlowLoader(BlockLoader())
+
+        path = str(tmpdir.join('test.bin'))
+        with open(path, 'wb') as fh:
+            fh.write(DATA)
+
+        results = {}
+
+        def load(offset):
+            results[offset] = buff.load(path, offset, 100, slow_loader).read()
+
+        threads = [threading.Thread(target=load, args=(i * 100,)) for i in range(5)]
+
+        threads[0].start()
+        time.sleep(0.02)
+
+        for thread in threads[1:]:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        assert results == dict((i * 100, DATA[i * 100:i * 100 + 100]) for i in range(5))
+        assert slow_loader.count == 1
+        assert buff.get_stats()['requests_saved'] == 4
+
+    def test_loader_profile(self):
+        loader = BlockLoader(read_ahead={'min_size': 1000, 'buffer_size': 12345})
+
+        assert loader.load(self.url, 0, 100).read() == DATA[:100]
+        assert loader.load(self.url, 500, 100).read() == DATA[500:600]
+        assert self.app.ranges == [(0, 1100)]
+
+        assert ReadAheadBuffer.from_config({'min_size': 1000, 'buffer_size': 12345}).get_stats()['requests_saved'] == 1
+
+        # local files not buffered
+        local_loader, _ = loader._get_loader_for_url('file:///tmp/test')
+        assert not isinstance(local_loader, ReadAheadLoader)
+
+        # not buffered by default
+        loader = BlockLoader()
+        loader.load(self.url, 0, 100).read()
+        loader.load(self.url, 0, 100).read()
+        assert len(self.app.ranges) == 3
+
+        # from loader config, if not set in loader profile
+        loader = BlockLoader(read_ahead=True)
+        loader.profile_loader = lambda profile_name, scheme: {}
+        remote_loader, _ = loader._get_loader_for_url(self.url)
+        assert isinstance(remote_loader, ReadAheadLoader)
@@ -0,0 +1,140 @@
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from pywb.utils.singleflight import SingleFlight
+
+
+GEVENT_SCRIPT = """
+import gevent
+from gevent import monkey
+monkey.patch_all({patch_args})
+
+from pywb.utils.singleflight import SingleFlight
+
+flight = SingleFlight(wait_timeout=10)
+calls = []
+
+def func():
+    calls.append(1)
+    gevent.sleep(0.2)
+    return 'result'
+
+jobs = [gevent.spawn(flight.do, 'key', func) for i in range(5)]
+gevent.joinall(jobs, raise_error=True)
+
+assert [job.value for job in jobs] == [('result', False)] + [('result', True)] * 4
+assert len(calls) == 1
+assert flight.get_stats()['timeouts'] == 0
+print('ok')
+"""
+
+
+# ============================================================================
+def wait_for(cond, timeout=10.0):
+    end = time.time() + timeout
+    while not cond():
+        assert time.time() < end
+        time.sleep(0.01)
+
+
+def run_concurrent(flight, key, func, num):
+    results = [None] * num
+
+    def run(i):
+        try:
+            results[i] = flight.do(key, func)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(num)]
+    for thread in threads:
+        thread.start()
+
+    return threads, results
+
+
+# ============================================================================
+def test_single_flight_threads():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def func():
+        calls.append(1)
+        release.wait(10)
+        return ['result']
+
+    threads, results = run_concurrent(flight, 'key', func, 5)
+
+    wait_for(lambda: flight.get_stats()['followers'] == 4)
+    assert flight.get_stats()['in_flight'] == 1
+    release.set()
+
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for res, shared in results) == [False, True, True, True, True]
+    assert all(res is results[0][0] for res, shared in results)
+
+    assert flight.get_stats() == {'leaders': 1, 'followers': 4, 'timeouts': 0, 'in_flight': 0}
+
+    # not cached once done
+    assert flight.do('key', lambda: 'new') == ('new', False)
+
+
+def test_single_flight_different_keys():
+    flight = SingleFlight()
+
+    assert flight.do('a', lambda: 1) == (1, False)
+    assert flight.do('b', lambda: 2) == (2, False)
+    assert flight.get_stats()['leaders'] == 2
+
+
+def test_single_flight_exception_shared():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def func():
+        release.wait(10)
+        raise ValueError('failed')
+
+    threads, results = run_concurrent(flight, 'key', func, 3)
+
+    wait_for(lambda: flight.get_stats()['followers'] == 2)
+    release.set()
+
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(res, ValueError) for res in results)
+    assert flight.get_stats()['in_flight'] == 0
+
+
+def test_single_flight_wait_timeout():
+    flight = SingleFlight(wait_timeout=0.1)
+    release = threading.Event()
+
+    threads, results = run_concurrent(flight, 'key', lambda: release.wait(10) and 'leader', 1)
+    wait_for(lambda: flight.get_stats()['in_flight'] == 1)
+
+    # waited too long, called directly
+    assert flight.do('key', lambda: 'follower') == ('follower', False)
+
+    release.set()
+    threads[0].join()
+
+    assert results[0] == ('leader', False)
+    assert flight.get_stats()['timeouts'] == 1
+
+
+@pytest.mark.parametrize('patch_args', ['', 'thread=False'])
+def test_single_flight_gevent(patch_args):
+    # run in new process, as gevent patching can not be changed
+    out = subprocess.check_output([sys.executable, '-c', GEVENT_SCRIPT.format(patch_args=patch_args)],
+                                  timeout=60)
+    assert out.strip() == b'ok'
@@ -29,20 +29,24 @@ class BaseWarcServer(object):
         self.url_map.add(Rule('/', endpoint=list_routes))
 
     def add_route(self, path, handler, path_param_name='', default_value=''):
-        def direct_input_request(environ, mode='', path_param_value=default_value):
+        def make_params(environ, mode, path_param_value, input_req):
             params = self.get_query_dict(environ)
             params['mode'] = mode
             if path_param_value:
                 params[path_param_name] = path_param_value
-            params['_input_req'] = DirectWSGIInputRequest(environ)
+            params['_input_req'] = input_req
+            # params, as filled by the handler, available to in-process callers
+            environ['pywb.warcserver.params'] = params
+            return params
+
+        def direct_input_request(environ, mode='', path_param_value=default_value):
+            params = make_params(environ, mode, path_param_value,
+                                 DirectWSGIInputRequest(environ))
             return handler(params)
 
         def post_fullrequest(environ, mode='', path_param_value=default_value):
-            params = self.get_query_dict(environ)
-            params['mode'] = mode
-            if path_param_value:
-                params[path_param_name] = path_param_value
-            params['_input_req'] = POSTInputRequest(environ)
+            params = make_params(environ, mode, path_param_value,
+                                 POSTInputRequest(environ))
             return handler(params)
 
         self.url_map.add(Rule(path, endpoint=direct_input_request))
@@ -67,11 +71,22 @@ class BaseWarcServer(object):
             return {}
 
     def __call__(self, environ, start_response):
+        status, headers, res = self.dispatch(environ)
+        start_response(status, headers)
+        return res
+
+    def dispatch(self, environ):
+        """ Handle request, returning the status, headers list and
+        response iterator, without a WSGI start_response
+
+        :param dict environ: The WSGI environment
+        :return: (status, headers, response iterator)
+        """
         urls = self.url_map.bind_to_environ(environ)
         try:
             endpoint, args = urls.match()
         except HTTPException as e:
-            return e(environ, start_response)
+            return self._dispatch_wsgi(e, environ)
 
         try:
             result = endpoint(environ, **args)
@@ -79,7 +94,7 @@ class BaseWarcServer(object):
             out_headers, res, errs = result
 
             if not res:
-                return self.send_error(errs, start_response)
+                return self.send_error(errs)
 
             if isinstance(res, dict):
                 res = self.json_encode(res, out_headers)
@@ -89,32 +104,38 @@ class BaseWarcServer(object):
                     errs['last_exc'] = str(errs['last_exc'])
                 out_headers['ResErrors'] = json.dumps(errs)
 
-            start_response('200 OK', list(out_headers.items()))
-            return res
+            return '200 OK', list(out_headers.items()), res
 
         except AccessException as ae:
             out_headers = {}
             res = self.json_encode(ae.msg, out_headers)
-            start_response(ae.status(), list(out_headers.items()))
-            return res
+            return ae.status(), list(out_headers.items()), res
 
         except Exception as e:
             if self.debug:
                 traceback.print_exc()
             message = 'Internal Error: ' + str(e)
             status = 500
-            return self.send_error({}, start_response,
+            return self.send_error({},
                                    message=message,
                                    status=status)
 
+    def _dispatch_wsgi(self, app, environ):
+        result = []
+
+        def start_response(status, headers, exc_info=None):
+            result.extend([status, headers])
+
+        res = app(environ, start_response)
+        return result[0], result[1], res
+
     def json_encode(self, res, out_headers):
         res = json.dumps(res).encode('utf-8')
         out_headers['Content-Type'] = JSON_CT
         out_headers['Content-Length'] = str(len(res))
         return [res]
 
-    def send_error(self, errs, start_response,
-                   message='No Resource Found', status=404):
+    def send_error(self, errs, message='No Resource Found', status=404):
 
         last_exc = errs.pop('last_exc', None)
         if last_exc:
@@ -145,5 +166,4 @@ class BaseWarcServer(object):
             message = status
         else:
             message = str(status) + ' ' + message
-        start_response(message, list(out_headers.items()))
-        return res
+        return message, list(out_headers.items()), res
@@ -8,6 +8,8 @@ from pywb.warcserver.index.cdxobject import CDXException
 from pywb.warcserver.index.fuzzymatcher import FuzzyMatcher
 from pywb.warcserver.resource.responseloader import  WARCPathLoader, LiveWebLoader, VideoLoader
 
+import copy
+import itertools
 import six
 import logging
 import traceback
@@ -50,6 +52,7 @@ class IndexHandler(object):
         self.opts = opts or {}
         self.fuzzy = FuzzyMatcher(kwargs.get('rules_file'))
         self.access_checker = kwargs.get('access_checker')
+        self.digest_index = kwargs.get('digest_index')
 
     def get_supported_modes(self):
         return dict(modes=['list_sources', 'index'])
@@ -60,11 +63,9 @@ class IndexHandler(object):
             errs = dict(last_exc=BadRequestException('The "url" param is required'))
             return None, errs
 
-        input_req = params.get('_input_req')
-        if input_req:
-            params['alt_url'] = input_req.include_method_query(url)
+        self._init_query_params(params)
 
-        cdx_iter = self.fuzzy(self.index_source, params)
+        cdx_iter = self._query_index(params)
 
         acl_user = params['_input_req'].env.get("HTTP_X_PYWB_ACL_USER")
 
@@ -73,6 +74,17 @@ class IndexHandler(object):
 
         return cdx_iter
 
+    def _init_query_params(self, params):
+        input_req = params.get('_input_req')
+        if input_req:
+            params['alt_url'] = input_req.include_method_query(params['url'])
+
+        if self.digest_index:
+            params['_digest_index'] = self.digest_index
+
+    def _query_index(self, params):
+        return self.fuzzy(self.index_source, params)
+
     def __call__(self, params):
         mode = params.get('mode', 'index')
         if mode == 'list_sources':
@@ -130,19 +142,156 @@ class IndexHandler(object):
 
 #=============================================================================
 class ResourceHandler(IndexHandler):
-    def __init__(self, index_source, resource_loaders, **kwargs):
+    # max number of cdx lines shared with concurrent identical requests,
+    # if more are read, the lookup is not shared
+    MAX_SHARED_CDX = 100
+
+    # params used only when loading the resource, not by the lookup
+    LOAD_PARAMS = ('range_start', 'payload_location')
+
+    def __init__(self, index_source, resource_loaders, index_flight=None,
+                 resolution_cache=None, **kwargs):
         super(ResourceHandler, self).__init__(index_source, **kwargs)
         self.resource_loaders = resource_loaders
+        self.index_flight = index_flight
+        self.resolution_cache = resolution_cache
 
     def get_supported_modes(self):
         res = super(ResourceHandler, self).get_supported_modes()
         res['modes'].append('resource')
         return res
 
+    def _get_lookup_key(self, params):
+        lookup = tuple(sorted((name, value) for name, value in six.iteritems(params)
+                              if isinstance(value, six.string_types) and
+                              not name.startswith('_') and
+                              name not in self.LOAD_PARAMS))
+
+        return (id(self), lookup)
+
+    def _get_query_params(self, params):
+        """ Params set by the lookup, also used when loading
+        """
+        return dict((name, value) for name, value in six.iteritems(params)
+                    if name.startswith('param.') or name == '_timeout')
+
+    def _query_index(self, params):
+        """ For resource requests, use the cdx lines shared by a concurrent
+        identical request, if any, or start with the capture resolved by
+        a recent identical lookup, if a resolution_cache is set, falling back
+        to a new lookup if it fails to load
+        """
+        if params.get('mode', 'resource') != 'resource':
+            return super(ResourceHandler, self)._query_index(params)
+
+        shared_cdx = params.pop('_shared_cdx', None)
+        if shared_cdx is not None:
+            return iter(shared_cdx), {}
+
+        key = params['_lookup_key'] = self._get_lookup_key(params)
+
+        res = self.resolution_cache.get(key) if self.resolution_cache else None
+        if res:
+            cdx, query_params = res
+
+            # params set by the lookup, used when loading
+            for name, value in six.iteritems(query_params):
+                params.setdefault(name, value)
+
+            cdx_iter, errs = itertools.chain([cdx], self._iter_query(params)), {}
+        else:
+            cdx_iter, errs = super(ResourceHandler, self)._query_index(params)
+
+        shared_lookup = params.get('_shared_lookup')
+        if shared_lookup:
+            cdx_iter = shared_lookup.record(cdx_iter)
+
+        return cdx_iter, errs
+
+    def _iter_query(self, params):
+        cdx_iter, errs = super(ResourceHandler, self)._query_index(params)
+        for cdx in cdx_iter:
+            yield cdx
+
+    def _cache_resolution(self, cdx, params):
+        """ Cache the capture loaded for the lookup, also as resolved
+        for its exact timestamp, as requested after a redirect to it
+        """
+        key = params.get('_lookup_key')
+        if not key or cdx.get('is_live') or cdx.get('_cached_result'):
+            return
+
+        cdx.pop('access', None)
+
+        lookup = dict(key[1])
+        closest = lookup.get('closest')
+
+        # latest capture may change, eg. when recording
+        keys = [key] if closest and closest != 'now' else []
+
+        timestamp = cdx.get('timestamp')
+        if timestamp and timestamp != closest and not cdx.get('is_fuzzy'):
+            lookup['closest'] = timestamp
+            keys.append((key[0], tuple(sorted(lookup.items()))))
+
+        if not keys:
+            return
+
+        self.resolution_cache.put(keys, cdx, self._get_query_params(params))
+
     def __call__(self, params):
         if params.get('mode', 'resource') != 'resource':
             return super(ResourceHandler, self).__call__(params)
 
+        if not self.index_flight or not params.get('url'):
+            return self._load_resource(params)
+
+        return self._coalesce_load(params)
+
+    def _coalesce_load(self, params):
+        """ Coalesce concurrent identical resource requests: the first
+        request runs the lookup and loads the resource, the others wait
+        for it and then load from copies of the cdx lines it read
+        """
+        self._init_query_params(params)
+        key = self._get_lookup_key(params)
+
+        shared_lookup = SharedLookup(self.MAX_SHARED_CDX)
+
+        res, shared = self.index_flight.do(key, lambda: self._load_shared(params, shared_lookup))
+
+        result, shared_lookup = res
+        if not shared:
+            if isinstance(result, Exception):
+                raise result
+
+            return result
+
+        if not shared_lookup.shareable:
+            return self._load_resource(params)
+
+        for name, value in six.iteritems(shared_lookup.query_params):
+            params.setdefault(name, value)
+
+        params['_shared_cdx'] = [copy.copy(cdx) for cdx in shared_lookup.cdx_list]
+        return self._load_resource(params)
+
+    def _load_shared(self, params, shared_lookup):
+        """ Load the resource, recording the cdx lines read in shared_lookup,
+        return (result or exception, shared_lookup)
+        """
+        params['_shared_lookup'] = shared_lookup
+        try:
+            result = self._load_resource(params)
+        except Exception as e:
+            result = e
+        finally:
+            params.pop('_shared_lookup', None)
+
+        shared_lookup.query_params = self._get_query_params(params)
+        return result, shared_lookup
+
+    def _load_resource(self, params):
         cdx_iter, errs = self._load_index_source(params)
         if not cdx_iter:
             return None, None, errs
@@ -155,10 +304,16 @@ class ResourceHandler(IndexHandler):
                                            'access_status': cdx.get('access_status', 451)},
                                       url=cdx['url'])
 
+            # as resolved, before any changes when loading
+            resolved = copy.copy(cdx) if self.resolution_cache else None
+
             for loader in self.resource_loaders:
                 try:
                     out_headers, resp = loader(cdx, params)
                     if resp is not None:
+                        if resolved is not None:
+                            self._cache_resolution(resolved, params)
+
                         return out_headers, resp, errs
                 except (WbException, ArchiveLoadFailed) as e:
                     last_exc = e
@@ -172,11 +327,49 @@ class ResourceHandler(IndexHandler):
         return None, None, errs
 
 
+#=============================================================================
+class SharedLookup(object):
+    """ Copies of the cdx lines of a lookup, as read by the request
+    loading them, before any changes when loading, to be shared
+    with concurrent identical requests.
+
+    Not shareable if more than max_size lines are read, a line
+    has an already loaded result, or the lookup fails part way
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.cdx_list = []
+        self.shareable = True
+        self.query_params = None
+
+    def record(self, cdx_iter):
+        try:
+            for cdx in cdx_iter:
+                if self.shareable:
+                    if cdx.get('_cached_result') or len(self.cdx_list) >= self.max_size:
+                        self.shareable = False
+                        self.cdx_list = []
+                    else:
+                        self.cdx_list.append(copy.copy(cdx))
+
+                yield cdx
+
+        except Exception:
+            self.shareable = False
+            raise
+
+
 #=============================================================================
 class DefaultResourceHandler(ResourceHandler):
     def __init__(self, index_source, warc_paths='', forward_proxy_prefix='',
                  **kwargs):
-        loaders = [WARCPathLoader(warc_paths, index_source),
+        loaders = [WARCPathLoader(warc_paths, index_source,
+                                  digest_index=kwargs.get('digest_index'),
+                                  file_pool=kwargs.get('file_pool'),
+                                  record_cache=kwargs.get('record_cache'),
+                                  block_loader=kwargs.get('block_loader'),
+                                  path_cache=kwargs.get('path_cache'),
+                                  record_flight=kwargs.get('record_flight')),
                    LiveWebLoader(forward_proxy_prefix),
                    VideoLoader()
                   ]
@@ -4,6 +4,8 @@ from pywb.warcserver.index.cdxobject import OFFSET, LENGTH, FILENAME
 
 from pywb.warcserver.index.query import CDXQuery
 
+from pywb.utils.format import ParamFormatter
+
 from warcio.timeutils import timestamp_to_sec, pad_timestamp
 from warcio.timeutils import PAD_14_DOWN, PAD_14_UP
 
@@ -63,7 +65,9 @@ def cdx_to_json(cdx_iter, fields):
 #=================================================================
 def process_cdx(cdx_iter, query):
     if query.resolve_revisits:
-        cdx_iter = cdx_resolve_revisits(cdx_iter)
+        cdx_iter = cdx_resolve_revisits(cdx_iter,
+                                        query.params.get('_digest_index'),
+                                        ParamFormatter(query.params))
 
     filters = query.filters
     if filters:
@@ -313,7 +317,7 @@ def cdx_sort_closest(closest, cdx_iter, limit=10):
 ORIG_TUPLE = [LENGTH, OFFSET, FILENAME]
 
 
-def cdx_resolve_revisits(cdx_iter):
+def cdx_resolve_revisits(cdx_iter, digest_index=None, formatter=None):
     """
     resolve revisits.
 
@@ -321,10 +325,22 @@ def cdx_resolve_revisits(cdx_iter):
     and ``orig.filename``. for revisit records, these fields have corresponding
     field values in previous non-revisit (original) CDX record.
     They are all ``"-"`` for non-revisit records.
+
+    if a digest index with any index files is provided, originals not
+    already seen in this query are also looked up in the digest index.
+
+    revisits already resolved at index time are passed through unchanged.
     """
+    if digest_index and not digest_index.has_files(formatter):
+        digest_index = None
+
     originals = {}
 
     for cdx in cdx_iter:
+        if cdx.get('orig.filename', '-') != '-':
+            yield cdx
+            continue
+
         is_revisit = cdx.is_revisit()
 
         digest = cdx.get(DIGEST)
@@ -338,6 +354,9 @@ def cdx_resolve_revisits(cdx_iter):
             if not original_cdx and not is_revisit:
                 originals[digest] = cdx
 
+            if not original_cdx and is_revisit and digest_index:
+                original_cdx = next(digest_index.lookup(digest, formatter), None)
+
         if original_cdx and is_revisit:
             fill_orig = lambda field: original_cdx.get(field, '-')
             # Transfer mimetype and statuscode
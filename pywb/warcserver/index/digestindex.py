@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+
+import six
+from warcio.utils import to_native_str
+
+from pywb.utils.binsearch import iter_exact
+from pywb.utils.loaders import from_file_url
+from pywb.warcserver.index.cdxobject import CDXObject
+
+
+# ============================================================================
+class DigestIndex(object):
+    """ Sidecar index mapping a payload digest to the location of a
+    non-revisit record with that payload, used to resolve revisits
+    without a full cdx query against the original url.
+
+    Each line of a digest index file is tab-delimited,
+    and the file is sorted by digest::
+
+      <digest>\t<filename>\t<offset>\t<length>\t<mime>\t<status>
+
+    Each path may be a digest index file or a directory, in which case
+    all files ending in .digest in that directory are searched.
+    Paths may also contain templates, eg. {coll}, formatted with the
+    formatter of the current cdx
+
+    Whether any digest index files exist for a set of paths is cached,
+    and checked at most every check_interval seconds
+    """
+    DIGEST_EXT = '.digest'
+
+    CHECK_INTERVAL = 10.0
+
+    FIELDS = ('digest', 'filename', 'offset', 'length', 'mime', 'status')
+
+    def __init__(self, paths, check_interval=None):
+        if isinstance(paths, six.string_types):
+            paths = [paths]
+
+        self.paths = paths
+
+        if check_interval is None:
+            check_interval = self.CHECK_INTERVAL
+
+        self.check_interval = check_interval
+
+        self.has_files_cache = {}
+        self.lock = threading.Lock()
+
+    def get_paths(self, formatter=None):
+        paths = self.paths
+        if formatter:
+            paths = [formatter.format(path) for path in paths]
+
+        return [from_file_url(path) for path in paths]
+
+    def iter_files(self, formatter=None):
+        for path in self.get_paths(formatter):
+
+            if os.path.isdir(path):
+                for name in sorted(os.listdir(path)):
+                    if name.endswith(self.DIGEST_EXT):
+                        yield os.path.join(path, name)
+
+            elif os.path.isfile(path):
+                yield path
+
+    def has_files(self, formatter=None):
+        key = tuple(self.get_paths(formatter))
+        now = time.time()
+
+        with self.lock:
+            cached = self.has_files_cache.get(key)
+            if cached and now - cached[0] < self.check_interval:
+                return cached[1]
+
+        res = any(True for filename in self.iter_files(formatter))
+
+        with self.lock:
+            self.has_files_cache[key] = (now, res)
+
+        return res
+
+    def lookup(self, digest, formatter=None):
+        """ Yield a CDXObject with filename, offset, length, mime and status
+        of each indexed non-revisit record matching the digest
+        """
+        if not digest or digest == '-':
+            return
+
+        key = digest.encode('utf-8')
+
+        for filename in self.iter_files(formatter):
+            with open(filename, 'rb') as reader:
+                for line in iter_exact(reader, key, b'\t'):
+                    yield self.to_cdx(line)
+
+    def to_cdx(self, line):
+        cdx = CDXObject()
+        fields = line.rstrip().split(b'\t')
+        for name, value in zip(self.FIELDS, fields):
+            cdx[name] = to_native_str(value, 'utf-8')
+
+        return cdx
+
+    @classmethod
+    def to_line(cls, digest, filename, offset, length, mime='-', status='-'):
+        return '\t'.join([digest, filename, str(offset), str(length),
+                          mime or '-', status or '-']) + '\n'
+
+    def __repr__(self):
+        return 'DigestIndex({0})'.format(self.paths)
@@ -0,0 +1,76 @@
+import copy
+import threading
+import time
+
+from collections import OrderedDict
+
+
+#=============================================================================
+class ResolutionCache(object):
+    """ Size-bounded LRU cache of resolved captures: the cdx line
+    of the capture loaded for a resource lookup, keyed by the lookup params,
+    kept only for a few seconds.
+
+    A single page view makes several lookups for the same url and timestamp
+    (the redirect to the exact timestamp, the top frame and the framed content),
+    only the first of which needs to query the index
+    """
+    DEFAULT_MAX_SIZE = 10000
+
+    DEFAULT_TTL = 10
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size or self.DEFAULT_MAX_SIZE
+        self.ttl = ttl or self.DEFAULT_TTL
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """ Return (cdx, params) if key was resolved in the last ttl seconds,
+        cdx being a copy of the cached cdx line
+        """
+        now = time.time()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < now:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+        return copy.copy(entry[1]), entry[2]
+
+    def put(self, keys, cdx, params):
+        """ Cache the cdx line resolved for each of keys, along
+        with the params set by the lookup, needed to load it
+        """
+        entry = (time.time() + self.ttl, copy.copy(cdx), params)
+
+        with self.lock:
+            for key in keys:
+                self.entries[key] = entry
+                self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': float(self.hits) / total if total else 0.0,
+                    'entries': len(self.entries),
+                    'max_size': self.max_size,
+                    'ttl': self.ttl,
+                   }
@@ -0,0 +1,148 @@
+from pywb.utils.wbexception import NotFoundException
+from pywb.warcserver.index.aggregator import GeventTimeoutAggregator
+from pywb.warcserver.index.cdxobject import CDXObject
+from pywb.warcserver.index.indexsource import RemoteIndexSource
+from pywb.utils.format import res_template
+
+
+#=============================================================================
+class ShardIndexSource(RemoteIndexSource):
+    """ Index of a collection shard, owning the urlkeys from start (inclusive)
+    to end (exclusive), queried from the index api of the shard warcserver.
+
+    Results are streamed as returned by the shard. If load_from_shard is set,
+    resources are also loaded from the shard warcserver, otherwise from the
+    archive paths of the cdx, as returned by the shard.
+    """
+    def __init__(self, base_url, start=None, end=None, load_from_shard=True):
+        base_url = base_url.rstrip('/')
+        api_url = base_url + '/index?url={url}'
+        replay_url = base_url + '/resource?url={url}&closest={timestamp}'
+        super(ShardIndexSource, self).__init__(api_url, replay_url, 'filename')
+
+        self.base_url = base_url
+        self.start = start.encode('utf-8') if start else None
+        self.end = end.encode('utf-8') if end else None
+        self.load_from_shard = load_from_shard
+
+    def overlaps(self, key, end_key):
+        """ Return true if any urlkey in range [key, end_key) is owned by this shard
+        """
+        if self.start and end_key and end_key <= self.start:
+            return False
+
+        if self.end and key and key >= self.end:
+            return False
+
+        return True
+
+    def _get_api_url(self, params):
+        api_url = res_template(self.api_url, params)
+
+        match_type = params.get('matchType', 'exact')
+        api_url += '&matchType=' + match_type
+
+        # closest sorted results only if not merged, for exact lookups
+        if match_type == 'exact' and params.get('closest'):
+            api_url += '&closest=' + params['closest'] + '&sort=closest'
+            if self.closest_limit:
+                api_url += '&limit=' + str(self.closest_limit)
+
+        return api_url
+
+    def load_index(self, params):
+        api_url = self._get_api_url(params)
+        try:
+            r = self.sesh.get(api_url, timeout=params.get('_timeout'), stream=True)
+            r.raise_for_status()
+        except Exception as e:
+            self.logger.debug('FAILED: ' + str(e))
+            raise NotFoundException(api_url)
+
+        def do_load():
+            try:
+                for line in r.iter_lines():
+                    if not line:
+                        continue
+
+                    cdx = CDXObject(line)
+                    if self.load_from_shard:
+                        self._set_load_url(cdx, params)
+
+                    yield cdx
+            finally:
+                r.close()
+
+        return do_load()
+
+    def _set_load_url(self, cdx, params):
+        super(ShardIndexSource, self)._set_load_url(cdx, params)
+        cdx['offset'] = '0'
+        cdx.pop('length', '')
+        cdx.pop('load_url', '')
+
+        # shard returns the original payload for revisits
+        cdx['_revisit_resolved'] = '1'
+
+    def __repr__(self):
+        return '{0}({1}, {2}, {3})'.format(self.__class__.__name__,
+                                           self.base_url,
+                                           self.start,
+                                           self.end)
+
+    def __str__(self):
+        return 'shard'
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return False
+
+        return (self.base_url == other.base_url and
+                self.start == other.start and
+                self.end == other.end)
+
+
+#=============================================================================
+class ShardedIndexAggregator(GeventTimeoutAggregator):
+    """ Index of a collection sharded by urlkey range across several warcservers.
+    Queries are sent, in parallel, only to the shards owning part of the
+    query key range, eg. only to the owning shard for exact lookups,
+    and the results merged in key order.
+    """
+    def __init__(self, sources, coll='', **kwargs):
+        super(ShardedIndexAggregator, self).__init__(sources, **kwargs)
+        self.coll = coll
+
+    def _iter_sources(self, params):
+        key = params.get('key')
+        end_key = params.get('end_key')
+
+        sources = super(ShardedIndexAggregator, self)._iter_sources(params)
+        for name, source in sources:
+            if source.overlaps(key, end_key):
+                yield name, source
+
+    def _get_coll(self, name):
+        return self.coll or name
+
+    @classmethod
+    def init_from_config(cls, shards, coll='', load_from_shard=True, timeout=0):
+        """ Create from list of shard configs, each a dict with 'url' of the shard
+        collection on the shard warcserver and optional 'start' and 'end' keys,
+        and 'name', defaulting to 'shard-<n>'
+        """
+        if not isinstance(shards, list):
+            raise Exception('"shards" config must be a list')
+
+        sources = {}
+        for i, shard in enumerate(shards):
+            if not isinstance(shard, dict) or not shard.get('url'):
+                raise Exception('"shards" entry must be a dict with a "url"')
+
+            name = shard.get('name') or 'shard-{0}'.format(i)
+            sources[name] = ShardIndexSource(shard['url'],
+                                             start=shard.get('start'),
+                                             end=shard.get('end'),
+                                             load_from_shard=load_from_shard)
+
+        return cls(sources, coll=coll, timeout=timeout)
@@ -196,6 +196,7 @@ org,iana)/domains/root/db 20140126200928 http://www.iana.org/domains/root/db tex
 
 #=================================================================
 from pywb.warcserver.warcserver import init_index_agg
+from pywb.warcserver.index.digestindex import DigestIndex
 
 import os
 import sys
@@ -262,6 +263,46 @@ def test_cdxj_resolve_revisit_2():
     assert(dict(results[1]) == {"urlkey": "com,example)/?example=1", "timestamp": "20140103030341", "url": "http://example.com?example=1", "length": "553", "filename": "example.warc.gz", "mime": "warc/revisit", "offset": "1864", "orig.length": "-", "orig.offset": "-", "orig.filename": "-"})
 
 
+def test_cdxj_resolve_revisit_digest_index(tmpdir):
+    # Resolve Revisit -- url-agnostic original found only in digest index
+    digest_file = str(tmpdir.join('index.digest'))
+    with open(digest_file, 'wt') as fh:
+        fh.write(DigestIndex.to_line('B2LTWWPUOYAH7UIPQ7ZUPQ4VMBSVC36A', 'example-url-agnostic-orig.warc.gz', 353, 1001, 'text/html', '200'))
+
+    results = cdx_ops_test_data(url = 'http://example.com/', sources={'dir': test_cdx_dir}, from_ts='2013', to='2013', resolveRevisits=True, _digest_index=DigestIndex(digest_file))
+    assert(len(results) == 1)
+    assert(results[0]['orig.filename'] == 'example-url-agnostic-orig.warc.gz')
+    assert(results[0]['orig.offset'] == '353')
+    assert(results[0]['orig.length'] == '1001')
+
+    # no digest index files, same as in-memory resolution
+    results = cdx_ops_test_data(url = 'http://example.com/?example=1', sources={'example': get_test_dir() + 'cdxj/example.cdxj'}, resolveRevisits=True, _digest_index=DigestIndex(str(tmpdir.join('missing'))))
+    assert(len(results) == 2)
+    assert(results[1]['orig.offset'] == '333')
+
+
+def test_cdxj_resolve_revisit_digest_index_miss(tmpdir):
+    # Resolve Revisit -- digest not in digest index, original from same query used
+    digest_file = str(tmpdir.join('index.digest'))
+    with open(digest_file, 'wt') as fh:
+        fh.write(DigestIndex.to_line('A' * 32, 'someunknown.warc.gz', 100, 10))
+
+    digest_index = DigestIndex(str(tmpdir))
+
+    results = cdx_ops_test_data(url = 'http://example.com/?example=1', sources={'example': get_test_dir() + 'cdxj/example.cdxj'}, resolveRevisits=True, _digest_index=digest_index)
+    assert(len(results) == 2)
+    assert(results[1]['orig.filename'] == 'example.warc.gz')
+    assert(results[1]['orig.offset'] == '333')
+
+    # has_files result cached until check interval expires
+    os.remove(digest_file)
+    assert(digest_index.has_files())
+
+    digest_index.check_interval = 0
+    assert(not digest_index.has_files())
+
+
+
 
 if __name__ == "__main__":
     import doctest
@@ -0,0 +1,148 @@
+import os
+
+import webtest
+
+from warcio.recordloader import ArchiveLoadFailed
+
+from pywb.warcserver.index.cdxobject import CDXObject
+from pywb.warcserver.index.resolutioncache import ResolutionCache
+from pywb.warcserver.warcserver import WarcServer
+
+from pywb import get_test_dir
+
+
+URL = '/test/resource?url=http://example.com/?example=1&closest={0}'
+
+
+# ============================================================================
+class CountingSource(object):
+    def __init__(self, source):
+        self.source = source
+        self.count = 0
+
+    def __call__(self, params):
+        self.count += 1
+        return self.source(params)
+
+
+class FailingLoader(object):
+    def __init__(self, loader):
+        self.loader = loader
+        self.fail_offset = None
+
+    def __call__(self, cdx, params):
+        if cdx.get('offset') == self.fail_offset:
+            raise ArchiveLoadFailed('failed')
+
+        return self.loader(cdx, params)
+
+
+def init_app(**kwargs):
+    config = {'collections': {'test': {'index_paths': os.path.join(get_test_dir(), 'cdxj', 'example.cdxj'),
+                                       'archive_paths': os.path.join(get_test_dir(), 'warcs') + os.path.sep}},
+              'enable_auto_colls': False,
+             }
+    config.update(kwargs)
+
+    warcserver = WarcServer(config_file=None, custom_config=config)
+
+    handler = warcserver.fixed_routes['test']
+    handler.index_source = CountingSource(handler.index_source)
+
+    return warcserver, webtest.TestApp(warcserver), handler
+
+
+# ============================================================================
+def test_resolution_cache_lru_ttl():
+    cache = ResolutionCache(max_size=2, ttl=60)
+
+    cdx = CDXObject(b'com,example)/ 20140103030321 {"url": "http://example.com/"}')
+    cache.put(['a', 'b'], cdx, {})
+    cache.put(['c'], cdx, {'param.coll': 'test'})
+
+    # evicted
+    assert cache.get('a') is None
+
+    res, params = cache.get('c')
+    assert res == cdx
+    assert res is not cdx
+    assert params == {'param.coll': 'test'}
+
+    # copy returned
+    res['timestamp'] = '2015'
+    assert cache.get('b')[0]['timestamp'] == '20140103030321'
+
+    # expired
+    cache.ttl = -1
+    cache.put(['d'], cdx, {})
+    assert cache.get('d') is None
+
+    stats = cache.get_stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2
+    assert stats['entries'] == 2
+
+
+def test_warcserver_resolution_cache():
+    warcserver, app, handler = init_app()
+
+    resp = app.get(URL.format('20140102'))
+    assert ' 20140103030321 ' in resp.headers['Warcserver-Cdx']
+    assert handler.index_source.count == 1
+
+    # same lookup, and lookup for resolved exact timestamp
+    for closest in ('20140102', '20140103030321'):
+        res = app.get(URL.format(closest))
+        assert res.headers['Warcserver-Cdx'] == resp.headers['Warcserver-Cdx']
+        assert res.body == resp.body
+
+    # range request, same lookup
+    res = app.get(URL.format('20140103030321') + '&range_start=10')
+    assert res.headers['Warcserver-Cdx'] == resp.headers['Warcserver-Cdx']
+
+    assert handler.index_source.count == 1
+
+    # different capture
+    resp = app.get(URL.format('20140103030341'))
+    assert ' 20140103030341 ' in resp.headers['Warcserver-Cdx']
+    assert handler.index_source.count == 2
+
+    # latest capture not cached, only its exact timestamp
+    app.get(URL.format('now'))
+    app.get(URL.format('now'))
+    assert handler.index_source.count == 4
+
+    # index mode not cached
+    app.get('/test/index?url=http://example.com/?example=1')
+    app.get('/test/index?url=http://example.com/?example=1')
+    assert handler.index_source.count == 6
+
+    stats = app.get('/_stats').json['resolution_cache']
+    assert stats['hits'] == 3
+    assert stats['misses'] == 4
+
+
+def test_warcserver_resolution_cache_load_failed():
+    warcserver, app, handler = init_app()
+
+    loader = FailingLoader(handler.resource_loaders[0])
+    handler.resource_loaders[0] = loader
+
+    resp = app.get(URL.format('20140103030321'))
+    assert ' 20140103030321 ' in resp.headers['Warcserver-Cdx']
+
+    # cached capture no longer loads: new lookup, next closest capture
+    loader.fail_offset = '333'
+    resp = app.get(URL.format('20140103030321'))
+    assert ' 20140103030341 ' in resp.headers['Warcserver-Cdx']
+    assert handler.index_source.count == 2
+
+
+def test_warcserver_resolution_cache_disabled():
+    warcserver, app, handler = init_app(resolution_cache_size=0)
+
+    for i in range(2):
+        app.get(URL.format('20140103030321'))
+
+    assert handler.index_source.count == 2
+    assert app.get('/_stats').json['resolution_cache'] is None
@@ -0,0 +1,108 @@
+from io import BytesIO
+
+from requests.structures import CaseInsensitiveDict
+from six.moves.urllib.parse import quote, urlsplit
+
+from pywb.utils.io import IterReader
+from pywb.warcserver.index.cdxobject import CDXObject
+
+
+# ============================================================================
+class InProcessResponse(object):
+    """ Response from a warcserver called in-process, providing the subset of
+    the requests Response api used by the RewriterApp, and the cdx object
+    of the loaded resource, if any, so it need not be parsed from headers
+    """
+    def __init__(self, status, headers, res, cdx=None):
+        status_code, _, reason = status.partition(' ')
+        self.status_code = int(status_code)
+        self.reason = reason
+        self.headers = CaseInsensitiveDict(headers)
+        self.raw = IterReader(res)
+        self.cdx = self._copy_cdx(cdx) if cdx is not None else None
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            try:
+                self._content = self.raw.read()
+            finally:
+                self.raw.close()
+
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def close(self):
+        self.raw.close()
+
+    @staticmethod
+    def _copy_cdx(cdx):
+        """ Copy cdx without internal fields, as if serialized and parsed
+        from the Warcserver-Cdx header
+        """
+        new_cdx = CDXObject()
+        for name, value in cdx.items():
+            if name.startswith('_'):
+                continue
+
+            if name == 'url':
+                try:
+                    value.encode('ascii')
+                except UnicodeEncodeError:
+                    value = quote(value.encode('utf-8'), safe=':/')
+
+            new_cdx[name] = value
+
+        return new_cdx
+
+
+# ============================================================================
+class InProcessClient(object):
+    """ Calls a warcserver in the same process, without an HTTP request,
+    for requests to urls starting with the base url the warcserver is
+    otherwise served from
+    """
+    def __init__(self, app, base_url):
+        self.app = app
+        self.base_url = base_url
+
+    def handles(self, url):
+        return url.startswith(self.base_url)
+
+    def get(self, url, headers=None, **kwargs):
+        return self.request('GET', url, headers=headers)
+
+    def post(self, url, data, headers):
+        return self.request('POST', url, data=data, headers=headers)
+
+    def request(self, method, url, data=None, headers=None):
+        parts = urlsplit(url)
+
+        environ = {'REQUEST_METHOD': method,
+                   'SCRIPT_NAME': '',
+                   'PATH_INFO': parts.path,
+                   'QUERY_STRING': parts.query,
+                   'SERVER_NAME': parts.hostname,
+                   'SERVER_PORT': str(parts.port or 80),
+                   'SERVER_PROTOCOL': 'HTTP/1.1',
+                   'HTTP_HOST': parts.netloc,
+                   'wsgi.url_scheme': parts.scheme,
+                   'wsgi.input': BytesIO(data or b''),
+                  }
+
+        for name, value in (headers or {}).items():
+            name = name.upper().replace('-', '_')
+            if name not in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+                name = 'HTTP_' + name
+
+            environ[name] = value
+
+        status, out_headers, res = self.app.dispatch(environ)
+
+        params = environ.get('pywb.warcserver.params') or {}
+
+        return InProcessResponse(status, out_headers, res, params.get('_cdx'))
@@ -1,18 +1,30 @@
+import os
+
+from functools import partial
+from io import BytesIO
+
 from warcio.bufferedreaders import DecompressingBufferedReader
+from warcio.limitreader import LimitReader
 from warcio.recordloader import ArcWarcRecordLoader
 
-from pywb.utils.loaders import BlockLoader
-from pywb.utils.io import BUFF_SIZE
+from pywb.utils.loaders import BlockLoader, from_file_url
+from pywb.utils.gzipseek import GzipSeekIndexCache
+from pywb.utils.io import BUFF_SIZE, SeekingLimitReader, no_except_close
 
 
 #=================================================================
 class BlockArcWarcRecordLoader(ArcWarcRecordLoader):
-    def __init__(self, loader=None, cookie_maker=None, block_size=BUFF_SIZE, *args, **kwargs):
+    def __init__(self, loader=None, cookie_maker=None, block_size=BUFF_SIZE,
+                 file_pool=None, record_cache=None, seek_indexes=None,
+                 single_flight=None, *args, **kwargs):
         if not loader:
-            loader = BlockLoader(cookie_maker=cookie_maker)
+            loader = BlockLoader(cookie_maker=cookie_maker, file_pool=file_pool)
 
         self.loader = loader
         self.block_size = block_size
+        self.record_cache = record_cache
+        self.single_flight = single_flight
+        self.seek_indexes = seek_indexes or GzipSeekIndexCache()
         super(BlockArcWarcRecordLoader, self).__init__(*args, **kwargs)
 
     def load(self, url, offset, length, no_record_parse=False):
@@ -24,7 +36,14 @@ class BlockArcWarcRecordLoader(ArcWarcRecordLoader):
         except:
             length = -1
 
-        stream = self.loader.load(url, int(offset), length)
+        offset = int(offset)
+
+        is_cached = self.record_cache and self.record_cache.is_cacheable(length)
+        if is_cached:
+            stream = self.load_cached(url, offset, length)
+        else:
+            stream = self._load_stream(url, offset, length)
+
         decomp_type = 'gzip'
 
         # Create decompressing stream
@@ -32,4 +51,85 @@ class BlockArcWarcRecordLoader(ArcWarcRecordLoader):
                                              decomp_type=decomp_type,
                                              block_size=self.block_size)
 
-        return self.parse_record_stream(stream, no_record_parse=no_record_parse)
+        record = self.parse_record_stream(stream, no_record_parse=no_record_parse)
+
+        # stored uncompressed (or read via seek index): allow skipping
+        # into the payload by loading from the new offset directly
+        if (not is_cached and not stream.decompressor and
+            isinstance(record.raw_stream, LimitReader)):
+            pos = offset + stream.num_read - stream.rem_length()
+            record.raw_stream = SeekingLimitReader.from_reader(record.raw_stream, pos,
+                                                               partial(self._load_stream, url),
+                                                               self._get_local_path(url))
+
+        return record
+
+    def load_cached(self, url, offset, length):
+        """ Load raw record bytes from the record cache, or read
+        and add them to the cache if not yet cached. Concurrent loads
+        of the same uncached record share a single read, if single_flight is set
+        """
+        key = (url, offset, length)
+        data = self.record_cache.get(key)
+        if data is not None:
+            return BytesIO(data)
+
+        data, remaining = self._read_shared(url, offset, length)
+
+        # don't cache partial reads
+        if not remaining:
+            self.record_cache.put(key, data)
+
+        return BytesIO(data)
+
+    def _read_shared(self, url, offset, length):
+        """ Read raw record bytes as _read_all(), sharing a single read
+        among concurrent loads of the same record, if single_flight is set
+        """
+        if not self.single_flight:
+            return self._read_all(url, offset, length)
+
+        res, _ = self.single_flight.do((url, offset, length),
+                                       lambda: self._read_all(url, offset, length))
+        return res
+
+    def _read_all(self, url, offset, length):
+        """ Read up to length raw record bytes, return the data
+        and the number of bytes not read
+        """
+        stream = self._load_stream(url, offset, length)
+        try:
+            buffs = []
+            remaining = length
+            while remaining > 0:
+                buff = stream.read(remaining)
+                if not buff:
+                    break
+
+                buffs.append(buff)
+                remaining -= len(buff)
+        finally:
+            no_except_close(stream)
+
+        return b''.join(buffs), remaining
+
+    def _load_stream(self, url, offset, length):
+        """ Load raw record bytes. For a single gzip member file with
+        a seek index, offset and length are uncompressed, and the record is
+        decompressed starting from the nearest seek point
+        """
+        seek_index = self.seek_indexes.find(url)
+        if seek_index:
+            return seek_index.open(self.loader, url, offset, length)
+
+        return self.loader.load(url, offset, length)
+
+    def _get_local_path(self, url):
+        """ Return path of url if a local file stored as is
+        (not read via seek index), otherwise None
+        """
+        path = from_file_url(url)
+        if '://' in path or self.seek_indexes.find(url):
+            return None
+
+        return os.path.abspath(path)
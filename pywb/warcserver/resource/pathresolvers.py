@@ -1,7 +1,6 @@
 import redis
 
 from warcio.utils import to_native_str
-from pywb.utils.binsearch import iter_exact
 
 from pywb.warcserver.index.indexsource import RedisIndexSource
 
@@ -11,6 +10,10 @@ import six
 import os
 import logging
 import glob
+import threading
+import time
+
+from collections import OrderedDict
 
 """
 The purpose of this module is to 'resolve' a warc/arc filename,
@@ -32,10 +35,7 @@ class PrefixResolver(object):
         self.template = template
 
     def __call__(self, filename, cdx):
-        full_path = self.template
-
-        if hasattr(cdx, '_formatter') and cdx._formatter:
-            full_path = cdx._formatter.format(full_path)
+        full_path = self.get_full_path(cdx)
 
         #path = os.path.join(full_path, filename)
         path = full_path + filename
@@ -56,6 +56,17 @@ class PrefixResolver(object):
         else:
             return path
 
+    def get_full_path(self, cdx):
+        full_path = self.template
+
+        if hasattr(cdx, '_formatter') and cdx._formatter:
+            full_path = cdx._formatter.format(full_path)
+
+        return full_path
+
+    def get_cache_key(self, cdx):
+        return (self.get_full_path(cdx), cdx.get('source-coll'))
+
     def resolve_coll(self, path, source):
         if not source:
             return
@@ -72,14 +83,28 @@ class PrefixResolver(object):
 
 #=============================================================================
 class RedisResolver(RedisIndexSource):
+    """ Resolve filename by lookup in a redis hash, or hashes if the key
+    contains a wildcard. Found paths are kept in memory for cache_ttl seconds
+    """
+    CACHE_TTL = 30.0
+
+    CACHE_MAX_SIZE = 10000
+
+    def __init__(self, *args, **kwargs):
+        super(RedisResolver, self).__init__(*args, **kwargs)
+        self.cache_ttl = kwargs.get('cache_ttl', self.CACHE_TTL)
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
     def __call__(self, filename, cdx):
-        redis_key = self.redis_key_template
+        redis_key = self.get_cache_key(cdx)
         params = {}
         if hasattr(cdx, '_formatter') and cdx._formatter:
-            redis_key = cdx._formatter.format(redis_key)
             params = cdx._formatter.params
 
-        res = None
+        res = self._get_cached(redis_key, filename)
+        if res:
+            return res
 
         if '*' in redis_key:
             for key in self.scan_keys(redis_key, params):
@@ -91,30 +116,193 @@ class RedisResolver(RedisIndexSource):
 
         res = to_native_str(res, 'utf-8')
 
+        # not-found not cached, may be added at any time
+        if res:
+            self._set_cached(redis_key, filename, res)
+
         return res
 
+    def get_cache_key(self, cdx):
+        if hasattr(cdx, '_formatter') and cdx._formatter:
+            return cdx._formatter.format(self.redis_key_template)
+
+        return self.redis_key_template
+
+    def _get_cached(self, redis_key, filename):
+        if not self.cache_ttl:
+            return None
+
+        with self.lock:
+            entry = self.cache.get((redis_key, filename))
+            if not entry:
+                return None
+
+            expires, res = entry
+            if expires < time.time():
+                del self.cache[(redis_key, filename)]
+                return None
+
+            return res
+
+    def _set_cached(self, redis_key, filename, res):
+        if not self.cache_ttl:
+            return
+
+        with self.lock:
+            self.cache[(redis_key, filename)] = (time.time() + self.cache_ttl, res)
+            while len(self.cache) > self.CACHE_MAX_SIZE:
+                self.cache.popitem(last=False)
+
+    def invalidate(self, filename):
+        """ Remove cached paths for filename, eg. if failed to load
+        """
+        with self.lock:
+            for key in [key for key in self.cache if key[1] == filename]:
+                del self.cache[key]
+
     def __repr__(self):
         return "RedisResolver('{0}')".format(self.redis_url)
 
 
 #=================================================================
 class PathIndexResolver(object):
-    def __init__(self, pathindex_file):
+    """ Resolve filename by lookup in a path index file, a sorted list of
+    filename<tab>path[<tab>path...] lines. The path index is kept in memory,
+    and reloaded if modified, checked at most every check_interval seconds
+    """
+    CHECK_INTERVAL = 2.0
+
+    def __init__(self, pathindex_file, check_interval=None):
         self.pathindex_file = pathindex_file
+        if check_interval is None:
+            check_interval = self.CHECK_INTERVAL
+
+        self.check_interval = check_interval
+
+        self.paths = None
+        self.mtime = None
+        self.last_check = 0
+        self.lock = threading.Lock()
 
     def __call__(self, filename, cdx):
+        return self.load_paths().get(filename, [])
+
+    def load_paths(self):
+        with self.lock:
+            now = time.time()
+            if self.paths is not None and now - self.last_check < self.check_interval:
+                return self.paths
+
+            mtime = os.path.getmtime(self.pathindex_file)
+            if self.paths is None or mtime != self.mtime:
+                self.paths = self.read_paths()
+                self.mtime = mtime
+
+            self.last_check = now
+            return self.paths
+
+    def read_paths(self):
+        paths = {}
         with open(self.pathindex_file, 'rb') as reader:
-            result = iter_exact(reader, filename.encode('utf-8'), b'\t')
+            for line in reader:
+                parts = to_native_str(line.rstrip(b'\r\n'), 'utf-8').split('\t')
+                if len(parts) < 2:
+                    continue
+
+                paths.setdefault(parts[0], []).extend(parts[1:])
 
-            for pathline in result:
-                paths = pathline.split(b'\t')[1:]
-                for path in paths:
-                    yield to_native_str(path, 'utf-8')
+        return paths
 
     def __repr__(self):  # pragma: no cover
         return "PathIndexResolver('{0}')".format(self.pathindex_file)
 
 
+#=================================================================
+class PathResolutionCache(object):
+    """ Cache of WARC path resolution across requests, keyed by filename
+    and the list of possible paths for it.
+
+    The path which last loaded a record is tried first, and filenames
+    which could not be loaded from any path, as not found, are skipped
+    for failed_ttl seconds
+    """
+    DEFAULT_MAX_SIZE = 10000
+
+    DEFAULT_FAILED_TTL = 10.0
+
+    def __init__(self, max_size=None, failed_ttl=None):
+        self.max_size = max_size or self.DEFAULT_MAX_SIZE
+        if failed_ttl is None:
+            failed_ttl = self.DEFAULT_FAILED_TTL
+
+        self.failed_ttl = failed_ttl
+
+        self.paths = OrderedDict()
+        self.failed = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.failed_hits = 0
+
+    def get_path(self, key):
+        with self.lock:
+            path = self.paths.get(key)
+            if path is None:
+                self.misses += 1
+                return None
+
+            self.paths.move_to_end(key)
+            self.hits += 1
+            return path
+
+    def set_path(self, key, path):
+        with self.lock:
+            self.failed.pop(key, None)
+            self.paths[key] = path
+            self.paths.move_to_end(key)
+            self._evict(self.paths)
+
+    def is_failed(self, key):
+        with self.lock:
+            expires = self.failed.get(key)
+            if expires is None:
+                return False
+
+            if expires < time.time():
+                del self.failed[key]
+                return False
+
+            self.failed_hits += 1
+            return True
+
+    def set_failed(self, key):
+        if not self.failed_ttl:
+            return
+
+        with self.lock:
+            self.paths.pop(key, None)
+            self.failed[key] = time.time() + self.failed_ttl
+            self.failed.move_to_end(key)
+            self._evict(self.failed)
+
+    def _evict(self, entries):
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+
+    def get_stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': float(self.hits) / total if total else 0.0,
+                    'failed_hits': self.failed_hits,
+                    'paths': len(self.paths),
+                    'failed': len(self.failed),
+                    'max_size': self.max_size,
+                   }
+
+
 #=================================================================
 class DefaultResolverMixin(object):
     @classmethod
@@ -0,0 +1,79 @@
+import threading
+
+from collections import OrderedDict
+
+
+#=============================================================================
+class RecordCache(object):
+    """ Size-bounded LRU in-memory cache of the raw bytes of records,
+    as stored in the archive file, keyed by (path, offset, length).
+
+    Only records whose length is known and at most max_record_size
+    are cached, so that large media never enters the cache
+    """
+    DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+    DEFAULT_MAX_RECORD_SIZE = 256 * 1024
+
+    def __init__(self, max_size=None, max_record_size=None):
+        self.max_size = max_size or self.DEFAULT_MAX_SIZE
+        self.max_record_size = max_record_size or self.DEFAULT_MAX_RECORD_SIZE
+
+        self.records = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    def is_cacheable(self, length):
+        return 0 < length <= self.max_record_size
+
+    def get(self, key):
+        with self.lock:
+            data = self.records.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+
+            self.records.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += len(data)
+            return data
+
+    def put(self, key, data):
+        if not self.is_cacheable(len(data)):
+            return
+
+        with self.lock:
+            if key in self.records:
+                return
+
+            self.records[key] = data
+            self.size += len(data)
+
+            while self.size > self.max_size:
+                _, evicted = self.records.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+            self.size = 0
+
+    def get_stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': float(self.hits) / total if total else 0.0,
+                    'bytes_saved': self.bytes_saved,
+                    'evictions': self.evictions,
+                    'records': len(self.records),
+                    'size': self.size,
+                    'max_size': self.max_size,
+                    'max_record_size': self.max_record_size,
+                   }
@@ -1,4 +1,8 @@
+import errno
 import six
+import sys
+
+from gevent.pool import Pool
 from warcio.recordloader import ArchiveLoadFailed
 from warcio.timeutils import iso_date_to_timestamp
 
@@ -13,10 +17,17 @@ class ResolvingLoader(object):
 
     EMPTY_DIGEST = '3I42H3S6NNFQ2MSVX7XZKYAYSCX5QBYJ'
 
-    def __init__(self, path_resolvers, record_loader=None, no_record_parse=False):
+    # max number of payload records loaded concurrently with headers records
+    DEFAULT_POOL_SIZE = 32
+
+    def __init__(self, path_resolvers, record_loader=None, no_record_parse=False,
+                 digest_index=None, path_cache=None, pool_size=None):
         self.path_resolvers = path_resolvers
         self.record_loader = record_loader if record_loader is not None else BlockArcWarcRecordLoader()
         self.no_record_parse = no_record_parse
+        self.digest_index = digest_index
+        self.path_cache = path_cache
+        self.pool = Pool(size=pool_size or self.DEFAULT_POOL_SIZE)
 
     def __call__(self, cdx, failed_files, cdx_loader, *args, **kwargs):
         headers_record, payload_record = self.load_headers_and_payload(cdx, failed_files, cdx_loader)
@@ -66,27 +77,62 @@ class ResolvingLoader(object):
         orig_f = cdx.get('orig.filename')
         has_orig = orig_f and orig_f != '-'
 
+        # revisit may already be resolved by remote loader, eg. a shard
+        is_revisit = (cdx.get('mime') == 'warc/revisit' and
+                      not cdx.get('_revisit_resolved'))
+        digest = cdx.get('digest', '-')
+
+        # a revisit may be a redirect, for which the payload is not loaded,
+        # known only once its headers record is loaded, unless the cdx has its status
+        may_redirect = is_revisit and not self._is_non_redirect_status(cdx)
+
+        # case 3 with headers record: identical url revisit,
+        # load headers and payload from orig.filename concurrently
+        if has_curr and has_orig and not may_redirect:
+            return self._load_concurrent(
+                lambda: self._resolve_path_load(cdx, False, failed_files),
+                lambda: self._resolve_path_load(cdx, True, failed_files))
+
         # load headers record from cdx['filename'] unless it is '-' (rare)
+        # if original may be found in digest index, look up and load concurrently
         headers_record = None
         payload_record = None
-        if has_curr:
+        digest_payload_record = None
+        use_digest_index = (is_revisit and has_curr and not has_orig and not may_redirect and
+                            self.digest_index and digest not in ('-', self.EMPTY_DIGEST))
+
+        if use_digest_index:
+            headers_record, digest_payload_record = self._load_concurrent(
+                lambda: self._resolve_path_load(cdx, False, failed_files),
+                lambda: self._load_digest_index_payload(cdx, digest, failed_files))
+
+        elif has_curr:
             headers_record = self._resolve_path_load(cdx, False, failed_files)
 
-        # two index lookups
-        # Case 1: if mimetype is still warc/revisit
-        if cdx.get('mime') == 'warc/revisit' and headers_record:
+        if is_revisit and headers_record:
             if headers_record.http_headers:
                 status = headers_record.http_headers.get_statuscode()
                 # optimization: if redirect, don't load payload record, as it'll be ignored by browser
                 # always replay zero-length payload
                 if status and status.startswith('3'):
+                    if digest_payload_record:
+                        no_except_close(digest_payload_record.raw_stream)
+
                     headers_record.http_headers.replace_header('Content-Length', '0')
                     return headers_record, headers_record
 
-            payload_record = self._load_different_url_payload(cdx,
-                                                              headers_record,
-                                                              failed_files,
-                                                              cdx_loader)
+        # two index lookups
+        # Case 1: if mimetype is still warc/revisit, and original not already
+        # resolved (eg. at index time)
+        if is_revisit and headers_record and not has_orig:
+            if digest_payload_record:
+                payload_record = digest_payload_record
+            else:
+                payload_record = self._load_different_url_payload(cdx,
+                                                                  headers_record,
+                                                                  failed_files,
+                                                                  cdx_loader,
+                                                                  not use_digest_index)
 
         # single lookup cases
         # case 2: non-revisit
@@ -99,6 +145,45 @@ class ResolvingLoader(object):
 
         return headers_record, payload_record
 
+    @staticmethod
+    def _is_non_redirect_status(cdx):
+        status = cdx.get('status', '-')
+        return status != '-' and not status.startswith('3')
+
+    def _load_concurrent(self, load_headers, load_payload):
+        """
+        Load the payload record in the pool, while loading the headers
+        record in the current greenlet, and return both records.
+
+        If either fails, the other load is cancelled, or its record closed,
+        and the error raised, headers error first, as if loaded in sequence
+        """
+        def run_load_payload():
+            try:
+                return load_payload(), None
+            except Exception:
+                return None, sys.exc_info()
+
+        payload_job = self.pool.spawn(run_load_payload)
+
+        try:
+            headers_record = load_headers()
+        except Exception:
+            # if killed before finishing, value is the GreenletExit
+            payload_job.kill(block=True)
+            if isinstance(payload_job.value, tuple) and payload_job.value[0]:
+                no_except_close(payload_job.value[0].raw_stream)
+            raise
+
+        payload_record, exc_info = payload_job.get()
+        if exc_info:
+            if headers_record:
+                no_except_close(headers_record.raw_stream)
+
+            six.reraise(*exc_info)
+
+        return headers_record, payload_record
+
     def _resolve_path_load(self, cdx, is_original, failed_files):
         """
         Load specific record based on filename, offset and length
@@ -124,34 +209,55 @@ class ResolvingLoader(object):
         if failed_files is not None and filename in failed_files:
             raise ArchiveLoadFailed('Skipping Already Failed: ' + filename)
 
-        any_found = False
+        possible_paths = self._iter_possible_paths(filename, cdx)
+
+        # optimization: across requests, skip recently failed files
+        # and try the path which last loaded this file first
+        cache_key = None
+        if self.path_cache:
+            cache_key = self._get_path_cache_key(filename, cdx)
+
+            if self.path_cache.is_failed(cache_key):
+                if failed_files is not None:
+                    failed_files.append(filename)
+
+                raise ArchiveLoadFailed('Skipping Recently Failed: ' + filename)
+
+            last_path = self.path_cache.get_path(cache_key)
+            if last_path:
+                possible_paths = self._iter_last_path_first(last_path, possible_paths)
+
         last_exc = None
         last_traceback = None
-        for resolver in self.path_resolvers:
-            possible_paths = resolver(filename, cdx)
-
-            if not possible_paths:
-                continue
+        for path in possible_paths:
+            try:
+                record = (self.record_loader.
+                          load(path, offset, length,
+                               no_record_parse=self.no_record_parse))
 
-            if isinstance(possible_paths, six.string_types):
-                possible_paths = [possible_paths]
+                if cache_key:
+                    self.path_cache.set_path(cache_key, path)
 
-            for path in possible_paths:
-                any_found = True
-                try:
-                    return (self.record_loader.
-                            load(path, offset, length,
-                                 no_record_parse=self.no_record_parse))
+                return record
 
-                except Exception as ue:
-                    last_exc = ue
-                    import sys
-                    last_traceback = sys.exc_info()[2]
+            except Exception as ue:
+                last_exc = ue
+                last_traceback = sys.exc_info()[2]
 
         # Unsuccessful if reached here
         if failed_files is not None:
             failed_files.append(filename)
 
+        # don't keep any in-memory paths which failed to load
+        for resolver in self.path_resolvers:
+            if hasattr(resolver, 'invalidate'):
+                resolver.invalidate(filename)
+
+        # only skip in later requests if not found, not if record invalid
+        # or a transient error
+        if cache_key and (not last_exc or self._is_not_found(last_exc)):
+            self.path_cache.set_failed(cache_key)
+
         if last_exc:
             # msg = str(last_exc.__class__.__name__)
             msg = str(last_exc)
@@ -161,13 +267,60 @@ class ResolvingLoader(object):
         # raise ArchiveLoadFailed(msg, filename), None, last_traceback
         six.reraise(ArchiveLoadFailed, ArchiveLoadFailed(filename + ': ' + msg), last_traceback)
 
+    def _iter_possible_paths(self, filename, cdx):
+        """
+        Yield possible paths for filename from each path resolver, in order
+        """
+        for resolver in self.path_resolvers:
+            possible_paths = resolver(filename, cdx)
+
+            if not possible_paths:
+                continue
+
+            if isinstance(possible_paths, six.string_types):
+                possible_paths = [possible_paths]
+
+            for path in possible_paths:
+                yield path
+
+    def _iter_last_path_first(self, last_path, possible_paths):
+        yield last_path
+
+        for path in possible_paths:
+            if path != last_path:
+                yield path
+
+    def _get_path_cache_key(self, filename, cdx):
+        """
+        Key for path cache, the filename and each path resolver,
+        or its own key for this cdx if it depends on the cdx
+        """
+        keys = []
+        for resolver in self.path_resolvers:
+            get_cache_key = getattr(resolver, 'get_cache_key', None)
+            keys.append(get_cache_key(cdx) if get_cache_key else resolver)
+
+        return (filename, tuple(keys))
+
+    @staticmethod
+    def _is_not_found(exc):
+        if isinstance(exc, (IOError, OSError)) and exc.errno == errno.ENOENT:
+            return True
+
+        response = getattr(exc, 'response', None)
+        return getattr(response, 'status_code', None) == 404
+
     def _load_different_url_payload(self, cdx, headers_record,
-                                    failed_files, cdx_loader):
+                                    failed_files, cdx_loader,
+                                    use_digest_index=True):
         """
         Handle the case where a duplicate of a capture with same digest
         exists at a different url.
 
-        If a cdx_server is provided, a query is made for matching
+        If a digest index is provided, and not already checked,
+        the original is first looked up by digest alone.
+
+        Otherwise, if a cdx_server is provided, a query is made for matching
         url, timestamp and digest.
 
         Raise exception if no matches found.
@@ -180,6 +333,11 @@ class ResolvingLoader(object):
         if digest == self.EMPTY_DIGEST:
             return headers_record
 
+        if use_digest_index:
+            payload_record = self._load_digest_index_payload(cdx, digest, failed_files)
+            if payload_record:
+                return payload_record
+
         ref_target_uri = (headers_record.rec_headers.
                           get_header('WARC-Refers-To-Target-URI'))
 
@@ -216,6 +374,29 @@ class ResolvingLoader(object):
 
         raise ArchiveLoadFailed(self.MISSING_REVISIT_MSG)
 
+    def _load_digest_index_payload(self, cdx, digest, failed_files):
+        """
+        Load payload record from first loadable original found
+        in the digest index, if any
+        """
+        if not self.digest_index:
+            return None
+
+        formatter = getattr(cdx, '_formatter', None)
+
+        for orig_cdx in self.digest_index.lookup(digest, formatter):
+            orig_cdx._formatter = formatter
+            for field in ('source', 'source-coll'):
+                if field in cdx:
+                    orig_cdx[field] = cdx[field]
+
+            try:
+                return self._resolve_path_load(orig_cdx, False, failed_files)
+            except ArchiveLoadFailed:
+                pass
+
+        return None
+
     def load_cdx_for_dupe(self, url, timestamp, digest, cdx_loader):
         """
         If a cdx_server is available, return response from server,
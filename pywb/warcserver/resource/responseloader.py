@@ -21,10 +21,12 @@ from warcio.utils import to_native_str
 
 from pywb.utils.canonicalize import canonicalize
 from pywb.utils.format import ParamFormatter
-from pywb.utils.io import StreamIter, call_release_conn, compress_gzip_iter, no_except_close
+from pywb.utils.io import (StreamIter, SeekingLimitReader, call_release_conn,
+                           compress_gzip_iter, no_except_close, skip_stream)
 from pywb.utils.memento import MementoUtils
 from pywb.utils.wbexception import LiveResourceException
 from pywb.warcserver.http import DefaultAdapters
+from pywb.warcserver.resource.blockrecordloader import BlockArcWarcRecordLoader
 from pywb.warcserver.resource.pathresolvers import DefaultResolverMixin
 from pywb.warcserver.resource.resolvingloader import ResolvingLoader
 
@@ -52,7 +54,15 @@ class BaseLoader(object):
             out_headers['Recorder-Skip'] = '1'
             cdx['recorder_skip'] = '1'
 
+        if params.get('_range_skipped'):
+            out_headers['Warcserver-Range-Skipped'] = str(params['_range_skipped'])
+
+        if params.get('_payload_location'):
+            out_headers['Warcserver-Payload-Location'] = params['_payload_location']
+
         out_headers['Warcserver-Cdx'] = to_native_str(cdx.to_cdxj().rstrip())
+        # for in-process callers, cdx as is
+        params['_cdx'] = cdx
         out_headers['Warcserver-Source-Coll'] = to_native_str(source)
 
         if not warc_headers:
@@ -166,13 +176,25 @@ class BaseLoader(object):
 
 #=============================================================================
 class WARCPathLoader(DefaultResolverMixin, BaseLoader):
-    def __init__(self, paths, cdx_source):
+    def __init__(self, paths, cdx_source, digest_index=None, file_pool=None,
+                 record_cache=None, block_loader=None, path_cache=None,
+                 record_flight=None):
         self.paths = paths
 
         self.resolvers = self.make_resolvers(self.paths)
 
+        record_loader = None
+        if file_pool or record_cache or block_loader:
+            record_loader = BlockArcWarcRecordLoader(loader=block_loader,
+                                                     file_pool=file_pool,
+                                                     record_cache=record_cache,
+                                                     single_flight=record_flight)
+
         self.resolve_loader = ResolvingLoader(self.resolvers,
-                                              no_record_parse=False)
+                                              record_loader=record_loader,
+                                              no_record_parse=False,
+                                              digest_index=digest_index,
+                                              path_cache=path_cache)
 
         self.headers_parser = StatusAndHeadersParser([], verify=False)
 
@@ -239,6 +261,12 @@ class WARCPathLoader(DefaultResolverMixin, BaseLoader):
                     new_cl = int(orig_cl) + (len(http_headers_buff) - orig_size)
                     payload.rec_headers.replace_header('Content-Length', str(new_cl))
 
+            if params.get('range_start'):
+                self._skip_to_range(params, http_headers, payload)
+
+            if params.get('payload_location'):
+                self._omit_local_payload(params, payload)
+
         warc_headers = payload.rec_headers
 
         if headers != payload:
@@ -257,6 +285,54 @@ class WARCPathLoader(DefaultResolverMixin, BaseLoader):
 
         return (warc_headers, http_headers_buff, payload.raw_stream)
 
+    def _skip_to_range(self, params, http_headers, payload):
+        """ Skip the payload to the start of the requested byte range,
+        seeking directly when the payload is stored uncompressed,
+        if the range can be served from the payload
+        """
+        if not http_headers or http_headers.get_statuscode() != '200':
+            return
+
+        try:
+            range_start = int(params['range_start'])
+            content_length = http_headers.get_header('Content-Length')
+            content_length = int(content_length.split(',')[0])
+            rec_length = int(payload.rec_headers.get_header('Content-Length'))
+        except (ValueError, TypeError, AttributeError):
+            return
+
+        if range_start <= 0 or range_start >= content_length:
+            return
+
+        skipped = skip_stream(payload.raw_stream, range_start)
+
+        payload.rec_headers.replace_header('Content-Length', str(rec_length - skipped))
+
+        params['_range_skipped'] = skipped
+
+    def _omit_local_payload(self, params, payload):
+        """ If the payload is stored as is in a local file, omit it
+        from the response, returning its location instead, as
+        '<offset> <length> <quoted path>', to be read directly
+        """
+        stream = payload.raw_stream
+        if not isinstance(stream, SeekingLimitReader) or not stream.file_path:
+            return
+
+        try:
+            rec_length = int(payload.rec_headers.get_header('Content-Length'))
+        except (ValueError, TypeError):
+            return
+
+        params['_payload_location'] = '{0} {1} {2}'.format(stream.offset,
+                                                           stream.limit,
+                                                           quote(stream.file_path))
+
+        payload.rec_headers.replace_header('Content-Length', str(rec_length - stream.limit))
+
+        no_except_close(stream)
+        payload.raw_stream = BytesIO()
+
     def __str__(self):
         return  'WARCPathLoader'
 
@@ -279,6 +279,20 @@ Exception: ArchiveLoadFailed
 >>> load_from_cdx_test(URL_AGNOSTIC_REVISIT_CDX, revisit_func=None)
 Exception: ArchiveLoadFailed
 
+# url-agnostic revisit resolved at index time, no revisit func needed
+>>> load_from_cdx_test(URL_AGNOSTIC_REVISIT_CDX + ' 1001 353 example-url-agnostic-orig.warc.gz', revisit_func=None)
+StatusAndHeaders(protocol = 'HTTP/1.0', statusline = '200 OK', headers = [ ('Accept-Ranges', 'bytes'),
+  ('Content-Type', 'text/html; charset=UTF-8'),
+  ('Date', 'Mon, 29 Jul 2013 19:51:51 GMT'),
+  ('ETag', '"780602-4f6-4db31b2978ec0"'),
+  ('Last-Modified', 'Thu, 25 Apr 2013 16:13:23 GMT'),
+  ('Server', 'ECS (sjc/4FCE)'),
+  ('X-Cache', 'HIT'),
+  ('Content-Length', '1270'),
+  ('Connection', 'close')])
+<!doctype html>
+<html>
+
 
 # url-agnostic original found, but could not be loaded
 >>> load_from_cdx_test(URL_AGNOSTIC_REVISIT_CDX, revisit_func=load_orig_bad_cdx)
@@ -289,16 +303,28 @@ Exception: ArchiveLoadFailed
 
 import os
 import sys
+import time
 import pprint
 import six
 
+import gevent
+import pytest
+
+from contextlib import closing
+from io import BytesIO
+
 from warcio.recordloader import ArcWarcRecordLoader, ArchiveLoadFailed
+from warcio.statusandheaders import StatusAndHeaders
+from warcio.warcwriter import WARCWriter
 
+from pywb.utils.io import SeekingLimitReader, skip_stream
+from pywb.utils.loaders import BlockLoader
 from pywb.warcserver.resource.blockrecordloader import BlockArcWarcRecordLoader
 from pywb.warcserver.resource.resolvingloader import ResolvingLoader
 from pywb.warcserver.resource.pathresolvers import DefaultResolverMixin
 
 from pywb.warcserver.index.cdxobject import CDXObject
+from pywb.warcserver.index.digestindex import DigestIndex
 
 from pywb import get_test_dir
 from mock import patch
@@ -393,7 +419,237 @@ def print_strs(strings):
 
 
 
+#==============================================================================
+def test_url_agnostic_revisit_digest_index(tmpdir):
+    digest_file = str(tmpdir.join('index.digest'))
+    with open(digest_file, 'wt') as fh:
+        fh.write(DigestIndex.to_line('A' * 32, 'someunknown.warc.gz', 100, 10))
+        fh.write(DigestIndex.to_line('B2LTWWPUOYAH7UIPQ7ZUPQ4VMBSVC36A', 'someunknown.warc.gz', 353, 1001))
+        fh.write(DigestIndex.to_line('B2LTWWPUOYAH7UIPQ7ZUPQ4VMBSVC36A', 'example-url-agnostic-orig.warc.gz', 353, 1001, 'text/html', '200'))
+
+    resolve_loader = ResolvingLoader(DefaultResolverMixin.make_resolvers(test_warc_dir),
+                                     digest_index=DigestIndex(str(tmpdir)))
+
+    cdx = CDXObject(URL_AGNOSTIC_REVISIT_CDX.encode('utf-8'))
+
+    # no cdx query needed, original found in digest index
+    headers, stream = resolve_loader(cdx, [], None)
+
+    assert headers.get_statuscode() == '200'
+    assert headers.get_header('Content-Type') == 'text/html; charset=UTF-8'
+    assert b'Example Domain' in stream.read()
+
+
+#==============================================================================
+# revisit status in cdx, not a redirect
+SAME_URL_REVISIT_CDX = 'com,example)/?example=1 20140103030341 http://example.com?example=1 \
+warc/revisit 200 B2LTWWPUOYAH7UIPQ7ZUPQ4VMBSVC36A - - \
+553 1864 example.warc.gz 1043 333 example.warc.gz'
+
+
+class SlowRecordLoader(BlockArcWarcRecordLoader):
+    def __init__(self, fail_offset=None, delays=None):
+        super(SlowRecordLoader, self).__init__()
+        self.fail_offset = fail_offset
+        self.delays = delays or {}
+        self.records = []
+        self.closed = []
+
+    def load(self, url, offset, length, *args, **kwargs):
+        gevent.sleep(self.delays.get(offset, 0.2))
+        if offset == self.fail_offset:
+            raise IOError('Load Failed: ' + offset)
+
+        record = super(SlowRecordLoader, self).load(url, offset, length, *args, **kwargs)
+        self.records.append(record)
+
+        raw_close = record.raw_stream.close
+        def close():
+            self.closed.append(record)
+            raw_close()
+
+        record.raw_stream.close = close
+        return record
+
+
+def test_revisit_concurrent_load():
+    record_loader = SlowRecordLoader()
+    resolve_loader = ResolvingLoader(DefaultResolverMixin.make_resolvers(test_warc_dir),
+                                     record_loader=record_loader)
+
+    cdx = CDXObject(SAME_URL_REVISIT_CDX.encode('utf-8'))
+
+    start = time.time()
+    headers, stream = resolve_loader(cdx, [], None)
+
+    # headers and payload loaded concurrently
+    assert time.time() - start < 0.35
+
+    assert headers.get_statuscode() == '200'
+    assert b'Example Domain' in stream.read()
+
+    assert [record.rec_type for record in record_loader.records] == ['revisit', 'response']
+
+
+def test_revisit_unknown_status_sequential_load():
+    record_loader = SlowRecordLoader()
+    resolve_loader = ResolvingLoader(DefaultResolverMixin.make_resolvers(test_warc_dir),
+                                     record_loader=record_loader)
+
+    # may be a redirect, headers loaded first
+    cdx = CDXObject(SAME_URL_REVISIT_CDX.replace(' 200 ', ' - ').encode('utf-8'))
+
+    start = time.time()
+    headers, stream = resolve_loader(cdx, [], None)
+    assert time.time() - start >= 0.4
+
+    assert headers.get_statuscode() == '200'
+    assert b'Example Domain' in stream.read()
+
+    assert [record.rec_type for record in record_loader.records] == ['revisit', 'response']
+
+
+def test_redirect_revisit_payload_not_loaded(tmpdir):
+    http_headers = StatusAndHeaders('302 Found', [('Location', 'http://example.com/other')],
+                                    protocol='HTTP/1.1')
+
+    with open(str(tmpdir.join('redirect.warc.gz')), 'wb') as fh:
+        writer = WARCWriter(fh, gzip=True)
+
+        orig = writer.create_warc_record('http://example.com/', 'response',
+                                         payload=BytesIO(b'redirect'),
+                                         http_headers=http_headers)
+        writer.write_record(orig)
+        orig_length = fh.tell()
+
+        digest = orig.rec_headers.get_header('WARC-Payload-Digest')
+        writer.write_record(writer.create_revisit_record('http://example.com/', digest,
+                                                         'http://example.com/', '2014-01-03T03:03:21Z',
+                                                         http_headers=http_headers))
+        revisit_length = fh.tell() - orig_length
+
+    cdx_line = 'com,example)/ 20140103030341 http://example.com/ warc/revisit - {0} - - {1} {2} redirect.warc.gz {3} 0 redirect.warc.gz'
+    cdx = CDXObject(cdx_line.format(digest[len('sha1:'):], revisit_length, orig_length, orig_length).encode('utf-8'))
+
+    record_loader = SlowRecordLoader()
+    resolve_loader = ResolvingLoader(DefaultResolverMixin.make_resolvers(str(tmpdir) + '/'),
+                                     record_loader=record_loader)
+
+    headers, stream = resolve_loader(cdx, [], None)
+
+    assert headers.get_statuscode() == '302'
+    assert headers.get_header('Content-Length') == '0'
+    assert stream.read() == b''
+
+    # original not loaded
+    assert [record.rec_type for record in record_loader.records] == ['revisit']
+
+
+def test_revisit_concurrent_load_digest_index(tmpdir):
+    digest_file = str(tmpdir.join('index.digest'))
+    with open(digest_file, 'wt') as fh:
+        fh.write(DigestIndex.to_line('B2LTWWPUOYAH7UIPQ7ZUPQ4VMBSVC36A', 'example-url-agnostic-orig.warc.gz', 353, 1001, 'text/html', '200'))
+
+    resolve_loader = ResolvingLoader(DefaultResolverMixin.make_resolvers(test_warc_dir),
+                                     record_loader=SlowRecordLoader(),
+                                     digest_index=DigestIndex(str(tmpdir)))
+
+    # revisit status in cdx, not a redirect
+    cdx = CDXObject(URL_AGNOSTIC_REVISIT_CDX.replace('revisit -', 'revisit 200').encode('utf-8'))
+
+    start = time.time()
+    headers, stream = resolve_loader(cdx, [], None)
+    assert time.time() - start < 0.35
+
+    assert headers.get_statuscode() == '200'
+    assert b'Example Domain' in stream.read()
+
+
+@pytest.mark.parametrize('fail_offset', ['1864', '333'])
+def test_revisit_concurrent_load_failed(fail_offset):
+    record_loader = SlowRecordLoader(fail_offset=fail_offset)
+    resolve_loader = ResolvingLoader(DefaultResolverMixin.make_resolvers(test_warc_dir),
+                                     record_loader=record_loader)
+
+    cdx = CDXObject(SAME_URL_REVISIT_CDX.encode('utf-8'))
+
+    with pytest.raises(ArchiveLoadFailed) as e:
+        resolve_loader(cdx, [], None)
+
+    assert 'Load Failed: ' + fail_offset in str(e.value)
+
+    # other record closed
+    assert len(record_loader.records) == 1
+    assert record_loader.closed == record_loader.records
+
+
+def test_revisit_concurrent_load_headers_failed_first():
+    # headers load fails while payload still loading, payload load cancelled
+    record_loader = SlowRecordLoader(fail_offset='1864', delays={'1864': 0})
+    resolve_loader = ResolvingLoader(DefaultResolverMixin.make_resolvers(test_warc_dir),
+                                     record_loader=record_loader)
+
+    cdx = CDXObject(SAME_URL_REVISIT_CDX.encode('utf-8'))
+
+    with pytest.raises(ArchiveLoadFailed) as e:
+        resolve_loader(cdx, [], None)
+
+    assert 'Load Failed: 1864' in str(e.value)
+    assert record_loader.records == []
+
 
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
+
+
+#==============================================================================
+class CountingLoader(object):
+    def __init__(self):
+        self.loader = BlockLoader()
+        self.loads = []
+
+    def load(self, url, offset, length):
+        self.loads.append((offset, length))
+        return self.loader.load(url, offset, length)
+
+
+def load_payload(test_file, offset, length):
+    record = BlockArcWarcRecordLoader().load(test_warc_dir + test_file, offset, length)
+    with closing(record.raw_stream):
+        return record.raw_stream.read()
+
+
+@pytest.mark.parametrize('min_seek', [0, 1000])
+def test_payload_skip_seek_uncompressed(min_seek):
+    payload = load_payload('example.warc', 460, 1987)
+
+    loader = CountingLoader()
+    record = BlockArcWarcRecordLoader(loader=loader).load(test_warc_dir + 'example.warc', 460, 1987)
+
+    assert isinstance(record.raw_stream, SeekingLimitReader)
+    record.raw_stream.min_seek = min_seek
+
+    assert record.raw_stream.read(10) == payload[:10]
+    assert skip_stream(record.raw_stream, 100) == 100
+    assert record.raw_stream.read() == payload[110:]
+
+    if min_seek:
+        assert len(loader.loads) == 1
+    else:
+        # loaded again from absolute offset of the range
+        payload_offset = 460 + 1987 - len(payload)
+        assert loader.loads[1] == (payload_offset + 110, len(payload) - 110)
+
+
+def test_payload_skip_read_compressed():
+    payload = load_payload('example.warc.gz', 333, 1043)
+
+    loader = CountingLoader()
+    record = BlockArcWarcRecordLoader(loader=loader).load(test_warc_dir + 'example.warc.gz', 333, 1043)
+
+    assert not isinstance(record.raw_stream, SeekingLimitReader)
+
+    assert skip_stream(record.raw_stream, 100) == 100
+    assert record.raw_stream.read() == payload[100:]
+    assert len(loader.loads) == 1
@@ -2,10 +2,18 @@ from pywb import get_test_dir
 from pywb.utils.loaders import to_file_url
 
 from pywb.warcserver.resource.pathresolvers import PrefixResolver, PathIndexResolver, RedisResolver
-from pywb.warcserver.resource.pathresolvers import DefaultResolverMixin
+from pywb.warcserver.resource.pathresolvers import DefaultResolverMixin, PathResolutionCache
+from pywb.warcserver.resource.resolvingloader import ResolvingLoader
+from pywb.warcserver.resource.blockrecordloader import BlockArcWarcRecordLoader
 from pywb.warcserver.index.cdxobject import CDXObject
+from pywb.utils.loaders import BlockLoader
+
+from warcio.recordloader import ArchiveLoadFailed
 
 import os
+import time
+import pytest
+import requests
 
 from fakeredis import FakeStrictRedis
 from mock import patch
@@ -22,6 +30,31 @@ class TestPathIndex(object):
         assert list(path_index('iana.warc.gz', cdx)) == ['sample_archive/warcs/iana.warc.gz']
         assert list(path_index('not-found.gz', cdx)) == []
 
+    def test_path_index_reload(self, tmpdir):
+        path = str(tmpdir.join('pathindex.txt'))
+        with open(path, 'w') as fh:
+            fh.write('a.warc.gz\t/path/a.warc.gz\n')
+
+        path_index = PathIndexResolver(path, check_interval=0)
+
+        cdx = CDXObject()
+        assert path_index('a.warc.gz', cdx) == ['/path/a.warc.gz']
+        assert path_index('b.warc.gz', cdx) == []
+
+        paths = path_index.paths
+
+        # not reloaded if not modified
+        assert path_index('a.warc.gz', cdx) == ['/path/a.warc.gz']
+        assert path_index.paths is paths
+
+        with open(path, 'w') as fh:
+            fh.write('a.warc.gz\t/path/a.warc.gz\n')
+            fh.write('b.warc.gz\t/path/b.warc.gz\t/other/b.warc.gz\n')
+
+        os.utime(path, (time.time() + 10, time.time() + 10))
+
+        assert path_index('b.warc.gz', cdx) == ['/path/b.warc.gz', '/other/b.warc.gz']
+
     def test_resolver_dir_wildcard(self):
         resolver = DefaultResolverMixin.make_best_resolver(os.path.join(get_test_dir(), '*', ''))
 
@@ -74,6 +107,34 @@ class TestPathIndex(object):
 
         assert resolver('example.warc.gz', cdx) == 'some_path/example.warc.gz'
 
+    @patch('redis.StrictRedis', FakeStrictRedis)
+    def test_redis_resolver_cache(self):
+        resolver = RedisResolver('redis://127.0.0.1:6379/0/warc_map_cache')
+
+        cdx = CDXObject()
+        resolver.redis.hset(resolver.redis_key_template, 'example.warc.gz', 'some_path/example.warc.gz')
+
+        assert resolver('example.warc.gz', cdx) == 'some_path/example.warc.gz'
+
+        # cached until ttl expires
+        resolver.redis.hset(resolver.redis_key_template, 'example.warc.gz', 'new_path/example.warc.gz')
+        assert resolver('example.warc.gz', cdx) == 'some_path/example.warc.gz'
+
+        # expire entry
+        key = (resolver.redis_key_template, 'example.warc.gz')
+        resolver.cache[key] = (0, resolver.cache[key][1])
+        assert resolver('example.warc.gz', cdx) == 'new_path/example.warc.gz'
+
+        # removed if failed
+        resolver.redis.hset(resolver.redis_key_template, 'example.warc.gz', 'some_path/example.warc.gz')
+        resolver.invalidate('example.warc.gz')
+        assert resolver('example.warc.gz', cdx) == 'some_path/example.warc.gz'
+
+        # not cached
+        resolver.cache_ttl = 0
+        resolver.redis.hset(resolver.redis_key_template, 'example.warc.gz', 'new_path/example.warc.gz')
+        assert resolver('example.warc.gz', cdx) == 'new_path/example.warc.gz'
+
     @patch('redis.StrictRedis', FakeStrictRedis)
     def test_redis_resolver_multi_key(self):
         resolver = RedisResolver('redis://127.0.0.1:6379/0/*:warc')
@@ -180,6 +241,123 @@ class TestPathIndex(object):
         assert isinstance(res[2], RedisResolver)
 
 
+# ============================================================================
+class CountingRecordLoader(BlockArcWarcRecordLoader):
+    def __init__(self):
+        super(CountingRecordLoader, self).__init__(loader=BlockLoader())
+        self.paths = []
+
+    def load(self, url, *args, **kwargs):
+        self.paths.append(url)
+        return super(CountingRecordLoader, self).load(url, *args, **kwargs)
+
+
+# ============================================================================
+class TestPathResolutionCache(object):
+    def get_loader(self, path_cache, *prefixes):
+        record_loader = CountingRecordLoader()
+        loader = ResolvingLoader(DefaultResolverMixin.make_resolvers(list(prefixes)),
+                                 record_loader=record_loader,
+                                 path_cache=path_cache)
+        return loader, record_loader
+
+    def make_cdx(self, filename='example.warc.gz'):
+        cdx = CDXObject()
+        cdx['filename'] = filename
+        cdx['offset'] = '333'
+        cdx['length'] = '1043'
+        return cdx
+
+    def test_last_path_first(self, tmpdir):
+        path_cache = PathResolutionCache()
+        warcs = os.path.join(get_test_dir(), 'warcs', '')
+        loader, record_loader = self.get_loader(path_cache, str(tmpdir) + '/a/', str(tmpdir) + '/b/', warcs)
+
+        for i in range(3):
+            record = loader._resolve_path_load(self.make_cdx(), False, [])
+            assert record.rec_headers.get_header('WARC-Target-URI') == 'http://example.com?example=1'
+            record.raw_stream.close()
+
+        # failed paths only tried once
+        assert record_loader.paths == [str(tmpdir) + '/a/example.warc.gz',
+                                       str(tmpdir) + '/b/example.warc.gz'] + [warcs + 'example.warc.gz'] * 3
+
+        stats = path_cache.get_stats()
+        assert stats['hits'] == 2
+        assert stats['misses'] == 1
+        assert stats['paths'] == 1
+
+    def test_recently_failed(self, tmpdir):
+        path_cache = PathResolutionCache(failed_ttl=1000)
+        loader, record_loader = self.get_loader(path_cache, str(tmpdir) + '/')
+
+        for i in range(3):
+            with pytest.raises(ArchiveLoadFailed):
+                loader._resolve_path_load(self.make_cdx(), False, [])
+
+        assert record_loader.paths == [str(tmpdir) + '/example.warc.gz']
+        assert path_cache.get_stats()['failed_hits'] == 2
+
+        # expired, tried again
+        path_cache.failed_ttl = -1
+        path_cache.set_failed(loader._get_path_cache_key('example.warc.gz', self.make_cdx()))
+
+        with pytest.raises(ArchiveLoadFailed):
+            loader._resolve_path_load(self.make_cdx(), False, [])
+
+        assert len(record_loader.paths) == 2
+
+    def test_invalid_record_not_failed(self):
+        path_cache = PathResolutionCache()
+        warcs = os.path.join(get_test_dir(), 'warcs', '')
+        loader, record_loader = self.get_loader(path_cache, warcs)
+
+        cdx = self.make_cdx()
+        cdx['offset'] = '10'
+
+        for i in range(2):
+            with pytest.raises(ArchiveLoadFailed):
+                loader._resolve_path_load(cdx, False, [])
+
+        assert len(record_loader.paths) == 2
+        assert path_cache.get_stats()['failed'] == 0
+
+    def test_resolvers_not_called_after_found(self):
+        resolved = []
+        def resolver(filename, cdx):
+            resolved.append(filename)
+            return None
+
+        path_cache = PathResolutionCache()
+        warcs = os.path.join(get_test_dir(), 'warcs', '')
+        loader, record_loader = self.get_loader(path_cache, warcs, resolver)
+
+        for i in range(2):
+            record = loader._resolve_path_load(self.make_cdx(), False, [])
+            record.raw_stream.close()
+
+        assert resolved == []
+        assert path_cache.get_stats()['hits'] == 1
+
+    @pytest.mark.parametrize('status_code, is_failed', [(404, True), (500, False), (None, False)])
+    def test_only_not_found_failed(self, status_code, is_failed):
+        if status_code:
+            response = requests.Response()
+            response.status_code = status_code
+            exc = requests.HTTPError('Load Failed', response=response)
+        else:
+            exc = requests.ConnectionError('Load Failed')
+
+        path_cache = PathResolutionCache()
+        loader, record_loader = self.get_loader(path_cache, 'http://example.com/')
+
+        with patch.object(record_loader, 'load', side_effect=exc):
+            with pytest.raises(ArchiveLoadFailed):
+                loader._resolve_path_load(self.make_cdx(), False, [])
+
+        assert path_cache.get_stats()['failed'] == (1 if is_failed else 0)
+
+
 #=================================================================
 if __name__ == "__main__":
     import doctest
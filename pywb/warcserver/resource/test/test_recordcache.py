@@ -0,0 +1,113 @@
+import os
+
+import webtest
+
+from pywb.warcserver.resource.recordcache import RecordCache
+from pywb.warcserver.resource.blockrecordloader import BlockArcWarcRecordLoader
+from pywb.warcserver.warcserver import WarcServer
+from pywb.utils.loaders import BlockLoader
+
+from pywb import get_test_dir
+
+
+TEST_WARC = os.path.join(get_test_dir(), 'warcs', 'example.warc.gz')
+
+
+# ============================================================================
+class CountingLoader(object):
+    def __init__(self):
+        self.loader = BlockLoader()
+        self.count = 0
+
+    def load(self, url, offset, length):
+        self.count += 1
+        return self.loader.load(url, offset, length)
+
+
+# ============================================================================
+def test_record_cache_lru():
+    cache = RecordCache(max_size=10, max_record_size=6)
+
+    assert cache.get('a') is None
+
+    cache.put('a', b'1234')
+    cache.put('b', b'5678')
+
+    # too large for cache
+    cache.put('c', b'1234567')
+    assert cache.get('c') is None
+
+    assert cache.get('a') == b'1234'
+
+    # evict least recently used
+    cache.put('d', b'90')
+    cache.put('e', b'ab')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1234'
+
+    stats = cache.get_stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 3
+    assert stats['bytes_saved'] == 8
+    assert stats['evictions'] == 1
+    assert stats['records'] == 3
+    assert stats['size'] == 8
+
+
+def test_cached_record_loader():
+    loader = CountingLoader()
+    cache = RecordCache(max_record_size=1500)
+    record_loader = BlockArcWarcRecordLoader(loader=loader, record_cache=cache)
+
+    for i in range(3):
+        record = record_loader.load(TEST_WARC, 333, 1043)
+        assert record.rec_headers.get_header('WARC-Target-URI') == 'http://example.com?example=1'
+        assert b'Example Domain' in record.content_stream().read()
+
+    assert loader.count == 1
+    assert cache.get_stats()['bytes_saved'] == 2 * 1043
+
+    # revisit record, separate cache entry
+    record = record_loader.load(TEST_WARC, '1864', '553')
+    assert record.rec_type == 'revisit'
+    assert loader.count == 2
+
+    # unknown length, not cached
+    record = record_loader.load(TEST_WARC, 333, '-')
+    record = record_loader.load(TEST_WARC, 333, '-')
+    assert loader.count == 4
+
+    # over max record size, not cached
+    cache.max_record_size = 1000
+    record_loader.load(TEST_WARC, 333, 1043)
+    assert loader.count == 5
+
+    assert cache.get_stats()['records'] == 2
+
+
+def test_warcserver_stats():
+    config = {'collections': {'test': {'index_paths': os.path.join(get_test_dir(), 'cdxj', 'example.cdxj'),
+                                       'archive_paths': os.path.join(get_test_dir(), 'warcs') + os.path.sep}},
+              'enable_auto_colls': False,
+              'record_cache_size': 1024 * 1024,
+             }
+
+    app = webtest.TestApp(WarcServer(config_file=None, custom_config=config))
+
+    for i in range(2):
+        resp = app.get('/test/resource?url=http://example.com/?example=1&closest=20140103030321')
+        assert '"filename": "example.warc.gz"' in resp.headers['Warcserver-Cdx']
+
+    stats = app.get('/_stats').json['record_cache']
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['bytes_saved'] == 1043
+
+    del config['record_cache_size']
+    config['path_cache_size'] = 0
+    config['coalesce_requests'] = False
+    config['resolution_cache_size'] = 0
+    app = webtest.TestApp(WarcServer(config_file=None, custom_config=config))
+    assert app.get('/_stats').json == {'record_cache': None, 'range_cache': None, 'read_ahead': None,
+                                       'path_cache': None, 'index_flight': None, 'record_flight': None,
+                                       'resolution_cache': None}
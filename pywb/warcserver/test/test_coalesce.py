@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+
+import webtest
+
+from pywb.warcserver.warcserver import WarcServer
+
+from pywb import get_test_dir
+
+
+URL = '/test/resource?url=http://example.com/?example=1&closest={0}'
+
+
+# ============================================================================
+class BlockingWrapper(object):
+    """ Counts calls, and blocks them until released
+    """
+    def __init__(self, func):
+        self.func = func
+        self.count = 0
+        self.release = threading.Event()
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+        self.release.wait(10)
+        return self.func(*args, **kwargs)
+
+
+def wait_for(cond, timeout=10.0):
+    end = time.time() + timeout
+    while not cond():
+        assert time.time() < end
+        time.sleep(0.01)
+
+
+# ============================================================================
+class TestCoalesceRequests(object):
+    def init_app(self, coalesce_requests=True):
+        config = {'collections': {'test': {'index_paths': os.path.join(get_test_dir(), 'cdxj', 'example.cdxj'),
+                                           'archive_paths': os.path.join(get_test_dir(), 'warcs') + os.path.sep}},
+                  'enable_auto_colls': False,
+                  'coalesce_requests': coalesce_requests,
+                  'record_cache_size': 1024 * 1024,
+                  'resolution_cache_size': 0,
+                 }
+
+        self.warcserver = WarcServer(config_file=None, custom_config=config)
+        self.app = webtest.TestApp(self.warcserver)
+
+        handler = self.warcserver.fixed_routes['test']
+
+        self.index = BlockingWrapper(handler.index_source)
+        handler.index_source = self.index
+
+        record_loader = handler.resource_loaders[0].resolve_loader.record_loader
+        self.loader = BlockingWrapper(record_loader.loader.load)
+        record_loader.loader.load = self.loader
+
+    def get_concurrent(self, urls):
+        results = [None] * len(urls)
+
+        def get(i):
+            results[i] = self.app.get(urls[i])
+
+        threads = [threading.Thread(target=get, args=(i,)) for i in range(len(urls))]
+        for thread in threads:
+            thread.start()
+
+        return threads, results
+
+    def join(self, threads):
+        for thread in threads:
+            thread.join()
+
+    def test_coalesce_identical(self):
+        self.init_app()
+
+        threads, results = self.get_concurrent([URL.format('20140103030321')] * 5)
+
+        # one index lookup in flight, others waiting for it
+        wait_for(lambda: self.warcserver.index_flight.get_stats()['followers'] == 4)
+        assert self.index.count == 1
+        self.index.release.set()
+
+        # others wait until first request has loaded the record
+        wait_for(lambda: self.loader.count == 1)
+        time.sleep(0.1)
+        assert self.warcserver.index_flight.get_stats()['in_flight'] == 1
+        self.loader.release.set()
+
+        self.join(threads)
+
+        # others load from shared cdx lines, record now cached
+        assert self.index.count == 1
+        assert self.loader.count == 1
+
+        for resp in results:
+            assert resp.status_int == 200
+            assert resp.headers['Warcserver-Cdx'] == results[0].headers['Warcserver-Cdx']
+            assert resp.body == results[0].body
+            assert b'Example Domain' in resp.body
+
+        stats = self.app.get('/_stats').json
+        assert stats['index_flight'] == {'leaders': 1, 'followers': 4, 'timeouts': 0, 'in_flight': 0}
+
+        # not shared once done: new lookup, record now cached
+        resp = self.app.get(URL.format('20140103030321'))
+        assert resp.body == results[0].body
+        assert self.index.count == 2
+        assert self.loader.count == 1
+
+    def test_coalesce_record_load(self):
+        self.init_app()
+        self.index.release.set()
+
+        # different lookups resolving to the same capture
+        threads, results = self.get_concurrent([URL.format('20140103030321'),
+                                                URL.format('20140103030322')])
+
+        # one record load in flight, other waiting for it
+        wait_for(lambda: self.warcserver.record_flight.get_stats()['followers'] == 1)
+        assert self.loader.count == 1
+        self.loader.release.set()
+
+        self.join(threads)
+
+        assert self.index.count == 2
+        assert self.loader.count == 1
+        assert results[0].body == results[1].body
+
+    def test_shared_only_lines_read(self):
+        self.init_app()
+        self.index.release.set()
+        self.loader.release.set()
+
+        handler = self.warcserver.fixed_routes['test']
+        shared = []
+
+        load_shared = handler._load_shared
+        def record_shared(params, shared_lookup):
+            res = load_shared(params, shared_lookup)
+            shared.append(shared_lookup)
+            return res
+
+        handler._load_shared = record_shared
+
+        # first capture loaded, later captures not read
+        resp = self.app.get(URL.format('20140103030321'))
+        assert resp.status_int == 200
+
+        assert len(shared) == 1
+        assert shared[0].shareable
+        assert [cdx['timestamp'] for cdx in shared[0].cdx_list] == ['20140103030321']
+
+    def test_no_coalesce_different(self):
+        self.init_app()
+        self.index.release.set()
+        self.loader.release.set()
+
+        threads, results = self.get_concurrent([URL.format('20140103030321'),
+                                                URL.format('20140103030341')])
+        self.join(threads)
+
+        assert self.index.count == 2
+        assert self.warcserver.index_flight.get_stats()['followers'] == 0
+
+        assert all(resp.status_int == 200 for resp in results)
+
+    def test_coalesce_disabled(self):
+        self.init_app(coalesce_requests=False)
+        self.index.release.set()
+        self.loader.release.set()
+
+        threads, results = self.get_concurrent([URL.format('20140103030321')] * 3)
+        self.join(threads)
+
+        assert self.index.count == 3
+        assert all(resp.body == results[0].body for resp in results)
+
+        stats = self.app.get('/_stats').json
+        assert stats['index_flight'] is None
+        assert stats['record_flight'] is None
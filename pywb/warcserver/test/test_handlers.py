@@ -75,7 +75,8 @@ class TestBaseWarcServer(HttpBinLiveTests, MementoOverrideTests, FakeRedisTests,
         app.add_route('/seq', HandlerSeq([handler3,
                                       handler2]))
 
-        app.add_route('/allredis', DefaultResourceHandler(source3, 'redis://localhost/2/test:warc'))
+        cls.redis_handler = DefaultResourceHandler(source3, 'redis://localhost/2/test:warc')
+        app.add_route('/allredis', cls.redis_handler)
 
         app.add_route('/empty', HandlerSeq([]))
         app.add_route('/invalid', DefaultResourceHandler([SimpleAggregator({'invalid': 'should not be a callable'})]))
@@ -431,6 +432,9 @@ host: www.youtube.com\
         assert b'Content-Type: application/vnd.youtube-dl_formats+json' in resp.body
 
     def test_error_redis_file_not_found(self):
+        # clear path looked up in earlier test, kept in memory
+        self.redis_handler.resource_loaders[0].resolvers[0].cache.clear()
+
         f = FakeStrictRedis.from_url('redis://localhost/2')
         f.hset('test:warc', 'example2.warc.gz', './x-no-such-dir/example2.warc.gz')
 
@@ -479,6 +483,25 @@ host: www.youtube.com\
 
         assert 'ResErrors' not in resp.headers
 
+    def test_seq_resource_range_start(self):
+        resp = self.testapp.get('/seq/resource?url=http://example.com/&closest=2016')
+        assert 'Warcserver-Range-Skipped' not in resp.headers
+
+        full_payload = resp.body.split(b'\r\n\r\n', 2)[2]
+
+        resp = self.testapp.get('/seq/resource?url=http://example.com/&closest=2016&range_start=100')
+        assert resp.headers['Warcserver-Range-Skipped'] == '100'
+
+        buff = BytesIO(resp.body)
+        rec_headers = StatusAndHeadersParser(['WARC/1.0']).parse(buff)
+        assert int(rec_headers.get_header('Content-Length')) == len(buff.read())
+
+        assert resp.body.split(b'\r\n\r\n', 2)[2] == full_payload[100:]
+
+        # out of range, not skipped
+        resp = self.testapp.get('/seq/resource?url=http://example.com/&closest=2016&range_start=100000')
+        assert 'Warcserver-Range-Skipped' not in resp.headers
+
     def test_error_invalid_index_output(self):
         resp = self.testapp.get('/live/index?url=http://httpbin.org/get&output=foobar', status=400)
 
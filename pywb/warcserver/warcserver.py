@@ -1,4 +1,8 @@
-from pywb.utils.loaders import load_yaml_config, load_overlay_config
+from pywb.utils.loaders import load_yaml_config, load_overlay_config, BlockLoader
+from pywb.utils.rangecache import DiskRangeCache
+from pywb.utils.readahead import ReadAheadBuffer
+from pywb.utils.singleflight import SingleFlight
+from pywb.warcserver.resource.pathresolvers import PathResolutionCache
 
 from pywb.warcserver.basewarcserver import BaseWarcServer
 
@@ -16,6 +20,13 @@ from pywb.warcserver.index.indexsource import LiveIndexSource, WBMementoIndexSou
 from pywb.warcserver.index.indexsource import XmlQueryIndexSource
 
 from pywb.warcserver.index.zipnum import ZipNumIndexSource
+from pywb.warcserver.index.shardedindex import ShardedIndexAggregator
+from pywb.warcserver.index.digestindex import DigestIndex
+from pywb.warcserver.index.resolutioncache import ResolutionCache
+
+from pywb.utils.filepool import FileHandlePool
+
+from pywb.warcserver.resource.recordcache import RecordCache
 
 from pywb.warcserver.access_checker import AccessChecker, CacheDirectoryAccessSource
 
@@ -93,6 +104,18 @@ class WarcServer(BaseWarcServer):
 
         self.rules_file = self.config.get('rules_file', '')
 
+        self.file_pool = self.init_file_pool()
+
+        self.record_cache = self.init_record_cache()
+
+        self.block_loader = self.init_block_loader()
+
+        self.path_cache = self.init_path_cache()
+
+        self.index_flight, self.record_flight = self.init_single_flight()
+
+        self.resolution_cache = self.init_resolution_cache()
+
         if 'certificates' in self.config:
             certs_config = self.config['certificates']
             DefaultAdapters.live_adapter = PywbHttpAdapter(max_retries=Retry(3),
@@ -107,6 +130,8 @@ class WarcServer(BaseWarcServer):
         if self.config.get('enable_auto_colls', True):
             self.auto_handler = self.load_auto_colls()
 
+        self._add_simple_route('/_stats', self.get_stats)
+
         self.fixed_routes = self.load_colls()
 
         for name, route in iteritems(self.fixed_routes):
@@ -118,6 +143,86 @@ class WarcServer(BaseWarcServer):
         if self.auto_handler:
             self.add_route('/<path_param_value>', self.auto_handler, path_param_name='param.coll')
 
+    def init_file_pool(self):
+        """ Shared pool of open WARC file descriptors for all collections,
+        only if file_pool_size is set
+        """
+        size = self.config.get('file_pool_size')
+        if not size or not FileHandlePool.is_supported():
+            return None
+
+        return FileHandlePool(size, self.config.get('file_pool_check_interval'))
+
+    def init_record_cache(self):
+        """ Shared in-memory cache of small, frequently loaded records,
+        only if record_cache_size is set
+        """
+        size = self.config.get('record_cache_size')
+        if not size:
+            return None
+
+        return RecordCache(size, self.config.get('record_cache_max_record_size'))
+
+    def init_path_cache(self):
+        """ Cache of WARC filename to path resolution, shared by all collections,
+        disabled if path_cache_size is 0
+        """
+        size = self.config.get('path_cache_size', PathResolutionCache.DEFAULT_MAX_SIZE)
+        if not size:
+            return None
+
+        return PathResolutionCache(size, self.config.get('path_cache_failed_ttl'))
+
+    def init_block_loader(self):
+        """ Loader shared by all collections, reading local WARCs
+        through the file pool, and remote WARCs with read-ahead
+        and the disk range_cache, if configured
+        """
+        return BlockLoader(file_pool=self.file_pool,
+                           range_cache=self.config.get('range_cache'),
+                           read_ahead=self.config.get('read_ahead'))
+
+    def init_single_flight(self):
+        """ Coalescing of concurrent identical index lookups and record
+        loads for resource requests, shared by all collections,
+        disabled if coalesce_requests is false
+        """
+        if not self.config.get('coalesce_requests', True):
+            return None, None
+
+        return SingleFlight(), SingleFlight()
+
+    def init_resolution_cache(self):
+        """ Short-lived cache of the captures resolved by resource lookups,
+        shared by all collections, disabled if resolution_cache_size is 0
+        """
+        size = self.config.get('resolution_cache_size', ResolutionCache.DEFAULT_MAX_SIZE)
+        if not size:
+            return None
+
+        return ResolutionCache(size, self.config.get('resolution_cache_ttl'))
+
+    def get_stats(self, environ=None):
+        """ Cache statistics, served at /_stats
+        """
+        stats = {'record_cache': self.record_cache.get_stats() if self.record_cache else None,
+                 'range_cache': None,
+                 'read_ahead': None,
+                 'path_cache': self.path_cache.get_stats() if self.path_cache else None,
+                 'index_flight': self.index_flight.get_stats() if self.index_flight else None,
+                 'record_flight': self.record_flight.get_stats() if self.record_flight else None,
+                 'resolution_cache': self.resolution_cache.get_stats() if self.resolution_cache else None}
+
+        range_cache = self.block_loader.kwargs.get('range_cache')
+        if range_cache:
+            stats['range_cache'] = DiskRangeCache.from_config(range_cache).get_stats()
+
+        read_ahead = self.block_loader.kwargs.get('read_ahead')
+        if read_ahead:
+            stats['read_ahead'] = ReadAheadBuffer.from_config(read_ahead).get_stats()
+
+        return {}, stats, {}
+
     def init_paths(self, name, abs_path=None):
         templ = self.config.get(name)
 
@@ -154,9 +259,23 @@ class WarcServer(BaseWarcServer):
         else:
             source = dir_source
 
+        # search for any digest index sidecars in auto collection index dirs
+        index_paths = self.index_paths
+        if isinstance(index_paths, str):
+            index_paths = [index_paths]
+
+        digest_index = DigestIndex([os.path.join(self.root_dir, path) for path in index_paths])
+
         return DefaultResourceHandler(source, self.archive_paths,
                                       rules_file=self.rules_file,
-                                      access_checker=access_checker)
+                                      access_checker=access_checker,
+                                      digest_index=digest_index,
+                                      block_loader=self.block_loader,
+                                      record_cache=self.record_cache,
+                                      path_cache=self.path_cache,
+                                      index_flight=self.index_flight,
+                                      record_flight=self.record_flight,
+                                      resolution_cache=self.resolution_cache)
 
     def list_fixed_routes(self):
         return list(self.fixed_routes.keys())
@@ -211,6 +330,7 @@ class WarcServer(BaseWarcServer):
             acl_paths = None
             default_access = self.default_access
             embargo = None
+            digest_index = None
         elif isinstance(coll_config, dict):
             index = coll_config.get('index')
             if not index:
@@ -219,10 +339,13 @@ class WarcServer(BaseWarcServer):
             acl_paths = coll_config.get('acl_paths')
             default_access = coll_config.get('default_access', self.default_access)
             embargo = coll_config.get('embargo')
+            digest_index = coll_config.get('digest_index')
 
         else:
             raise Exception('collection config must be string or dict')
 
+        shards = None
+
         # INDEX CONFIG
         if index:
             agg = init_index_agg({name: index})
@@ -234,25 +357,46 @@ class WarcServer(BaseWarcServer):
             if sequence:
                 return self.init_sequence(name, sequence)
 
+            timeout = int(coll_config.get('timeout', 0))
+
+            shards = coll_config.get('shards')
             index_group = coll_config.get('index_group')
-            if not index_group:
-                raise Exception('no index, index_group or sequence found')
 
-            timeout = int(coll_config.get('timeout', 0))
-            agg = init_index_agg(index_group, True, timeout)
+            if shards:
+                # if no archive paths, load resources from the owning shard
+                agg = ShardedIndexAggregator.init_from_config(shards,
+                                                              coll=name,
+                                                              load_from_shard=not archive_paths,
+                                                              timeout=timeout)
+            elif index_group:
+                agg = init_index_agg(index_group, True, timeout)
+            else:
+                raise Exception('no index, index_group, shards or sequence found')
 
         # ARCHIVE CONFIG
         if not archive_paths:
-            archive_paths = self.config.get('archive_paths')
+            # resources loaded from shards by url, if no archive paths
+            archive_paths = '' if shards else self.config.get('archive_paths')
 
         # ACCESS CONFIG
         access_checker = None
         if acl_paths or embargo:
             access_checker = AccessChecker(acl_paths, default_access, embargo)
 
+        # DIGEST INDEX CONFIG
+        if digest_index:
+            digest_index = DigestIndex(digest_index)
+
         return DefaultResourceHandler(agg, archive_paths,
                                       rules_file=self.rules_file,
-                                      access_checker=access_checker)
+                                      access_checker=access_checker,
+                                      digest_index=digest_index,
+                                      block_loader=self.block_loader,
+                                      record_cache=self.record_cache,
+                                      path_cache=self.path_cache,
+                                      index_flight=self.index_flight,
+                                      record_flight=self.record_flight,
+                                      resolution_cache=self.resolution_cache)
 
     def init_sequence(self, coll_name, seq_config):
         if not isinstance(seq_config, list):
@@ -0,0 +1,128 @@
+"""
+Runs requests against the pywb ASGI app, in a process without gevent
+monkey-patching, printing the responses as json. Used by test_asgi.py
+
+Usage, with the json config and requests on stdin::
+
+  python -m tests.asgi_driver < config.json
+
+"""
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+
+import gevent.monkey
+
+from pywb.apps.asgiapp import ASGIApp
+
+
+# ============================================================================
+class SlowClient(object):
+    def __init__(self, delay):
+        self.delay = delay
+        self.messages = []
+
+    async def send(self, message):
+        self.messages.append(message)
+        if self.delay and message['type'] == 'http.response.body':
+            await asyncio.sleep(self.delay)
+
+
+async def do_request(app, req):
+    path = req['path']
+    body = base64.b64decode(req.get('body', ''))
+
+    if body:
+        half = len(body) // 2
+        parts = [{'type': 'http.request', 'body': body[:half], 'more_body': True},
+                 {'type': 'http.request', 'body': body[half:]}]
+    else:
+        parts = [{'type': 'http.request', 'body': b''}]
+
+    async def receive():
+        if parts:
+            return parts.pop(0)
+
+        await asyncio.sleep(60)
+        return {'type': 'http.disconnect'}
+
+    headers = [(b'host', b'localhost:80')]
+    for name, value in req.get('headers', []):
+        headers.append((name.lower().encode('latin-1'), value.encode('latin-1')))
+
+    path, _, query = path.partition('?')
+
+    scope = {'type': 'http',
+             'http_version': '1.1',
+             'method': req.get('method', 'GET'),
+             'scheme': 'http',
+             'path': path,
+             'raw_path': path.encode('latin-1'),
+             'query_string': query.encode('latin-1'),
+             'root_path': '',
+             'headers': headers,
+             'server': ('localhost', 80),
+             'client': ('127.0.0.1', 12345),
+            }
+
+    client = SlowClient(req.get('delay', 0))
+
+    await app(scope, receive, client.send)
+
+    start = client.messages[0]
+    chunks = [msg['body'] for msg in client.messages[1:] if msg.get('body')]
+
+    return {'status': start['status'],
+            'headers': [[name.decode('latin-1'), value.decode('latin-1')] for name, value in start['headers']],
+            'body': base64.b64encode(b''.join(chunks)).decode('ascii'),
+            'num_chunks': len(chunks),
+            'more_body': [msg.get('more_body', False) for msg in client.messages[1:]],
+            'finished': time.time(),
+           }
+
+
+async def do_lifespan(app):
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    await app({'type': 'lifespan'}, receive, send)
+    return sent
+
+
+async def run_all(config):
+    app = ASGIApp(config_file=config['config_file'],
+                  custom_config=config.get('custom_config'),
+                  max_workers=config.get('max_workers'))
+
+    results = {'patched': gevent.monkey.is_module_patched('socket') or
+                          gevent.monkey.is_module_patched('threading')}
+
+    # sequential requests
+    results['responses'] = [await do_request(app, req) for req in config.get('requests', [])]
+
+    # concurrent requests
+    results['concurrent'] = await asyncio.gather(*[do_request(app, req)
+                                                   for req in config.get('concurrent', [])])
+
+    results['lifespan'] = await do_lifespan(app)
+    return results
+
+
+def main():
+    config = json.loads(sys.stdin.read())
+    os.chdir(config.get('cwd', '.'))
+    results = asyncio.run(run_all(config))
+    sys.stdout.write('\n' + json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
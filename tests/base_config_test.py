@@ -1,4 +1,4 @@
-from gevent import monkey; monkey.patch_all(thread=False)
+from gevent import monkey; monkey.patch_all()
 
 import pytest
 import webtest
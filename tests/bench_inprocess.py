@@ -0,0 +1,77 @@
+"""
+Replay latency benchmark, comparing the RewriterApp calling the warcserver
+in-process with calling it over loopback HTTP.
+
+Usage, from the repository root::
+
+  python -m tests.bench_inprocess [-n 200] [url ...]
+
+"""
+from gevent import monkey; monkey.patch_all()
+
+from argparse import ArgumentParser
+import os
+import time
+
+import webtest
+
+from pywb.apps.frontendapp import FrontEndApp
+
+
+DEFAULT_URLS = ['/pywb/20140127171250id_/http://example.com/',
+                '/pywb/20140127171250mp_/http://example.com/',
+                '/pywb/20140127171251mp_/http://example.com/',
+                '/pywb/20140127171238mp_/http://www.iana.org/',
+               ]
+
+
+# ============================================================================
+def time_replay(testapp, url, num):
+    times = []
+    for _ in range(num):
+        start = time.perf_counter()
+        testapp.get(url)
+        times.append((time.perf_counter() - start) * 1000.0)
+
+    times.sort()
+    return times
+
+
+def format_times(times):
+    mean = sum(times) / len(times)
+    median = times[len(times) // 2]
+    p95 = times[min(int(len(times) * 0.95), len(times) - 1)]
+    return 'mean {0:7.3f}  median {1:7.3f}  p95 {2:7.3f}'.format(mean, median, p95)
+
+
+def main(args=None):
+    parser = ArgumentParser(description='warcserver in-process vs. HTTP replay latency (ms)')
+    parser.add_argument('-n', '--num', type=int, default=200,
+                        help='number of requests per url and mode')
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                                         'config_test.yaml'))
+    parser.add_argument('urls', nargs='*', default=DEFAULT_URLS)
+
+    r = parser.parse_args(args=args)
+
+    app = FrontEndApp(config_file=r.config)
+    testapp = webtest.TestApp(app)
+    client = app.rewriterapp.inprocess_client
+
+    for url in r.urls:
+        # warm up caches
+        testapp.get(url)
+
+        app.rewriterapp.inprocess_client = client
+        inproc = time_replay(testapp, url, r.num)
+
+        app.rewriterapp.inprocess_client = None
+        http = time_replay(testapp, url, r.num)
+
+        print(url)
+        print('  in-process  ' + format_times(inproc))
+        print('  http        ' + format_times(http))
+
+
+if __name__ == '__main__':
+    main()
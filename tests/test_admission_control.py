@@ -0,0 +1,88 @@
+from .base_config_test import BaseConfigTest
+
+import webtest
+
+
+# ============================================================================
+class TestAdmissionControl(BaseConfigTest):
+    @classmethod
+    def setup_class(cls):
+        config = {'admission_control': {'max_concurrent': 4,
+                                        'max_queue': 0,
+                                        'retry_after': 3,
+                                        'per_collection': {'max_concurrent': 1,
+                                                           'max_queue': 0}}}
+
+        super(TestAdmissionControl, cls).setup_class('config_test.yaml',
+                                                     include_non_frame=False,
+                                                     custom_config=config)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.app_non_frame = cls.app
+        super(TestAdmissionControl, cls).teardown_class()
+
+    def get_bulkhead(self, coll):
+        return self.app.admission.get_coll_bulkhead(coll)
+
+    def test_admitted(self):
+        resp = self.testapp.get('/pywb/20140127171238mp_/http://www.iana.org/')
+        assert resp.status_int == 200
+
+        # released once sent
+        assert self.get_bulkhead('pywb').get_stats()['active'] == 0
+        assert self.app.admission.global_bulkhead.get_stats()['active'] == 0
+
+    def test_collection_full(self):
+        bulkhead = self.get_bulkhead('pywb')
+        assert bulkhead.acquire()
+
+        try:
+            resp = self.testapp.get('/pywb/20140127171238mp_/http://www.iana.org/', status=503)
+            assert resp.headers['Retry-After'] == '3'
+
+            resp = self.testapp.get('/pywb/cdx?url=http://www.iana.org/', status=503)
+
+            # other collections and static files still served
+            resp = self.testapp.get('/pywb-cdxj/20140127171238mp_/http://www.iana.org/')
+            assert resp.status_int == 200
+
+            resp = self.testapp.get('/static/calendar.svg')
+            assert resp.status_int == 200
+
+        finally:
+            bulkhead.release()
+
+        resp = self.testapp.get('/pywb/20140127171238mp_/http://www.iana.org/')
+        assert resp.status_int == 200
+
+        stats = self.testapp.get('/_stats').json['admission_control']
+        assert stats['collections']['pywb']['rejected'] == 2
+        assert stats['collections']['pywb']['active'] == 0
+        assert stats['collections']['pywb-cdxj']['rejected'] == 0
+        assert stats['global']['max_concurrent'] == 4
+
+    def test_held_until_body_closed(self):
+        req = webtest.TestRequest.blank('/pywb/20140127171238mp_/http://www.iana.org/')
+
+        def start_response(status, headers, exc_info=None):
+            assert status.startswith('200')
+
+        body = self.app(req.environ, start_response)
+        assert self.get_bulkhead('pywb').get_stats()['active'] == 1
+
+        self.testapp.get('/pywb/20140127171238mp_/http://www.iana.org/', status=503)
+
+        assert b'www.iana.org' in b''.join(body)
+        body.close()
+
+        assert self.get_bulkhead('pywb').get_stats()['active'] == 0
+        assert self.app.admission.global_bulkhead.get_stats()['active'] == 0
+
+    def test_not_found_released(self):
+        self.testapp.get('/pywb/20140127171238mp_/http://not-exist.example.com/', status=404)
+        self.testapp.get('/not-a-coll/20140127171238mp_/http://www.iana.org/', status=404)
+
+        assert self.get_bulkhead('pywb').get_stats()['active'] == 0
+        assert self.get_bulkhead('not-a-coll') is None
+        assert self.app.admission.global_bulkhead.get_stats()['active'] == 0
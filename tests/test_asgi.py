@@ -0,0 +1,162 @@
+from .base_config_test import BaseConfigTest
+
+import base64
+import json
+import os
+import subprocess
+import sys
+
+from six.moves.urllib.parse import urlencode
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+CONFIG_FILE = os.path.join(ROOT_DIR, 'tests', 'config_test.yaml')
+
+
+# ============================================================================
+def run_asgi(config):
+    """ Run requests against the ASGI app in a new process, as the test
+    process is monkey-patched by gevent
+    """
+    config.setdefault('config_file', CONFIG_FILE)
+    config.setdefault('cwd', ROOT_DIR)
+
+    proc = subprocess.Popen([sys.executable, '-m', 'tests.asgi_driver'],
+                            cwd=ROOT_DIR,
+                            stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE)
+
+    out, _ = proc.communicate(json.dumps(config).encode('utf-8'), timeout=120)
+    assert proc.returncode == 0
+
+    # last line, after any output from the app
+    results = json.loads(out.rsplit(b'\n', 1)[-1].decode('utf-8'))
+
+    for resp in results['responses'] + results['concurrent']:
+        resp['body'] = base64.b64decode(resp['body'])
+        resp['headers'] = dict((name.lower(), value) for name, value in resp['headers'])
+
+    return results
+
+
+# ============================================================================
+class TestASGI(BaseConfigTest):
+    GET_URLS = ['/pywb/20140127171238mp_/http://www.iana.org/',
+                '/pywb/20140127171250id_/http://example.com/',
+                '/pywb/20140126200624mp_/http://www.iana.org/_css/2013.1/screen.css',
+                '/pywb/cdx?url=http://www.iana.org/&output=json',
+                '/pywb/timemap/link/http://www.iana.org/',
+                '/pywb/20140127171238mp_/http://www.iana.org/not-found',
+               ]
+
+    POST_URL = '/pywb/20140610001255mp_/http://httpbin.org/post?foo=bar'
+    POST_DATA = {'data': '^'}
+
+    LARGE_URL = '/pywb/20140126200826id_/http://www.iana.org/_css/2013.1/fonts/Inconsolata.otf'
+
+    @classmethod
+    def setup_class(cls):
+        super(TestASGI, cls).setup_class('config_test.yaml', include_non_frame=False)
+        cls.app_non_frame = cls.app
+
+        requests = [{'path': url} for url in cls.GET_URLS]
+
+        requests.append({'path': cls.POST_URL,
+                         'method': 'POST',
+                         'headers': [['Content-Type', 'application/x-www-form-urlencoded']],
+                         'body': base64.b64encode(urlencode(cls.POST_DATA).encode('utf-8')).decode('ascii')})
+
+        requests.append({'path': cls.LARGE_URL})
+
+        # one thread, a slow client reading a large response,
+        # concurrently with fast clients
+        concurrent = [{'path': cls.LARGE_URL, 'delay': 0.1}]
+        concurrent.extend({'path': cls.GET_URLS[1]} for i in range(3))
+
+        cls.results = run_asgi({'requests': requests,
+                                'concurrent': concurrent,
+                                'max_workers': 1})
+
+        cls.responses = cls.results['responses']
+
+    def test_not_monkey_patched(self):
+        assert self.results['patched'] is False
+
+    def test_same_as_wsgi(self):
+        for url, resp in zip(self.GET_URLS, self.responses):
+            expected = self.testapp.get(url, status='*')
+
+            assert resp['status'] == expected.status_int, url
+            assert resp['body'] == expected.body, url
+            assert resp['headers']['content-type'] == expected.headers['Content-Type'], url
+
+    def test_replay_html(self):
+        resp = self.responses[0]
+        assert resp['status'] == 200
+        assert b'wbinfo.timestamp = "20140127171238"' in resp['body']
+
+    def test_not_found(self):
+        assert self.responses[len(self.GET_URLS) - 1]['status'] == 404
+
+    def test_post(self):
+        resp = self.responses[len(self.GET_URLS)]
+        assert resp['status'] == 200
+        assert b'"data": "^"' in resp['body']
+
+    def test_streamed_body(self):
+        resp = self.responses[len(self.GET_URLS) + 1]
+        expected = self.testapp.get(self.LARGE_URL)
+
+        assert resp['status'] == 200
+        assert resp['body'] == expected.body
+        assert resp['num_chunks'] > 1
+        assert resp['more_body'][-1] is False
+        assert all(resp['more_body'][:-1])
+
+    def test_slow_client_not_blocking(self):
+        slow = self.results['concurrent'][0]
+        fast = self.results['concurrent'][1:]
+
+        assert slow['status'] == 200
+        assert slow['num_chunks'] > 1
+        assert all(resp['status'] == 200 for resp in fast)
+
+        # with one thread, fast clients finish while slow client is still reading
+        assert all(resp['finished'] < slow['finished'] for resp in fast)
+
+    def test_lifespan(self):
+        assert self.results['lifespan'] == ['lifespan.startup.complete',
+                                            'lifespan.shutdown.complete']
+
+
+# ============================================================================
+def test_make_environ():
+    from pywb.apps.asgiapp import ASGIApp
+
+    app = ASGIApp(app=lambda environ, start_response: [])
+    try:
+        environ = app.make_environ({'type': 'http',
+                                    'method': 'GET',
+                                    'path': '/pywb/http://example.com/é',
+                                    'raw_path': b'/pywb/http://example.com/%C3%A9',
+                                    'query_string': b'a=b',
+                                    'headers': [(b'host', b'localhost:8080'),
+                                                (b'content-type', b'text/plain'),
+                                                (b'accept', b'text/html'),
+                                                (b'accept', b'*/*')],
+                                    'server': ('localhost', 8080),
+                                    'scheme': 'https'}, b'body')
+    finally:
+        app.executor.shutdown()
+
+    assert environ['PATH_INFO'] == '/pywb/http://example.com/Ã©'
+    assert environ['REQUEST_URI'] == '/pywb/http://example.com/%C3%A9?a=b'
+    assert environ['QUERY_STRING'] == 'a=b'
+    assert environ['HTTP_HOST'] == 'localhost:8080'
+    assert environ['CONTENT_TYPE'] == 'text/plain'
+    assert environ['HTTP_ACCEPT'] == 'text/html,*/*'
+    assert environ['SERVER_PORT'] == '8080'
+    assert environ['wsgi.url_scheme'] == 'https'
+    assert environ['wsgi.input'].read() == b'body'
+    assert environ['CONTENT_LENGTH'] == '4'
@@ -1,4 +1,11 @@
 import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import requests
 from mock import patch
 
 import pytest
@@ -59,3 +66,110 @@ class TestProxyCLIConfig(CollsDirMixin, BaseTestClass):
         assert res.extra_config['collections'] == {'live': {'index': '$live'},
                                                    'all': '$all'}
 
+
+    def test_workers_cli_deferred_load(self):
+        res = wayback(['--workers', '2', '--record'])
+        assert res.application is None
+
+        port = get_free_port()
+
+        # first worker runs the recorder
+        res.worker_id = 0
+        res.recorder_port = port
+        app = res.load_app()
+        assert app.recorder is not None
+        assert app.recorder_path.startswith('http://localhost:{0}/'.format(port))
+        app.recorder.writer.close()
+
+        # other workers record through it
+        res.worker_id = 1
+        app = res.load_app()
+        assert app.recorder is None
+        assert app.recorder_path.startswith('http://localhost:{0}/'.format(port))
+
+
+# ============================================================================
+def get_free_port():
+    sock = socket.socket()
+    sock.bind(('localhost', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def get_child_pids(pid):
+    children = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+
+        try:
+            with open(os.path.join('/proc', name, 'stat')) as fh:
+                stat = fh.read()
+        except IOError:
+            continue
+
+        # ppid is the second field after the parenthesized command
+        if int(stat.rsplit(')', 1)[1].split()[1]) == pid:
+            children.append(int(name))
+
+    return sorted(children)
+
+
+def wait_for(func, timeout=30):
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            res = func()
+            if res:
+                return res
+        except Exception:
+            pass
+
+        time.sleep(0.2)
+
+    assert False, 'timed out'
+
+
+# ============================================================================
+@pytest.mark.skipif(not hasattr(os, 'fork') or not os.path.isdir('/proc'),
+                    reason='requires fork and /proc')
+class TestPreforkCLI(CollsDirMixin, BaseTestClass):
+    def test_prefork_workers(self):
+        port = get_free_port()
+        url = 'http://localhost:{0}/'.format(port)
+
+        proc = subprocess.Popen([sys.executable, '-m', 'pywb.apps.cli',
+                                 '--workers', '2', '-p', str(port), '-b', 'localhost'],
+                                cwd=self.root_dir)
+
+        try:
+            wait_for(lambda: requests.get(url).status_code == 200)
+
+            workers = get_child_pids(proc.pid)
+            assert len(workers) == 2
+
+            # killed worker is restarted
+            os.kill(workers[0], signal.SIGKILL)
+
+            def restarted():
+                pids = get_child_pids(proc.pid)
+                return len(pids) == 2 and workers[0] not in pids and pids
+
+            new_workers = wait_for(restarted)
+            assert workers[1] in new_workers
+
+            for i in range(4):
+                assert wait_for(lambda: requests.get(url).status_code == 200)
+
+            # all workers stopped with server
+            proc.send_signal(signal.SIGTERM)
+            assert proc.wait(timeout=20) == 0
+            assert get_child_pids(proc.pid) == []
+            for pid in new_workers:
+                assert not os.path.exists(os.path.join('/proc', str(pid)))
+
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
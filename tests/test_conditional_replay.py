@@ -0,0 +1,185 @@
+from .base_config_test import BaseConfigTest, fmod
+
+from mock import patch
+
+import os
+
+
+# ============================================================================
+class TestConditionalReplay(BaseConfigTest):
+    @classmethod
+    def setup_class(cls):
+        super(TestConditionalReplay, cls).setup_class('config_test.yaml',
+                                                      custom_config={'cache': 'exact'})
+
+    def get_rewriterapp(self, fmod):
+        return (self.app if fmod else self.app_non_frame).rewriterapp
+
+    def get_cond(self, url, fmod, headers, status=304):
+        # record not loaded if not modified
+        with patch.object(self.get_rewriterapp(fmod).loader, 'parse_record_stream',
+                          side_effect=AssertionError('record loaded')):
+            return self.get(url, fmod, headers=headers, status=status)
+
+    def test_validators(self, fmod):
+        resp = self.get('/pywb/20140127171238{0}/http://www.iana.org/', fmod)
+        assert resp.status_int == 200
+        assert resp.headers['ETag'].startswith('W/"')
+        assert resp.headers['Last-Modified'] == 'Mon, 27 Jan 2014 17:12:38 GMT'
+        assert resp.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+
+        # not the same response in other mode or other prefix
+        resp2 = self.get('/pywb/20140127171238{0}/http://www.iana.org/', fmod,
+                         extra_environ={'SCRIPT_NAME': '/wayback'})
+        assert resp2.headers['ETag'] != resp.headers['ETag']
+
+        resp2 = self.get('/pywb/20140127171238id_/http://www.iana.org/', fmod)
+        assert resp2.headers['ETag'].startswith('"')
+        assert resp2.headers['ETag'] != resp.headers['ETag']
+
+    def test_if_none_match(self, fmod):
+        url = '/pywb/20140127171238{0}/http://www.iana.org/'
+        etag = self.get(url, fmod).headers['ETag']
+
+        resp = self.get_cond(url, fmod, {'If-None-Match': etag})
+        assert resp.body == b''
+        assert resp.headers['ETag'] == etag
+        assert resp.headers['Last-Modified'] == 'Mon, 27 Jan 2014 17:12:38 GMT'
+        assert resp.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+
+        # weak comparison, in list
+        self.get_cond(url, fmod, {'If-None-Match': '"other", ' + etag[2:]})
+
+        self.get_cond(url, fmod, {'If-None-Match': '*'})
+
+        resp = self.get(url, fmod, headers={'If-None-Match': '"other"'})
+        assert resp.status_int == 200
+        assert resp.headers['ETag'] == etag
+
+        # takes precedence over If-Modified-Since
+        resp = self.get(url, fmod, headers={'If-None-Match': '"other"',
+                                            'If-Modified-Since': 'Tue, 28 Jan 2014 00:00:00 GMT'})
+        assert resp.status_int == 200
+
+    def test_if_none_match_id(self, fmod):
+        url = '/pywb/20140127171238id_/http://www.iana.org/'
+        etag = self.get(url, fmod).headers['ETag']
+
+        resp = self.get_cond(url, fmod, {'If-None-Match': etag})
+        assert resp.headers['ETag'] == etag
+
+    def test_etag_id_accept_encoding(self, fmod):
+        url = '/pywb/20140127171238id_/http://www.iana.org/'
+        etag = self.get(url, fmod).headers['ETag']
+
+        # stored encoding may be kept, not the same representation
+        gzip_etag = self.get(url, fmod, headers={'Accept-Encoding': 'gzip, deflate'}).headers['ETag']
+        assert gzip_etag.startswith('"')
+        assert gzip_etag != etag
+
+        resp = self.get(url, fmod, headers={'If-None-Match': gzip_etag})
+        assert resp.status_int == 200
+        assert resp.headers['ETag'] == etag
+
+        # only codings accepted or not considered
+        self.get_cond(url, fmod, {'Accept-Encoding': 'deflate;q=0.5, gzip',
+                                  'If-None-Match': gzip_etag})
+
+        # weak etag unchanged
+        url = '/pywb/20140127171238{0}/http://www.iana.org/'
+        etag = self.get(url, fmod).headers['ETag']
+        assert self.get(url, fmod, headers={'Accept-Encoding': 'gzip'}).headers['ETag'] == etag
+
+    def test_if_modified_since(self, fmod):
+        url = '/pywb/20140127171238{0}/http://www.iana.org/'
+
+        self.get_cond(url, fmod, {'If-Modified-Since': 'Mon, 27 Jan 2014 17:12:38 GMT'})
+
+        resp = self.get(url, fmod, headers={'If-Modified-Since': 'Mon, 27 Jan 2014 17:12:37 GMT'})
+        assert resp.status_int == 200
+
+        resp = self.get(url, fmod, headers={'If-Modified-Since': 'invalid'})
+        assert resp.status_int == 200
+
+    def test_inexact_timestamp(self, fmod):
+        url = '/pywb/2014{0}/http://www.iana.org/'
+        resp = self.get(url, fmod)
+        assert resp.headers['Last-Modified'] == 'Mon, 27 Jan 2014 17:12:38 GMT'
+        assert 'Cache-Control' not in resp.headers
+
+        # closest capture may change, only checked for exact timestamp
+        resp = self.get(url, fmod, headers={'If-Modified-Since': 'Tue, 28 Jan 2014 00:00:00 GMT'})
+        assert resp.status_int == 200
+
+        self.get_cond(url, fmod, {'If-None-Match': resp.headers['ETag']})
+
+        # id_ responses always cacheable
+        resp = self.get('/pywb/2014id_/http://www.iana.org/', fmod)
+        assert resp.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+
+    def test_no_validators_range(self, fmod):
+        resp = self.get('/pywb/20140127171200id_/http://example.com/', fmod,
+                        headers={'Range': 'bytes=0-10', 'If-None-Match': '*'})
+        assert resp.status_int == 206
+        assert 'ETag' not in resp.headers
+
+    def test_no_validators_post(self, fmod):
+        resp = self.post('/pywb/20140127171238{0}/http://www.iana.org/', fmod, {'foo': 'bar'},
+                         headers={'If-None-Match': '*'}, status='*')
+        assert resp.status_int != 304
+
+    def test_etag_changed_templates_metadata(self, fmod):
+        url = '/pywb/20140127171238{0}/http://www.iana.org/'
+        rewriterapp = self.get_rewriterapp(fmod)
+        etag = self.get(url, fmod).headers['ETag']
+
+        with patch.object(rewriterapp, 'get_templates_mtime', return_value=1.0):
+            resp = self.get(url, fmod, headers={'If-None-Match': etag})
+            assert resp.status_int == 200
+            assert resp.headers['ETag'] != etag
+
+        app = self.app if fmod else self.app_non_frame
+        coll_config = app.get_coll_config('pywb')
+        coll_config['metadata'] = {'title': 'Changed'}
+
+        with patch.object(app, 'get_coll_config', return_value=coll_config):
+            resp = self.get(url, fmod, headers={'If-None-Match': etag})
+            assert resp.status_int == 200
+            assert resp.headers['ETag'] != etag
+
+        self.get_cond(url, fmod, {'If-None-Match': etag})
+
+    def test_templates_mtime(self, tmpdir):
+        rewriterapp = self.get_rewriterapp(True)
+        environ = {'pywb.templates_dir': str(tmpdir)}
+        mtime = rewriterapp.get_templates_mtime(environ)
+
+        tmpdir.join('banner.html').write('banner')
+        os.utime(str(tmpdir.join('banner.html')), (mtime + 10, mtime + 10))
+
+        # cached until check interval passed
+        assert rewriterapp.get_templates_mtime(environ) == mtime
+
+        with patch.object(rewriterapp, 'TEMPLATES_CHECK_INTERVAL', 0):
+            assert rewriterapp.get_templates_mtime(environ) == mtime + 10
+
+    def test_etag_version(self):
+        rewriterapp = self.get_rewriterapp(True)
+        with patch.dict(rewriterapp.config, {'etag_version': '2'}):
+            assert rewriterapp._init_etag_version() != rewriterapp.etag_version
+
+
+# ============================================================================
+class TestConditionalReplayDisabled(BaseConfigTest):
+    @classmethod
+    def setup_class(cls):
+        super(TestConditionalReplayDisabled, cls).setup_class('config_test.yaml',
+                                                              custom_config={'enable_validators': False})
+
+    def test_no_validators(self, fmod):
+        resp = self.get('/pywb/20140127171238{0}/http://www.iana.org/', fmod,
+                        headers={'If-None-Match': '*'})
+        assert resp.status_int == 200
+        assert 'ETag' not in resp.headers
+        assert 'Last-Modified' not in resp.headers
+        assert 'Cache-Control' not in resp.headers
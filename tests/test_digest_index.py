@@ -0,0 +1,64 @@
+from .base_config_test import BaseConfigTest, CollsDirMixin, fmod
+from pywb.manager.manager import main as manager
+
+from pywb.warcserver.index.cdxobject import CDXObject
+from pywb import get_test_dir
+import os
+import json
+
+
+# ============================================================================
+class TestDigestIndexAutoColls(CollsDirMixin, BaseConfigTest):
+    @classmethod
+    def setup_class(cls):
+        super(TestDigestIndexAutoColls, cls).setup_class('config_test.yaml')
+
+        manager(['init', 'testdigest'])
+
+        cls.index_dir = os.path.join(cls.root_dir, '_test_colls', 'testdigest', 'indexes')
+
+    def _get_sample_warc(self, name):
+        return os.path.join(get_test_dir(), 'warcs', name)
+
+    def test_add_with_digest_index(self):
+        manager(['add', '--digest-index', 'testdigest',
+                 self._get_sample_warc('example-url-agnostic-revisit.warc.gz')])
+
+        manager(['add', 'testdigest',
+                 self._get_sample_warc('example-url-agnostic-orig.warc.gz')])
+
+        assert sorted(os.listdir(self.index_dir)) == ['index.cdxj', 'index.digest']
+
+        # existing digest index updated, even without --digest-index
+        with open(os.path.join(self.index_dir, 'index.digest'), 'rt') as fh:
+            lines = fh.readlines()
+
+        assert lines == ['B2LTWWPUOYAH7UIPQ7ZUPQ4VMBSVC36A\texample-url-agnostic-orig.warc.gz\t353\t1001\ttext/html\t200\n']
+
+    def test_resolve_revisit_cdx(self):
+        res = self.testapp.get('/testdigest/cdx?url=example.com/&resolveRevisits=true&output=json')
+        cdx = json.loads(res.text)
+
+        assert cdx['orig.filename'] == 'example-url-agnostic-orig.warc.gz'
+        assert cdx['orig.offset'] == '353'
+        assert cdx['orig.length'] == '1001'
+
+    def test_reindex_resolve_revisits(self):
+        manager(['reindex', '--resolve-revisits', 'testdigest'])
+
+        with open(os.path.join(self.index_dir, 'index.cdxj'), 'rb') as fh:
+            cdxs = [CDXObject(line) for line in fh]
+
+        assert cdxs[0]['mime'] == 'warc/revisit'
+        assert cdxs[0]['orig.filename'] == 'example-url-agnostic-orig.warc.gz'
+
+        res = self.testapp.get('/testdigest/cdx?url=example.com/&resolveRevisits=true&output=json')
+        cdx = json.loads(res.text)
+
+        assert cdx['orig.offset'] == '353'
+        assert cdx['orig.length'] == '1001'
+
+    def test_replay_url_agnostic_revisit(self, fmod):
+        resp = self.get('/testdigest/20130729195151{0}/http://test@example.com/', fmod)
+        assert resp.status_int == 200
+        assert 'Example Domain' in resp.text
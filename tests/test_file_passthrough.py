@@ -0,0 +1,124 @@
+from .base_config_test import BaseConfigTest, fmod
+
+from pywb.utils.io import FileRangeReader
+
+from mock import patch
+import os
+
+
+# ============================================================================
+class FileWrapper(object):
+    wrapped = []
+
+    def __init__(self, filelike, block_size=8192):
+        self.filelike = filelike
+        self.block_size = block_size
+        self.wrapped.append(filelike)
+
+    def __iter__(self):
+        return iter(lambda: self.filelike.read(self.block_size), b'')
+
+    def close(self):
+        self.filelike.close()
+
+
+# ============================================================================
+class TestFilePassthrough(BaseConfigTest):
+    @classmethod
+    def setup_class(cls):
+        super(TestFilePassthrough, cls).setup_class('config_test.yaml')
+
+    def setup_method(self):
+        FileWrapper.wrapped = []
+
+    def get_id(self, url, headers=None):
+        return self.testapp.get('/pywb/' + url, headers=headers,
+                                extra_environ={'wsgi.file_wrapper': FileWrapper})
+
+    def test_id_uncompressed_file_wrapper(self):
+        resp = self.get_id('20140103030321id_/http://example.com/?example=2')
+
+        assert resp.status_int == 200
+        assert resp.content_length == 1270
+        assert len(resp.body) == 1270
+        assert resp.body.startswith(b'<!doctype html>')
+        assert resp.body.endswith(b'</html>\n')
+
+        assert len(FileWrapper.wrapped) == 1
+        assert isinstance(FileWrapper.wrapped[0], FileRangeReader)
+
+    def test_id_uncompressed_range_file_wrapper(self):
+        full = self.get_id('20140103030321id_/http://example.com/?example=2').body
+        FileWrapper.wrapped = []
+
+        resp = self.get_id('20140103030321id_/http://example.com/?example=2',
+                           headers=[('Range', 'bytes=10-200')])
+
+        assert resp.status_int == 206
+        assert resp.headers['Content-Range'] == 'bytes 10-200/1270'
+        assert resp.content_length == 191
+        assert resp.body == full[10:201]
+
+        assert len(FileWrapper.wrapped) == 1
+
+    def test_range_uncompressed_rewritten_mod(self, fmod):
+        resp = self.get('/pywb/20140103030321{0}/http://example.com/?example=2', fmod,
+                        headers=[('Range', 'bytes=100-')])
+
+        assert resp.status_int == 206
+        assert resp.headers['Content-Range'] == 'bytes 100-1269/1270'
+        assert resp.content_length == 1170
+        assert 'wombat.js' not in resp.text
+
+    def test_id_compressed_no_file_wrapper(self):
+        resp = self.get_id('20140127171250id_/http://example.com/')
+
+        assert resp.status_int == 200
+        assert resp.content_length == 1270
+        assert FileWrapper.wrapped == []
+
+    def test_id_no_file_wrapper_available(self):
+        resp = self.testapp.get('/pywb/20140103030321id_/http://example.com/?example=2')
+
+        assert resp.status_int == 200
+        assert len(resp.body) == 1270
+
+    def test_id_passthrough_disabled(self):
+        self.app.rewriterapp.file_passthrough = False
+        try:
+            resp = self.get_id('20140103030321id_/http://example.com/?example=2')
+        finally:
+            self.app.rewriterapp.file_passthrough = True
+
+        assert resp.status_int == 200
+        assert len(resp.body) == 1270
+        assert FileWrapper.wrapped == []
+
+    def test_payload_location_not_requested_ignored(self):
+        do_req = self.app.rewriterapp._do_req
+
+        def do_req_with_location(*args, **kwargs):
+            r = do_req(*args, **kwargs)
+            r.headers['Warcserver-Payload-Location'] = '0 10 ' + os.path.abspath(__file__)
+            return r
+
+        self.app.rewriterapp.file_passthrough = False
+        try:
+            with patch.object(self.app.rewriterapp, '_do_req', do_req_with_location):
+                resp = self.get_id('20140103030321id_/http://example.com/?example=2')
+        finally:
+            self.app.rewriterapp.file_passthrough = True
+
+        assert resp.status_int == 200
+        assert len(resp.body) == 1270
+        assert resp.body.startswith(b'<!doctype html>')
+        assert FileWrapper.wrapped == []
+
+    def test_id_no_file_wrapper_uwsgi(self):
+        resp = self.testapp.get('/pywb/20140103030321id_/http://example.com/?example=2',
+                                extra_environ={'wsgi.file_wrapper': FileWrapper,
+                                               'uwsgi.version': b'2.0.21'})
+
+        assert resp.status_int == 200
+        assert len(resp.body) == 1270
+        assert FileWrapper.wrapped == []
@@ -0,0 +1,127 @@
+from .base_config_test import BaseConfigTest, fmod
+
+from mock import patch
+
+import requests
+
+from pywb.utils.io import IterReader
+
+
+orig_post = requests.post
+
+
+# ============================================================================
+class TestInProcessWarcServer(BaseConfigTest):
+    http_posts = []
+
+    @classmethod
+    def setup_class(cls):
+        super(TestInProcessWarcServer, cls).setup_class('config_test.yaml')
+
+    def setup_method(self):
+        TestInProcessWarcServer.http_posts = []
+
+    @staticmethod
+    def mock_post(url, *args, **kwargs):
+        TestInProcessWarcServer.http_posts.append(url)
+        return orig_post(url, *args, **kwargs)
+
+    def get_both(self, url, fmod, **kwargs):
+        """ Replay url in-process and over HTTP, ensuring only the latter uses HTTP
+        """
+        app = self.app if fmod else self.app_non_frame
+
+        with patch('pywb.apps.rewriterapp.requests.post', self.mock_post):
+            resp = self.get(url, fmod, **kwargs)
+            assert self.http_posts == []
+
+            client = app.rewriterapp.inprocess_client
+            app.rewriterapp.inprocess_client = None
+            try:
+                http_resp = self.get(url, fmod, **kwargs)
+            finally:
+                app.rewriterapp.inprocess_client = client
+
+            assert len(self.http_posts) == 1
+
+        return resp, http_resp
+
+    def assert_same(self, resp, http_resp):
+        assert resp.status == http_resp.status
+        assert resp.headers == http_resp.headers
+        assert resp.body == http_resp.body
+
+    def test_replay(self, fmod):
+        resp, http_resp = self.get_both('/pywb/20140127171238{0}/http://www.iana.org/', fmod)
+
+        self._assert_basic_html(resp)
+        assert '"20140127171238"' in resp.text
+
+        self.assert_same(resp, http_resp)
+
+    def test_replay_id(self):
+        resp, http_resp = self.get_both('/pywb/20140127171250{0}/http://example.com/', 'id_')
+
+        assert resp.status_int == 200
+        assert resp.content_length == 1270
+
+        self.assert_same(resp, http_resp)
+
+    def test_replay_revisit(self, fmod):
+        resp, http_resp = self.get_both('/pywb/20140127171251{0}/http://example.com/', fmod)
+
+        assert resp.status_int == 200
+        assert '"20140127171251"' in resp.text
+
+        self.assert_same(resp, http_resp)
+
+    def test_replay_range(self, fmod):
+        resp, http_resp = self.get_both('/pywb/20140127171250{0}/http://example.com/', fmod,
+                                        headers=[('Range', 'bytes=10-200')])
+
+        assert resp.status_int == 206
+        assert resp.content_length == 191
+
+        self.assert_same(resp, http_resp)
+
+    def test_replay_not_found(self, fmod):
+        resp, http_resp = self.get_both('/pywb/20140127171238{0}/http://not-exist.example.com/', fmod,
+                                        status=404)
+
+        assert resp.status_int == 404
+        assert resp.body == http_resp.body
+
+    def test_inprocess_disabled(self):
+        app, testapp = self.get_test_app('config_test.yaml', {'warcserver_inprocess': False})
+        assert app.rewriterapp.inprocess_client is None
+
+        with patch('pywb.apps.rewriterapp.requests.post', self.mock_post):
+            resp = testapp.get('/pywb/20140127171250id_/http://example.com/')
+
+        assert resp.status_int == 200
+        assert len(self.http_posts) == 1
+
+
+# ============================================================================
+def test_iter_reader():
+    closed = []
+
+    def gen():
+        try:
+            yield b'abc'
+            yield b''
+            yield b'defgh'
+        finally:
+            closed.append(True)
+
+    reader = IterReader(gen())
+    assert reader.read(2) == b'ab'
+    assert reader.read(5) == b'c'
+    assert reader.read(3) == b'def'
+    assert reader.read() == b'gh'
+    assert reader.read(1) == b''
+
+    reader = IterReader(gen())
+    assert reader.read(1) == b'a'
+    reader.close()
+    assert closed == [True, True]
@@ -2,16 +2,16 @@ from .base_config_test import BaseConfigTest, fmod
 from pywb.warcserver.warcserver import BaseWarcServer
 from mock import patch
 
-orig_call = BaseWarcServer.__call__
+orig_dispatch = BaseWarcServer.dispatch
 
 # ============================================================================
-def mock_call(self, environ, start_response):
+def mock_dispatch(self, environ):
     TestReplayRange.recorder_skip = environ.get('HTTP_RECORDER_SKIP')
-    return orig_call(self, environ, start_response)
+    return orig_dispatch(self, environ)
 
 
 # ============================================================================
-@patch('pywb.warcserver.basewarcserver.BaseWarcServer.__call__', mock_call)
+@patch('pywb.warcserver.basewarcserver.BaseWarcServer.dispatch', mock_dispatch)
 class TestReplayRange(BaseConfigTest):
     recorder_skip = None
     recorder_range = None
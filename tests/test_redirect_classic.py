@@ -83,3 +83,27 @@ class TestRedirectClassic(BaseConfigTest):
         assert resp.content_type == 'text/x-ndjson'
         assert len(resp.text.rstrip().split('\n')) == 10
 
+
+    def test_page_view_resolved_once(self):
+        resolution_cache = self.app.warcserver.resolution_cache
+        resolution_cache.clear()
+        before = resolution_cache.get_stats()
+
+        # top frame
+        resp = self.testapp.get('/pywb/20140127171200/http://www.iana.org/')
+        assert resp.status_int == 200
+        assert '"20140127171200"' in resp.text
+
+        # framed content, redirect to exact timestamp
+        resp = self.testapp.get('/pywb/20140127171200mp_/http://www.iana.org/')
+        assert resp.status_int == 307
+        assert resp.headers['Location'].endswith('/pywb/20140127171238mp_/http://www.iana.org/')
+
+        resp = resp.follow()
+        self._assert_basic_html(resp)
+        assert '"20140127171238"' in resp.text
+
+        # one index lookup for the page view
+        stats = resolution_cache.get_stats()
+        assert stats['misses'] - before['misses'] == 1
+        assert stats['hits'] - before['hits'] == 2
@@ -0,0 +1,191 @@
+from .base_config_test import BaseConfigTest
+
+import json
+import os
+import shutil
+import tempfile
+
+from pywb.utils.geventserver import GeventServer
+from pywb.warcserver.warcserver import WarcServer
+from pywb.warcserver.index.shardedindex import ShardIndexSource, ShardedIndexAggregator
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+SHARD_KEYS = [None, 'org,iana)/_img', 'org,iana)/domains', None]
+
+
+# ============================================================================
+class PathTrackingApp(object):
+    def __init__(self, app):
+        self.app = app
+        self.paths = []
+
+    def __call__(self, environ, start_response):
+        self.paths.append(environ.get('PATH_INFO'))
+        return self.app(environ, start_response)
+
+
+# ============================================================================
+class TestShardedIndex(BaseConfigTest):
+    @classmethod
+    def setup_class(cls):
+        cls.shard_dir = tempfile.mkdtemp(prefix='shards')
+
+        with open(os.path.join(ROOT_DIR, 'sample_archive', 'cdxj', 'iana.cdxj'), 'rb') as fh:
+            cls.all_lines = [line for line in fh.read().split(b'\n') if line]
+
+        archive_paths = os.path.join(ROOT_DIR, 'sample_archive', 'warcs') + '/'
+
+        cls.shards = []
+        cls.servers = []
+        shards_config = []
+
+        for i in range(len(SHARD_KEYS) - 1):
+            start = SHARD_KEYS[i]
+            end = SHARD_KEYS[i + 1]
+
+            filename = os.path.join(cls.shard_dir, 'shard-{0}.cdxj'.format(i))
+            with open(filename, 'wb') as fh:
+                for line in cls.all_lines:
+                    key = line.split(b' ', 1)[0].decode('utf-8')
+                    if (not start or key >= start) and (not end or key < end):
+                        fh.write(line + b'\n')
+
+            app = PathTrackingApp(WarcServer(config_file=None,
+                                             custom_config={'collections': {
+                                                 'iana': {'index': filename,
+                                                          'archive_paths': archive_paths}}}))
+
+            server = GeventServer(app, port=0)
+            cls.shards.append(app)
+            cls.servers.append(server)
+
+            shard = {'url': 'http://localhost:{0}/iana'.format(server.port)}
+            if start:
+                shard['start'] = start
+            if end:
+                shard['end'] = end
+
+            shards_config.append(shard)
+
+        custom_config = {'collections': {'sharded': {'shards': shards_config},
+                                         'sharded-local': {'shards': shards_config,
+                                                           'archive_paths': archive_paths}}}
+
+        super(TestShardedIndex, cls).setup_class('config_test.yaml',
+                                                 include_non_frame=False,
+                                                 custom_config=custom_config)
+
+        cls.app_non_frame = cls.app
+
+    @classmethod
+    def teardown_class(cls):
+        for server in cls.servers:
+            server.stop()
+
+        shutil.rmtree(cls.shard_dir)
+        super(TestShardedIndex, cls).teardown_class()
+
+    def setup_method(self):
+        for app in self.shards:
+            app.paths = []
+
+    def shard_paths(self):
+        return [app.paths for app in self.shards]
+
+    def test_exact_replay_owning_shard_only(self):
+        resp = self.testapp.get('/sharded/20140126200624mp_/http://www.iana.org/')
+        self._assert_basic_html(resp)
+        assert '"20140126200624"' in resp.text
+
+        assert self.shard_paths() == [['/iana/index', '/iana/resource'], [], []]
+
+    def test_exact_replay_last_shard(self):
+        resp = self.testapp.get('/sharded/20140126200624id_/http://www.iana.org/domains/root/db/')
+        assert resp.status_int == 200
+        assert resp.content_type == 'text/html'
+
+        assert self.shard_paths() == [[], [], ['/iana/index', '/iana/resource']]
+
+    def test_exact_replay_shard_boundary(self):
+        resp = self.testapp.get('/sharded/20140126201239id_/http://www.iana.org/_img/2013.1/icann-logo.svg')
+        assert resp.status_int == 200
+        assert resp.content_type == 'image/svg+xml'
+
+        assert self.shard_paths() == [[], ['/iana/index', '/iana/resource'], []]
+
+    def test_replay_shared_archive_paths(self):
+        resp = self.testapp.get('/sharded-local/20140126200624mp_/http://www.iana.org/')
+        self._assert_basic_html(resp)
+
+        # resource loaded from local archive paths, not from shard
+        assert self.shard_paths() == [['/iana/index'], [], []]
+
+    def query(self, url, field):
+        resp = self.testapp.get('/sharded/cdx?output=json&url=' + url)
+        return [json.loads(line)[field] for line in resp.text.rstrip('\n').split('\n')]
+
+    def test_prefix_query_merged_in_key_order(self):
+        resp = self.testapp.get('/sharded/cdx?url=iana.org/*&output=json')
+        lines = [json.loads(line) for line in resp.text.rstrip('\n').split('\n')]
+
+        expected = [line.decode('utf-8').split(' ', 2)[:2] for line in self.all_lines]
+        assert [[cdx['urlkey'], cdx['timestamp']] for cdx in lines] == expected
+
+        assert all(paths == ['/iana/index'] for paths in self.shard_paths())
+
+    def test_prefix_query_overlapping_shards_only(self):
+        lines = self.query('iana.org/_j*', 'urlkey')
+        assert len(lines) == 32
+        assert set(lines) == set(['org,iana)/_js/2013.1/iana.js', 'org,iana)/_js/2013.1/jquery.js'])
+
+        assert self.shard_paths() == [[], ['/iana/index'], []]
+
+        self.setup_method()
+
+        lines = self.query('iana.org/d*', 'urlkey')
+        assert lines[0] == 'org,iana)/dnssec'
+        assert lines[2] == 'org,iana)/domains'
+        assert len(lines) == 11
+
+        assert self.shard_paths() == [[], ['/iana/index'], ['/iana/index']]
+
+    def test_closest_exact_query(self):
+        lines = self.query('http://www.iana.org/_css/2013.1/print.css&closest=20140126201000&limit=2', 'timestamp')
+        assert lines == ['20140126200929', '20140126200912']
+
+        assert self.shard_paths() == [['/iana/index'], [], []]
+
+
+# ============================================================================
+def test_shard_overlaps():
+    first = ShardIndexSource('http://localhost:1/coll/', end='org,iana)/_img')
+    middle = ShardIndexSource('http://localhost:2/coll', start='org,iana)/_img', end='org,iana)/domains')
+    last = ShardIndexSource('http://localhost:3/coll', start='org,iana)/domains')
+
+    assert first.api_url == 'http://localhost:1/coll/index?url={url}'
+
+    def overlapping(key, end_key):
+        return [shard.overlaps(key, end_key) for shard in (first, middle, last)]
+
+    assert overlapping(b'org,iana)/', b'org,iana)/!') == [True, False, False]
+    assert overlapping(b'org,iana)/_img', b'org,iana)/_img!') == [False, True, False]
+    assert overlapping(b'org,iana)/domains', b'org,iana)/domains!') == [False, False, True]
+    assert overlapping(b'org,iana)/', b'org,iana)0') == [True, True, True]
+    assert overlapping(b'com,example)/', b'com,example)0') == [True, False, False]
+    assert overlapping(b'org,iana)/_css', b'org,iana)/_cst') == [True, False, False]
+
+
+def test_sharded_from_config():
+    agg = ShardedIndexAggregator.init_from_config([{'url': 'http://localhost:1/coll', 'end': 'm'},
+                                                   {'url': 'http://localhost:2/coll', 'start': 'm',
+                                                    'name': 'second'}],
+                                                  coll='coll', timeout=2)
+
+    assert sorted(agg.sources.keys()) == ['second', 'shard-0']
+    assert agg.timeout == 2
+    assert agg._get_coll('shard-0') == 'coll'
+
+    params = {'key': b'n', 'end_key': b'n!'}
+    assert [name for name, source in agg._iter_sources(params)] == ['second']
@@ -0,0 +1,179 @@
+from .base_config_test import BaseConfigTest
+
+import os
+import time
+
+from pywb.apps.upstreampool import UpstreamPool
+from pywb.utils.geventserver import GeventServer
+from pywb.warcserver.warcserver import WarcServer
+
+
+# ============================================================================
+class TrackingApp(object):
+    def __init__(self, app):
+        self.app = app
+        self.remote_ports = []
+        self.delay = 0
+
+    def __call__(self, environ, start_response):
+        self.remote_ports.append(environ.get('REMOTE_PORT'))
+        if self.delay:
+            time.sleep(self.delay)
+
+        return self.app(environ, start_response)
+
+
+# ============================================================================
+class TestUpstreamPool(BaseConfigTest):
+    NUM_NODES = 3
+
+    @classmethod
+    def setup_class(cls):
+        config_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'config_test.yaml')
+
+        cls.nodes = []
+        cls.servers = []
+        for _ in range(cls.NUM_NODES):
+            app = TrackingApp(WarcServer(config_file=config_file))
+            cls.nodes.append(app)
+            cls.servers.append(GeventServer(app, port=0))
+
+        urls = ['http://localhost:{0}/'.format(server.port) for server in cls.servers]
+
+        super(TestUpstreamPool, cls).setup_class('config_test.yaml',
+                                                 include_non_frame=False,
+                                                 custom_config={'warcserver_upstream':
+                                                                {'urls': urls,
+                                                                 'max_failures': 1,
+                                                                 'health_check_interval': 0}})
+
+        cls.pool = cls.app.upstream_pool
+        cls.app_non_frame = cls.app
+
+    @classmethod
+    def teardown_class(cls):
+        cls.pool.close()
+        for server in cls.servers:
+            server.stop()
+
+        super(TestUpstreamPool, cls).teardown_class()
+
+    def setup_method(self):
+        for app in self.nodes:
+            app.remote_ports = []
+            app.delay = 0
+
+        for node in self.pool.nodes:
+            self.pool._readmit(node)
+
+        self.pool.eject_time = 30
+
+    def total_requests(self):
+        return sum(len(app.remote_ports) for app in self.nodes)
+
+    def test_pool_config(self):
+        assert self.app.rewriterapp.upstream_pool is self.pool
+        assert self.app.rewriterapp.inprocess_client is None
+        assert self.app.rewriterapp.file_passthrough is False
+        assert len(self.pool.nodes) == self.NUM_NODES
+
+    def test_replay_each_node(self):
+        for i in range(self.NUM_NODES):
+            resp = self.testapp.get('/pywb/20140127171238mp_/http://www.iana.org/')
+            self._assert_basic_html(resp)
+
+        # new nodes selected first
+        assert [len(app.remote_ports) for app in self.nodes] == [1] * self.NUM_NODES
+
+    def test_keep_alive(self):
+        for i in range(4):
+            resp = self.testapp.get('/pywb/20140127171250id_/http://example.com/')
+            assert resp.status_int == 200
+
+        assert max(len(app.remote_ports) for app in self.nodes) > 1
+
+        # same connection for each node
+        for app in self.nodes:
+            assert len(set(app.remote_ports)) <= 1
+
+    def test_cdx_and_timemap(self):
+        resp = self.testapp.get('/pywb/cdx?url=http://www.iana.org/&output=json')
+        assert len(resp.text.strip().split('\n')) == 3
+
+        resp = self.testapp.get('/pywb/timemap/link/http://www.iana.org/')
+        assert 'rel="memento"' in resp.text
+
+        assert self.total_requests() == 2
+
+    def test_least_outstanding(self):
+        self.pool.nodes[0].outstanding = 2
+        self.pool.nodes[1].outstanding = 1
+        self.pool.nodes[2].outstanding = 3
+        try:
+            assert self.pool.select() is self.pool.nodes[1]
+            assert self.pool.select(exclude=[self.pool.nodes[1]]) is self.pool.nodes[0]
+        finally:
+            for node in self.pool.nodes:
+                node.outstanding = 0
+
+    def test_failed_node_ejected_and_retried(self):
+        server = self.servers[0]
+        port = server.port
+        server.stop()
+
+        # drop existing keep-alive connections, still served after stop()
+        self.pool.nodes[0].session.close()
+
+        try:
+            for i in range(3):
+                resp = self.testapp.get('/pywb/20140127171250id_/http://example.com/')
+                assert resp.status_int == 200
+
+            assert self.pool.nodes[0].ejected
+            assert self.nodes[0].remote_ports == []
+            assert self.total_requests() == 3
+
+            # still down, remains ejected
+            self.pool.eject_time = 0
+            self.pool.check_health()
+            assert self.pool.nodes[0].ejected
+
+        finally:
+            self.servers[0] = GeventServer(self.nodes[0], port=port)
+
+        self.pool.check_health()
+        assert not self.pool.nodes[0].ejected
+
+        resp = self.testapp.get('/pywb/20140127171250id_/http://example.com/')
+        assert len(self.nodes[0].remote_ports) == 2
+
+    def test_slow_node_ejected(self):
+        self.pool.MIN_SLOW_TIME = 0.05
+        self.nodes[2].delay = 0.3
+        try:
+            for i in range(self.NUM_NODES + 2):
+                self.testapp.get('/pywb/20140127171250id_/http://example.com/')
+        finally:
+            del self.pool.MIN_SLOW_TIME
+
+        assert self.pool.nodes[2].ejected
+        assert not self.pool.nodes[0].ejected
+        assert not self.pool.nodes[1].ejected
+        assert len(self.nodes[2].remote_ports) == 1
+
+
+# ============================================================================
+def test_pool_from_config():
+    assert UpstreamPool.from_config(None) is None
+
+    pool = UpstreamPool.from_config('http://localhost:8070', prefix='http://localhost:1/')
+    assert pool.nodes[0].url == 'http://localhost:8070/'
+    assert pool.handles('http://localhost:1/pywb/index')
+    assert not pool.handles('http://localhost:2/pywb/index')
+    pool.close()
+
+    pool = UpstreamPool.from_config({'urls': ['http://a/', 'http://b/'], 'timeout': 5,
+                                     'health_check_interval': 0})
+    assert [node.url for node in pool.nodes] == ['http://a/', 'http://b/']
+    assert pool.timeout == 5
+    assert pool.prefix == 'http://a/'
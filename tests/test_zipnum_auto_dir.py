@@ -6,6 +6,7 @@ import shutil
 from pywb import get_test_dir
 import os
 import json
+import pytest
 
 
 # ============================================================================
@@ -56,3 +57,67 @@ class TestZipnumAutoDir(CollsDirMixin, BaseConfigTest):
 
 
 
+
+# ============================================================================
+class TestZipnumBuildAutoDir(CollsDirMixin, BaseConfigTest):
+    @classmethod
+    def setup_class(cls):
+        super(TestZipnumBuildAutoDir, cls).setup_class('config_test.yaml')
+
+        manager(['init', 'testbuild'])
+
+        cls.index_dir = os.path.join(cls.root_dir, '_test_colls', 'testbuild', 'indexes')
+
+        manager(['add', 'testbuild',
+                 os.path.join(get_test_dir(), 'warcs', 'iana.warc.gz'),
+                 os.path.join(get_test_dir(), 'warcs', 'example.warc.gz')])
+
+    def test_build_zipnum(self):
+        cdx_file = os.path.join(self.index_dir, 'index.cdxj')
+        with open(cdx_file, 'rb') as fh:
+            orig_lines = fh.read().rstrip().split(b'\n')
+
+        manager(['zipnum', 'testbuild', '--lines-per-block', '4', '--shards', '3', '--workers', '2',
+                 '--remove-plain'])
+
+        assert not os.path.isfile(cdx_file)
+        assert sorted(os.listdir(self.index_dir)) == ['index-01.cdx.gz', 'index-02.cdx.gz', 'index-03.cdx.gz',
+                                                      'index.idx', 'index.loc']
+
+        with open(os.path.join(self.index_dir, 'index.idx'), 'rb') as fh:
+            idx_lines = fh.read().rstrip().split(b'\n')
+
+        assert len(idx_lines) == (len(orig_lines) + 3) // 4
+
+        first = idx_lines[0].split(b'\t')
+        assert first[0] == b' '.join(orig_lines[0].split(b' ')[:2])
+        assert first[1:3] == [b'index-01', b'0']
+        assert first[4] == b'1'
+
+        cdx_lines = []
+        for url in ('iana.org/', 'example.com/'):
+            res = self.testapp.get('/testbuild/cdx?url={0}&matchType=domain&output=json&pageSize=100'.format(url))
+            cdx_lines.extend(json.loads(line) for line in res.text.rstrip().split('\n'))
+
+        assert len(cdx_lines) == len(orig_lines)
+
+        for cdx, line in zip(sorted(cdx_lines, key=lambda cdx: (cdx['urlkey'], cdx['timestamp'])), orig_lines):
+            orig = CDXObject(line)
+            assert cdx['urlkey'] == orig['urlkey']
+            assert cdx['timestamp'] == orig['timestamp']
+            assert cdx['offset'] == orig['offset']
+            assert cdx['source'] == 'testbuild/indexes/index.idx'
+
+    def test_build_zipnum_keeps_plain(self):
+        manager(['init', 'testkeep'])
+        manager(['add', 'testkeep', os.path.join(get_test_dir(), 'warcs', 'example.warc.gz')])
+
+        index_dir = os.path.join(self.root_dir, '_test_colls', 'testkeep', 'indexes')
+
+        manager(['zipnum', 'testkeep'])
+
+        assert sorted(os.listdir(index_dir)) == ['index-01.cdx.gz', 'index.cdxj', 'index.idx', 'index.loc']
+
+    def test_build_zipnum_exists(self):
+        with pytest.raises(IOError):
+            manager(['zipnum', 'testbuild'])